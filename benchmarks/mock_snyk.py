@@ -0,0 +1,351 @@
+import json
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+# Project types and manifest files cycled through when generating projects
+PROJECT_FILES = [
+    ("npm", "package.json"),
+    ("maven", "pom.xml"),
+    ("pip", "requirements.txt"),
+    ("sast", "code"),
+    ("terraformconfig", "main.tf"),
+    ("dockerfile", "Dockerfile"),
+]
+
+# Routes served by the mock, as (method, path pattern, endpoint name). Endpoint
+# names replace ids with placeholders so that results can be
+# aggregated per endpoint.
+ROUTES = [
+    ("GET", r"/rest/orgs/([^/]+)/projects", "GET /rest/orgs/{org}/projects"),
+    ("GET", r"/rest/orgs/([^/]+)/targets", "GET /rest/orgs/{org}/targets"),
+    (
+        "PATCH",
+        r"/rest/orgs/([^/]+)/projects/([^/]+)",
+        "PATCH /rest/orgs/{org}/projects/{id}",
+    ),
+    ("GET", r"/v1/orgs", "GET /v1/orgs"),
+    ("GET", r"/v1/group/([^/]+)/orgs", "GET /v1/group/{group}/orgs"),
+    ("GET", r"/v1/org/([^/]+)/project/([^/]+)", "GET /v1/org/{org}/project/{id}"),
+    (
+        "POST",
+        r"/v1/org/([^/]+)/project/([^/]+)/tags",
+        "POST /v1/org/{org}/project/{id}/tags",
+    ),
+    (
+        "POST",
+        r"/v1/org/([^/]+)/project/([^/]+)/tags/remove",
+        "POST /v1/org/{org}/project/{id}/tags/remove",
+    ),
+    (
+        "POST",
+        r"/v1/org/([^/]+)/project/([^/]+)/attributes",
+        "POST /v1/org/{org}/project/{id}/attributes",
+    ),
+    ("GET", r"/v1/group/([^/]+)/tags", "GET /v1/group/{group}/tags"),
+    ("POST", r"/v1/group/([^/]+)/tags/delete", "POST /v1/group/{group}/tags/delete"),
+]
+
+
+def target_name(index: int) -> str:
+    return f"bench-org/repo-{index:04d}"
+
+
+# Local stand-in for the parts of the Snyk v1 and REST APIs used by snyk-tags,
+# serving a synthetic group of organizations, each with `projects` projects
+# spread over `targets` targets. Every request can be delayed by `latency`
+# seconds, and every `throttle_every`th request is rejected with a 429. The
+# group tag catalog holds `stale_tags` tags in addition to those on projects.
+class MockSnyk:
+    def __init__(
+        self,
+        orgs: int = 2,
+        projects: int = 100,
+        targets: int = 10,
+        page_size: int = 100,
+        latency: float = 0.0,
+        throttle_every: int = 0,
+        tags: list = None,
+        group_id: str = "bench-group",
+        stale_tags: int = 100,
+    ):
+        self.group_id = group_id
+        self.page_size = page_size
+        self.latency = latency
+        self.throttle_every = throttle_every
+        self.orgs = {}
+        for o in range(orgs):
+            org_id = f"org-{o}"
+            self.orgs[org_id] = {}
+            for p in range(projects):
+                project_type, manifest = PROJECT_FILES[p % len(PROJECT_FILES)]
+                target = target_name(p % max(targets, 1))
+                project_id = f"{org_id}-project-{p}"
+                self.orgs[org_id][project_id] = {
+                    "id": project_id,
+                    "type": "project",
+                    "attributes": {
+                        "name": f"{target}(main):app{p}/{manifest}",
+                        "type": project_type,
+                        "origin": "github",
+                        "tags": [dict(tag) for tag in tags or []],
+                        "business_criticality": [],
+                        "environment": [],
+                        "lifecycle": [],
+                    },
+                    "relationships": {
+                        "target": {
+                            "data": {
+                                "id": f"{org_id}-target-{p % max(targets, 1)}",
+                                "type": "target",
+                                "attributes": {
+                                    "display_name": target,
+                                    "url": f"https://github.com/{target}",
+                                },
+                            }
+                        }
+                    },
+                }
+
+        self.group_tags = [dict(tag) for tag in tags or []] + [
+            {"key": "stale", "value": f"tag-{i:04d}"} for i in range(stale_tags)
+        ]
+
+        self.requests = Counter()
+        self.statuses = Counter()
+        self.latencies = []
+        self._count = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately, which Nagle's algorithm
+            # would otherwise delay by tens of milliseconds per keep-alive request
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                mock.handle(self, "GET")
+
+            def do_POST(self):
+                mock.handle(self, "POST")
+
+            def do_PATCH(self):
+                mock.handle(self, "PATCH")
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def handle(self, request: BaseHTTPRequestHandler, method: str):
+        start = time.perf_counter()
+        url = urlparse(request.path)
+        length = int(request.headers.get("Content-Length") or 0)
+        body = request.rfile.read(length) if length else b""
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        endpoint, status, payload = f"{method} other", 404, {"message": "Not found"}
+        with self._lock:
+            self._count += 1
+            throttled = self.throttle_every and self._count % self.throttle_every == 0
+        for route_method, pattern, name in ROUTES:
+            match = re.fullmatch(pattern, url.path)
+            if route_method == method and match:
+                endpoint = name
+                if throttled:
+                    status, payload = 429, {"message": "Too many requests"}
+                else:
+                    status, payload = self.respond(
+                        name, match.groups(), parse_qs(url.query), body
+                    )
+                break
+
+        data = json.dumps(payload).encode()
+        request.send_response(status)
+        request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(data)))
+        if status == 429:
+            request.send_header("Retry-After", "1")
+        request.end_headers()
+        request.wfile.write(data)
+
+        with self._lock:
+            self.requests[endpoint] += 1
+            self.statuses[str(status)] += 1
+            self.latencies.append(time.perf_counter() - start)
+
+    def respond(self, endpoint: str, ids: tuple, query: dict, body: bytes):
+        if endpoint == "GET /v1/orgs":
+            return 200, {"orgs": [self.v1_org(org_id) for org_id in self.orgs]}
+        if endpoint == "GET /v1/group/{group}/orgs":
+            if ids[0] != self.group_id:
+                return 404, {"message": "Group not found"}
+            return 200, {
+                "id": self.group_id,
+                "name": "Benchmark group",
+                "orgs": [self.v1_org(org_id) for org_id in self.orgs],
+            }
+        if endpoint == "GET /v1/group/{group}/tags":
+            params = {k: v[0] for k, v in query.items()}
+            per_page = int(params.get("perPage", 1000))
+            start = (int(params.get("page", 1)) - 1) * per_page
+            return 200, {"tags": self.group_tags[start : start + per_page]}
+        if endpoint == "POST /v1/group/{group}/tags/delete":
+            data = json.loads(body) if body else {}
+            tag = {"key": data.get("key"), "value": data.get("value")}
+            with self._lock:
+                if tag not in self.group_tags:
+                    return 422, {"message": "Tag not found"}
+                self.group_tags.remove(tag)
+            return 200, {}
+        if endpoint == "GET /rest/orgs/{org}/projects":
+            return self.list_projects(ids[0], query)
+        if endpoint == "GET /rest/orgs/{org}/targets":
+            return self.list_targets(ids[0], query)
+
+        project = self.orgs.get(ids[0], {}).get(ids[1])
+        if project is None:
+            return 404, {"message": "Project not found"}
+        attributes = project["attributes"]
+        if endpoint == "GET /v1/org/{org}/project/{id}":
+            return 200, self.v1_project(project)
+
+        try:
+            data = json.loads(body) if body else {}
+        except ValueError:
+            # Form encoded request body
+            data = {k: v[0] for k, v in parse_qs(body.decode()).items()}
+        if endpoint == "PATCH /rest/orgs/{org}/projects/{id}":
+            changes = data.get("data", {}).get("attributes", {})
+            with self._lock:
+                for key in ("tags", "business_criticality", "environment", "lifecycle"):
+                    if key in changes:
+                        attributes[key] = changes[key]
+            return 200, {"data": project}
+        if endpoint == "POST /v1/org/{org}/project/{id}/attributes":
+            for key in ("criticality", "environment", "lifecycle"):
+                if key in data:
+                    name = "business_criticality" if key == "criticality" else key
+                    attributes[name] = data[key]
+            return 200, data
+        tag = {"key": data.get("key"), "value": data.get("value")}
+        with self._lock:
+            if endpoint == "POST /v1/org/{org}/project/{id}/tags":
+                if tag in attributes["tags"]:
+                    return 422, {"message": "Tag already exists"}
+                attributes["tags"].append(tag)
+            elif tag in attributes["tags"]:
+                attributes["tags"].remove(tag)
+            return 200, {"tags": list(attributes["tags"])}
+
+    def list_projects(self, org_id: str, query: dict):
+        if org_id not in self.orgs:
+            return 404, {"errors": [{"detail": "Org not found"}]}
+        params = {k: v[0] for k, v in query.items()}
+        projects = list(self.orgs[org_id].values())
+        if "target_id" in params:
+            target_ids = params["target_id"].split(",")
+            projects = [
+                p
+                for p in projects
+                if p["relationships"]["target"]["data"]["id"] in target_ids
+            ]
+        page, links = self.paginate(projects, params, f"/rest/orgs/{org_id}/projects")
+
+        if params.get("expand") != "target":
+            page = [
+                {k: v for k, v in project.items() if k != "relationships"}
+                for project in page
+            ]
+        return 200, {"data": page, "links": links}
+
+    def list_targets(self, org_id: str, query: dict):
+        if org_id not in self.orgs:
+            return 404, {"errors": [{"detail": "Org not found"}]}
+        params = {k: v[0] for k, v in query.items()}
+        targets = {}
+        for project in self.orgs[org_id].values():
+            target = project["relationships"]["target"]["data"]
+            targets[target["id"]] = {
+                "id": target["id"],
+                "type": "target",
+                "attributes": target["attributes"],
+            }
+        targets = list(targets.values())
+        if "display_name" in params:
+            # Like the Snyk API, the filter matches display names containing it
+            targets = [
+                t
+                for t in targets
+                if params["display_name"] in t["attributes"]["display_name"]
+            ]
+        page, links = self.paginate(targets, params, f"/rest/orgs/{org_id}/targets")
+        return 200, {"data": page, "links": links}
+
+    # One page of items after the starting_after cursor, with a next link
+    def paginate(self, items: list, params: dict, path: str):
+        limit = min(int(params.get("limit", 10)), self.page_size)
+        start = 0
+        if "starting_after" in params:
+            ids = [item["id"] for item in items]
+            start = ids.index(params["starting_after"]) + 1
+        page = items[start : start + limit]
+        links = {}
+        if start + limit < len(items):
+            params = {**params, "starting_after": page[-1]["id"]}
+            links["next"] = f"{path}?{urlencode(params)}"
+        return page, links
+
+    def v1_org(self, org_id: str) -> dict:
+        return {
+            "id": org_id,
+            "name": org_id,
+            "slug": org_id,
+            "url": f"https://app.snyk.io/org/{org_id}",
+            "group": {"id": self.group_id, "name": "Benchmark group"},
+        }
+
+    def v1_project(self, project: dict) -> dict:
+        attributes = project["attributes"]
+        return {
+            "id": project["id"],
+            "name": attributes["name"],
+            "created": "2023-01-01T00:00:00.000Z",
+            "origin": attributes["origin"],
+            "type": attributes["type"],
+            "readOnly": False,
+            "testFrequency": "daily",
+            "lastTestedDate": "2023-01-01T00:00:00.000Z",
+            "isMonitored": True,
+            "issueCountsBySeverity": {"low": 0, "medium": 0, "high": 0, "critical": 0},
+            "tags": list(attributes["tags"]),
+        }
@@ -0,0 +1,178 @@
+#! /usr/bin/env python3
+
+import json
+import platform
+import random
+import time
+import tracemalloc
+from pathlib import Path
+from typing import List
+
+import typer
+import yaml
+from rich.console import Console
+from rich.table import Table
+
+from snyk_tags import __version__
+from snyk_tags.lib.component.rules import parse_rules, project_matcher
+
+app = typer.Typer(add_completion=False)
+console = Console()
+
+RULE_KINDS = ("string", "regex", "target")
+
+
+# Synthetic rules file with `count` rules, cycling through exact project name
+# matches, project name regexes and nested target url regexes with captures.
+def generate_rules(count: int, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    rules = []
+    for i in range(count):
+        kind = RULE_KINDS[i % len(RULE_KINDS)]
+        projects = []
+        for j in range(rng.randint(1, 3)):
+            if kind == "string":
+                projects.append({"name": f"team-{i}/service-{j}:package.json"})
+            elif kind == "regex":
+                projects.append({"name": {"regex": f"^team-{i}/service-{j}[-:].*"}})
+            else:
+                projects.append(
+                    {
+                        "target": {
+                            "url": {"regex": f".*/team-{i}/(?P<repo>service-{j}[^/]*)$"}
+                        }
+                    }
+                )
+        component = (
+            f"pkg:github/team-{i}/{{repo}}"
+            if kind == "target"
+            else f"pkg:github/team-{i}/component"
+        )
+        rules.append(
+            {"name": f"rule-{i}", "projects": projects, "component": component}
+        )
+    return {"version": 1, "rules": rules}
+
+
+# Synthetic projects, shaped like the rule input built by `component tag`.
+# About `hit_rate` of them match one of `rule_count` generated rules.
+def generate_projects(
+    count: int, rule_count: int, hit_rate: float = 0.5, seed: int = 0
+) -> list:
+    rng = random.Random(seed)
+    projects = []
+    for p in range(count):
+        team = rng.randrange(rule_count) if rng.random() < hit_rate else -1 - p
+        repo = f"service-{rng.randint(0, 1) if team >= 0 else 0}"
+        projects.append(
+            {
+                "id": f"project-{p}",
+                "name": f"team-{team}/{repo}:package.json",
+                "origin": "github",
+                "type": "npm",
+                "target": {
+                    "display_name": f"team-{team}/{repo}",
+                    "url": f"https://github.com/team-{team}/{repo}",
+                },
+            }
+        )
+    return projects
+
+
+def match_all(match_fn, context: dict, projects: list) -> int:
+    matches = 0
+    for project in projects:
+        context.clear()
+        component = match_fn(project)
+        if component:
+            component.format(**context)
+            matches += 1
+    return matches
+
+
+# Time parsing, compiling and matching for one rules file size. Matching is
+# repeated for at least `min_time` seconds; memory is measured in a separate
+# pass so that tracing does not skew the timings.
+def benchmark_rules(
+    rule_count: int, projects: int = 1000, min_time: float = 0.5, seed: int = 0
+) -> dict:
+    document = yaml.safe_dump(generate_rules(rule_count, seed=seed))
+    project_objs = generate_projects(projects, rule_count, seed=seed)
+
+    start = time.perf_counter()
+    rules_doc = parse_rules(document)
+    parse_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    match_fn, context = project_matcher(rules_doc)
+    compile_seconds = time.perf_counter() - start
+
+    evaluated, matches = 0, 0
+    start = time.perf_counter()
+    while True:
+        matches = match_all(match_fn, context, project_objs)
+        evaluated += len(project_objs)
+        match_seconds = time.perf_counter() - start
+        if match_seconds >= min_time:
+            break
+
+    tracemalloc.start()
+    try:
+        match_fn, context = project_matcher(rules_doc)
+        match_all(match_fn, context, project_objs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "rules": rule_count,
+        "projects": projects,
+        "matches": matches,
+        "parse_ms": round(parse_seconds * 1000, 3),
+        "compile_ms": round(compile_seconds * 1000, 3),
+        "projects_per_second": round(evaluated / match_seconds, 1),
+        "peak_memory_kib": round(peak / 1024, 1),
+    }
+
+
+@app.command(help="Benchmark parsing and matching of component tag rules")
+def main(
+    rules: List[int] = typer.Option(
+        [10, 100, 1000, 10000], help="Number of rules to benchmark, repeatable"
+    ),
+    projects: int = typer.Option(1000, help="Projects matched against each rules file"),
+    min_time: float = typer.Option(
+        0.5, help="Minimum seconds spent matching for each rules file"
+    ),
+    seed: int = typer.Option(0, help="Seed for generating rules and projects"),
+    output: Path = typer.Option(None, help="Write results to this JSON file"),
+):
+    results = {
+        "snyk_tags": __version__,
+        "python": platform.python_version(),
+        "results": [
+            benchmark_rules(count, projects, min_time=min_time, seed=seed)
+            for count in rules
+        ],
+    }
+
+    table = Table(
+        "Rules", "Matches", "Parse ms", "Compile ms", "Projects/s", "Peak KiB"
+    )
+    for r in results["results"]:
+        table.add_row(
+            str(r["rules"]),
+            f"{r['matches']}/{r['projects']}",
+            str(r["parse_ms"]),
+            str(r["compile_ms"]),
+            str(r["projects_per_second"]),
+            str(r["peak_memory_kib"]),
+        )
+    console.print(table)
+
+    if output:
+        output.write_text(json.dumps(results, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    app()
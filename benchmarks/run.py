@@ -0,0 +1,295 @@
+#! /usr/bin/env python3
+
+import json
+import logging
+import platform
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+import typer
+from rich.console import Console
+from rich.table import Table
+from typer.testing import CliRunner
+
+from benchmarks.mock_snyk import MockSnyk, target_name
+from snyk_tags import __version__, tags
+
+app = typer.Typer(add_completion=False)
+console = Console()
+
+COMPONENT_RULES = """
+version: 1
+rules:
+  - name: repo
+    projects:
+      - target:
+          url:
+            regex: '.*/bench-org/(?P<repo>\\S+)$'
+    component: '{repo}'
+"""
+
+POLICY = """
+version: 1
+rules:
+  - name: open-source
+    projects:
+      - type: npm
+      - type: maven
+      - type: pip
+    tags:
+      - key: Product
+        value: OpenSource
+  - name: repo
+    projects:
+      - target:
+          display_name:
+            regex: '^bench-org/(?P<repo>\\S+)$'
+    tags:
+      - key: repo
+        value: '{repo}'
+    attributes:
+      lifecycle: [production]
+    component: 'pkg:github/bench-org/{repo}'
+"""
+
+
+# Each scenario returns the snyk-tags arguments to run, given the mock API and
+# a scratch directory for any input files.
+def component_tag(mock: MockSnyk, workdir: Path) -> list:
+    rules = workdir / "rules.yaml"
+    rules.write_text(COMPONENT_RULES)
+    return ["component", "tag", "--org-id", "org-0", str(rules)]
+
+
+def component_tag_group(mock: MockSnyk, workdir: Path) -> list:
+    rules = workdir / "rules.yaml"
+    rules.write_text(COMPONENT_RULES)
+    return ["component", "tag", "--group-id", mock.group_id, str(rules)]
+
+
+def tag_sca(mock: MockSnyk, workdir: Path) -> list:
+    return ["tag", "sca", "--group-id", mock.group_id]
+
+
+def policy_apply(mock: MockSnyk, workdir: Path) -> list:
+    policy = workdir / "policy.yaml"
+    policy.write_text(POLICY)
+    return ["policy", "apply", "--group-id", mock.group_id, str(policy)]
+
+
+def remove_unused_tags(mock: MockSnyk, workdir: Path) -> list:
+    return ["remove", "unused-tags", "--group-id", mock.group_id]
+
+
+def tag_all_products(mock: MockSnyk, workdir: Path) -> list:
+    return ["tag", "all-products", "--group-id", mock.group_id]
+
+
+def target_tag(mock: MockSnyk, workdir: Path) -> list:
+    return [
+        "target",
+        "tag",
+        "--org-id",
+        "org-0",
+        "--target",
+        target_name(0),
+        "--tagKey",
+        "team",
+        "--tagValue",
+        "bench",
+    ]
+
+
+def fromfile_target_tag(mock: MockSnyk, workdir: Path) -> list:
+    targets = sorted(
+        {
+            project["relationships"]["target"]["data"]["attributes"]["display_name"]
+            for projects in mock.orgs.values()
+            for project in projects.values()
+        }
+    )
+    file = workdir / "targets.csv"
+    file.write_text(
+        "org-id,target,key,value\n"
+        + "".join(
+            f"{org_id},{target},team,bench\n"
+            for org_id in mock.orgs
+            for target in targets
+        )
+    )
+    return ["fromfile", "target-tag", "--file", str(file)]
+
+
+def remove_tag_from_target(mock: MockSnyk, workdir: Path) -> list:
+    return [
+        "remove",
+        "tag-from-target",
+        "--org-id",
+        "org-0",
+        "--target",
+        target_name(0),
+        "--tagKey",
+        "team",
+        "--tagValue",
+        "bench",
+    ]
+
+
+# Scenario name to (arguments function, tags every project starts with)
+SCENARIOS = {
+    "component-tag": (component_tag, []),
+    "component-tag-group": (component_tag_group, []),
+    "tag-sca": (tag_sca, []),
+    "tag-all-products": (tag_all_products, []),
+    "policy-apply": (policy_apply, []),
+    "target-tag": (target_tag, []),
+    "fromfile-target-tag": (fromfile_target_tag, []),
+    "remove-tag-from-target": (
+        remove_tag_from_target,
+        [{"key": "team", "value": "bench"}],
+    ),
+    "remove-unused-tags": (remove_unused_tags, [{"key": "team", "value": "bench"}]),
+}
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+# Run one scenario end to end against a fresh mock API
+def run_scenario(name: str, **mock_options) -> dict:
+    scenario, seed_tags = SCENARIOS[name]
+    with MockSnyk(
+        tags=seed_tags, **mock_options
+    ) as mock, tempfile.TemporaryDirectory() as workdir:
+        args = scenario(mock, Path(workdir)) + ["--snyktkn", "benchmark-token"]
+        start = time.perf_counter()
+        result = CliRunner().invoke(tags.app, args, env={"SNYK_TAGS_API_URL": mock.url})
+        seconds = time.perf_counter() - start
+
+        projects = sum(len(p) for p in mock.orgs.values())
+        requests = sum(mock.requests.values())
+        latencies = [l * 1000 for l in mock.latencies]
+        return {
+            "command": " ".join(args[:2]),
+            "exit_code": result.exit_code,
+            "seconds": round(seconds, 4),
+            "requests": requests,
+            "requests_per_second": round(requests / seconds, 2) if seconds else 0,
+            "projects_per_second": round(projects / seconds, 2) if seconds else 0,
+            "throttled": mock.statuses.get("429", 0),
+            "statuses": dict(sorted(mock.statuses.items())),
+            "endpoints": dict(sorted(mock.requests.items())),
+            "latency_ms": {
+                "mean": round(statistics.mean(latencies), 3) if latencies else 0,
+                "p50": round(percentile(latencies, 0.5), 3),
+                "p95": round(percentile(latencies, 0.95), 3),
+                "max": round(max(latencies, default=0), 3),
+            },
+        }
+
+
+# Compare results with a baseline, returning a description of each regression.
+# Request counts are deterministic and must not grow; wall time is only checked
+# when a tolerance is given, as it depends on the machine running the suite.
+def regressions(results: dict, baseline: dict, time_tolerance: float = None) -> list:
+    found = []
+    for name, before in baseline.get("scenarios", {}).items():
+        after = results["scenarios"].get(name)
+        if after is None:
+            continue
+        if after["requests"] > before["requests"]:
+            found.append(
+                f"{name}: {after['requests']} requests, baseline {before['requests']}"
+            )
+        if time_tolerance is not None and after["seconds"] > before["seconds"] * (
+            1 + time_tolerance
+        ):
+            found.append(
+                f"{name}: took {after['seconds']}s, baseline {before['seconds']}s"
+            )
+    return found
+
+
+@app.command(help="Run offline benchmarks of snyk-tags against a local mock Snyk API")
+def main(
+    scenario: List[str] = typer.Option(
+        list(SCENARIOS),
+        help=f"Scenarios to run, any of: {', '.join(SCENARIOS)}",
+    ),
+    orgs: int = typer.Option(2, help="Organizations in the mock group"),
+    projects: int = typer.Option(300, help="Projects per organization"),
+    targets: int = typer.Option(20, help="Targets per organization"),
+    page_size: int = typer.Option(100, help="Maximum projects per REST page"),
+    latency: float = typer.Option(0.0, help="Seconds added to every response"),
+    throttle_every: int = typer.Option(
+        0, help="Respond 429 to every Nth request (default 0 means never)"
+    ),
+    output: Path = typer.Option(None, help="Write results to this JSON file"),
+    baseline: Path = typer.Option(
+        None, help="Fail if results regress compared to this JSON results file"
+    ),
+    time_tolerance: float = typer.Option(
+        None,
+        help="Also fail when a scenario is slower than the baseline by more than this fraction, e.g. 0.5",
+    ),
+):
+    unknown = set(scenario) - set(SCENARIOS)
+    if unknown:
+        raise typer.BadParameter(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    config = {
+        "orgs": orgs,
+        "projects": projects,
+        "targets": targets,
+        "page_size": page_size,
+        "latency": latency,
+        "throttle_every": throttle_every,
+    }
+    # Per project log lines would dominate the console, not the measurements
+    logging.disable(logging.INFO)
+    results = {
+        "snyk_tags": __version__,
+        "python": platform.python_version(),
+        "config": config,
+        "scenarios": {name: run_scenario(name, **config) for name in scenario},
+    }
+
+    table = Table("Scenario", "Exit", "Seconds", "Requests", "Req/s", "429s", "p95 ms")
+    for name, r in results["scenarios"].items():
+        table.add_row(
+            name,
+            str(r["exit_code"]),
+            str(r["seconds"]),
+            str(r["requests"]),
+            str(r["requests_per_second"]),
+            str(r["throttled"]),
+            str(r["latency_ms"]["p95"]),
+        )
+    console.print(table)
+
+    if output:
+        output.write_text(json.dumps(results, indent=2) + "\n")
+
+    failed = [n for n, r in results["scenarios"].items() if r["exit_code"] != 0]
+    for name in failed:
+        typer.secho(f"{name} exited with an error", fg=typer.colors.RED)
+    found = []
+    if baseline:
+        found = regressions(
+            results, json.loads(baseline.read_text()), time_tolerance=time_tolerance
+        )
+        for regression in found:
+            typer.secho(f"Regression in {regression}", fg=typer.colors.RED)
+    if failed or found:
+        raise typer.Exit(code=1)
+
+
+if __name__ == "__main__":
+    app()
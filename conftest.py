@@ -0,0 +1,2 @@
+# Presence of this file puts the repository root on sys.path, so that tests
+# can import the benchmarks package.
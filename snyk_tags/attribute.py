@@ -2,14 +2,19 @@
 
 import json
 import logging
+from contextlib import nullcontext
 
 import httpx
 import typer
 from rich import print
-from snyk import SnykClient
 from typing import Dict, Any
 
 from snyk_tags import __app_name__, __version__
+from snyk_tags.lib.api import Api, has_attributes
+from snyk_tags.lib.negative_cache import NOT_FOUND, negative_cache
+from snyk_tags.lib.plan import PlanWriter
+from snyk_tags.lib.targets import TargetIndexCache
+from snyk_tags.lib.tracing import span
 
 logging.basicConfig(
     level=logging.INFO,
@@ -22,17 +27,6 @@ logging.getLogger("httpx").setLevel(logging.WARNING)
 app = typer.Typer()
 
 
-# Reach to the API and generate tokens
-def create_client(token: str, tenant: str) -> httpx.Client:
-    base_url = (
-        f"https://api.{tenant}.snyk.io/v1"
-        if tenant in ["eu", "au", "us"]
-        else "https://api.snyk.io/v1"
-    )
-    headers = {"Authorization": f"token {token}", "Content-Type": "application/json"}
-    return httpx.Client(base_url=base_url, headers=headers)
-
-
 # Apply attributes to a specific project
 def apply_attributes_to_project(
     client: httpx.Client,
@@ -43,6 +37,8 @@ def apply_attributes_to_project(
     lifecycle: list,
     project_name: str,
 ) -> tuple:
+    if negative_cache.skip(org_id, project_id, project_name):
+        return None, {}
     if criticality.count("") == 1:
         criticality.remove("")
 
@@ -58,11 +54,12 @@ def apply_attributes_to_project(
         "lifecycle": lifecycle,
     }
 
-    req = client.post(
-        f"org/{org_id}/project/{project_id}/attributes",
-        data=json.dumps(attribute_data).replace("'", '"'),
-        timeout=None,
-    )
+    with span("set project attributes", org_id=org_id, project_id=project_id):
+        req = client.post(
+            f"org/{org_id}/project/{project_id}/attributes",
+            data=json.dumps(attribute_data).replace("'", '"'),
+            timeout=None,
+        )
 
     attribute_data = typer.style(attribute_data, bold=True, fg=typer.colors.MAGENTA)
     criticality = typer.style(criticality, bold=True, fg=typer.colors.MAGENTA)
@@ -81,6 +78,7 @@ def apply_attributes_to_project(
         logging.error(
             f"Project not found, likely a READ-ONLY project. Project: {project_name}. Error message: {req.json()}."
         )
+        negative_cache.add(org_id, project_id, NOT_FOUND, project_name)
     elif req.status_code == 500:
         logging.error(
             f"Error message: {req.json()}. Please contact eric.fernandez@snyk.io."
@@ -88,7 +86,8 @@ def apply_attributes_to_project(
     return req.status_code, req.json()
 
 
-# Apply attributes to projects within a collection
+# Apply attributes to projects within a collection, returning whether every
+# project write succeeded
 def apply_attributes_to_projects(
     token: str,
     org_ids: list,
@@ -98,29 +97,45 @@ def apply_attributes_to_projects(
     lifecycle: list,
     tenant: str = "",
     filters: Dict[str, Any] = {},
-) -> None:
-    with create_client(token=token, tenant=tenant) as client:
+    api: Api = None,
+    plan: PlanWriter = None,
+    targets: TargetIndexCache = None,
+) -> bool:
+    ok = True
+    with nullcontext(api) if api else Api.for_tenant(token, tenant) as api:
         for org_id in org_ids:
-            base_url = (
-                f"https://api.{tenant}.snyk.io/rest"
-                if tenant in ["eu", "au", "us"]
-                else "https://api.snyk.io/rest"
-            )
-            client_v3 = SnykClient(
-                token=token, url=base_url, version="2023-08-31~experimental"
+            projects = (
+                targets.get(org_id, filters).projects(name)
+                if targets
+                else api.target_projects(org_id, name, filters)
             )
-            params = {"limit": 100, **filters}
-            projects = client_v3.get_rest_pages(
-                f"/orgs/{org_id}/projects", params=params
-            )
-
-            badname = 0
-            rightname = 0
-
+            if not projects:
+                print(
+                    f"[bold red]{name}[/bold red] is not a valid target, please check it is a target within the organization e.g. [bold blue]snyk-labs/snyk-goof[/bold blue]"
+                )
+            attributes = {
+                "criticality": [v for v in criticality if v],
+                "environment": [v for v in environment if v],
+                "lifecycle": [v for v in lifecycle if v],
+            }
+            unchanged = 0
             for project in projects:
-                if project["attributes"]["name"].startswith(name):
-                    apply_attributes_to_project(
-                        client=client,
+                # The listing carries the current values, so unchanged projects
+                # need no request
+                if has_attributes(project, attributes):
+                    unchanged += 1
+                    continue
+                if plan:
+                    plan.set_attributes(
+                        org_id,
+                        project["id"],
+                        attributes,
+                        project["attributes"]["name"],
+                    )
+                    continue
+                with api.slot():
+                    status, _ = apply_attributes_to_project(
+                        client=api.v1,
                         org_id=org_id,
                         project_id=project["id"],
                         criticality=criticality,
@@ -128,10 +143,12 @@ def apply_attributes_to_projects(
                         lifecycle=lifecycle,
                         project_name=project["attributes"]["name"],
                     )
-                    rightname = 1
-                else:
-                    badname = 1
-            if badname == 1 and rightname == 0:
-                print(
-                    f"[bold red]{name}[/bold red] is not a valid target, please check it is a target within the organization e.g. [bold blue]snyk-labs/snyk-goof[/bold blue]"
+                if status == 200 and targets:
+                    targets.set_attributes(org_id, project["id"], attributes)
+                elif status not in (None, 200):
+                    ok = False
+            if unchanged:
+                logging.info(
+                    f"Skipped {unchanged} projects within {name} which already have these attributes."
                 )
+    return ok
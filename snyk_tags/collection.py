@@ -1,14 +1,22 @@
 #! /usr/bin/env python3
 
 import logging
+from contextlib import nullcontext
+from pathlib import Path
 
 import httpx
 import typer
 from rich import print
-from snyk import SnykClient
 from typing import Dict, Any
 
 from snyk_tags import __app_name__, __version__, attribute, github
+from snyk_tags.lib.api import Api, has_tag
+from snyk_tags.lib.journal import Journal
+from snyk_tags.lib.negative_cache import NOT_FOUND, negative_cache
+from snyk_tags.lib.plan import PlanWriter, open_plan, planhelp
+from snyk_tags.lib.targets import TargetIndexCache
+from snyk_tags.lib.tracing import span
+from snyk_tags.lib.validation import attribute_problems
 
 logging.basicConfig(
     level=logging.INFO,
@@ -26,17 +34,6 @@ app.add_typer(
 )
 
 
-# Reach to the API and generate tokens
-def create_client(token: str, tenant: str) -> httpx.Client:
-    base_url = (
-        f"https://api.{tenant}.snyk.io/v1"
-        if tenant in ["eu", "au", "us"]
-        else "https://api.snyk.io/v1"
-    )
-    headers = {"Authorization": f"token {token}"}
-    return httpx.Client(base_url=base_url, headers=headers)
-
-
 # Apply tags to a specific project
 def apply_tag_to_project(
     client: httpx.Client,
@@ -46,14 +43,17 @@ def apply_tag_to_project(
     key: str,
     project_name: str,
 ) -> tuple:
+    if negative_cache.skip(org_id, project_id, project_name):
+        return None, {}
     tag_data = {
         "key": key,
         "value": tag,
     }
 
-    req = client.post(
-        f"org/{org_id}/project/{project_id}/tags", data=tag_data, timeout=None
-    )
+    with span("add project tag", org_id=org_id, project_id=project_id):
+        req = client.post(
+            f"org/{org_id}/project/{project_id}/tags", json=tag_data, timeout=None
+        )
 
     if req.status_code == 200:
         logging.info(f"Successfully added {tag_data} tags to Project: {project_name}.")
@@ -65,10 +65,11 @@ def apply_tag_to_project(
         logging.error(
             f"Project not found, likely a READ-ONLY project. Project: {project_name}. Error message: {req.json()}."
         )
+        negative_cache.add(org_id, project_id, NOT_FOUND, project_name)
     return req.status_code, req.json()
 
 
-# Tagging loop
+# Tagging loop, returning whether every project write succeeded
 def apply_tags_to_projects(
     token: str,
     org_ids: list,
@@ -77,45 +78,57 @@ def apply_tags_to_projects(
     key: str,
     tenant: str = "",
     filters: Dict[str, Any] = {},
-) -> None:
-    with create_client(token=token, tenant=tenant) as client:
+    api: Api = None,
+    journal: Journal = None,
+    plan: PlanWriter = None,
+    targets: TargetIndexCache = None,
+) -> bool:
+    ok = True
+    with nullcontext(api) if api else Api.for_tenant(token, tenant) as api:
         for org_id in org_ids:
-            base_url = (
-                f"https://api.{tenant}.snyk.io/rest"
-                if tenant in ["eu", "au", "us"]
-                else "https://api.snyk.io/rest"
+            projects = (
+                targets.get(org_id, filters).projects(name)
+                if targets
+                else api.target_projects(org_id, name, filters)
             )
-            client_v3 = SnykClient(
-                token=token, url=base_url, version="2023-08-31~experimental"
-            )
-            params = {"limit": 100, **filters}
-            projects = client_v3.get_rest_pages(
-                f"/orgs/{org_id}/projects", params=params
-            )
-
-            badname = 0
-            rightname = 0
+            if not projects:
+                print(
+                    f"[bold red]{name}[/bold red] is not a valid target, please check it is a target within the organization e.g. [bold blue]snyk-labs/snyk-goof[/bold blue]"
+                )
             for project in projects:
-                if (
-                    project["attributes"]["name"] == name
-                    or project["attributes"]["name"].startswith(name + "(")
-                    or project["attributes"]["name"].startswith(name + ":")
+                if plan:
+                    if not has_tag(project, key, tag):
+                        plan.add_tag(
+                            org_id,
+                            project["id"],
+                            key,
+                            tag,
+                            project["attributes"]["name"],
+                        )
+                    continue
+                if journal and journal.mutation_done(
+                    org_id, project["id"], "add_tag", key, tag
                 ):
-                    apply_tag_to_project(
-                        client=client,
+                    continue
+                with api.slot():
+                    status, _ = apply_tag_to_project(
+                        client=api.v1,
                         org_id=org_id,
                         project_id=project["id"],
                         tag=tag,
                         key=key,
                         project_name=project["attributes"]["name"],
                     )
-                    rightname = 1
-                else:
-                    badname = 1
-            if badname == 1 and rightname == 0:
-                print(
-                    f"[bold red]{name}[/bold red] is not a valid target, please check it is a target within the organization e.g. [bold blue]snyk-labs/snyk-goof[/bold blue]"
-                )
+                if status in (200, 422):
+                    if targets:
+                        targets.add_tag(org_id, project["id"], key, tag)
+                    if journal:
+                        journal.record_mutation(
+                            org_id, project["id"], "add_tag", key, tag
+                        )
+                elif status is not None:
+                    ok = False
+    return ok
 
 
 # Coloured variables for output
@@ -157,13 +170,17 @@ def tag(
     tagValue: str = typer.Option(
         ..., help="Tag value: value of the tag"  # Default value of comamand
     ),
+    plan: Path = typer.Option(None, help=planhelp),
 ):
     typer.secho(
         f"\nAdding the tag key {tagKey} and tag value {tagValue} to projects within {target} for easy filtering via the UI",
         bold=True,
         fg=typer.colors.MAGENTA,
     )
-    apply_tags_to_projects(snyktkn, [org_id], target, tagValue, tagKey, tenant)
+    with open_plan(plan) as planner:
+        apply_tags_to_projects(
+            snyktkn, [org_id], target, tagValue, tagKey, tenant, plan=planner
+        )
 
 
 # Collection command to apply the attributes to the collection
@@ -196,18 +213,30 @@ def attributes(
         "",  # Default value of comamand
         help="Defaults to US tenant (app.snyk.io), add 'eu', 'au' or 'us' to use alternative regional tenant. Use --tenant to change tenant.",
     ),
+    plan: Path = typer.Option(None, help=planhelp),
 ):
+    problems = attribute_problems(
+        {
+            "criticality": [criticality],
+            "environment": [environment],
+            "lifecycle": [lifecycle],
+        }
+    )
+    if problems:
+        raise typer.BadParameter("; ".join(problems))
     typer.secho(
         f"\nAdding the attributes {criticality}, {environment} and {lifecycle} to projects within {target} for easy filtering via the UI",
         bold=True,
         fg=typer.colors.MAGENTA,
     )
-    attribute.apply_attributes_to_projects(
-        snyktkn,
-        [org_id],
-        target,
-        [criticality],
-        [environment],
-        [lifecycle],
-        tenant,
-    )
+    with open_plan(plan) as planner:
+        attribute.apply_attributes_to_projects(
+            snyktkn,
+            [org_id],
+            target,
+            [criticality],
+            [environment],
+            [lifecycle],
+            tenant,
+            plan=planner,
+        )
@@ -1,17 +1,30 @@
 #! /usr/bin/env python3
 
 import csv
+from contextlib import nullcontext
+import itertools
 from enum import Enum
 import json
 import logging
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 
 import typer
 from rich import print as rich_print
 
 from snyk_tags import __app_name__, __version__
-from snyk_tags.lib.api import Api
-from snyk_tags.lib.component.rules import parse_rules, project_matcher
+from snyk_tags.lib.api import Api, RateLimiter
+from snyk_tags.lib.concurrency import AdaptiveLimit, adaptivehelp
+from snyk_tags.lib.component.rules import (
+    parse_rules,
+    project_matcher,
+    project_rule_input,
+)
+from snyk_tags.lib.plan import PlanWriter, open_plan, planhelp
+from snyk_tags.lib.tracing import span
 
 logging.basicConfig(
     level=logging.INFO,
@@ -26,12 +39,71 @@ class FormatType(str, Enum):
     log = "log"
     csv = "csv"
     json = "json"
+    ndjson = "ndjson"
+
+
+# Collects output in memory and writes it out in batches, once max_buffer
+# characters are pending or at most flush_interval seconds after a row was
+# buffered, by a timer when no further row arrives in the meantime.
+# A flush_interval of 0 writes every row immediately.
+class BufferedWriter:
+    def __init__(self, stream=None, flush_interval: float = 1.0, max_buffer=65536):
+        self.stream = stream or sys.stdout
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._buf = []
+        self._size = 0
+        self._last_flush = time.monotonic()
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def write(self, s: str):
+        with self._lock:
+            self._buf.append(s)
+            self._size += len(s)
+            wait = self.flush_interval - (time.monotonic() - self._last_flush)
+            if self._size >= self.max_buffer or wait <= 0:
+                self._flush()
+            elif self._timer is None:
+                self._timer = threading.Timer(wait, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._buf:
+            self.stream.write("".join(self._buf))
+            self._buf.clear()
+            self._size = 0
+        self.stream.flush()
+        self._last_flush = time.monotonic()
+
+
+class Formatter:
+    def __init__(self, out: BufferedWriter):
+        self.out = out
+
+    def close(self):
+        self.out.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
 
 
-class CsvFormatter:
-    def __init__(self):
+class CsvFormatter(Formatter):
+    def __init__(self, out: BufferedWriter):
+        super().__init__(out)
         self.wrote_header = False
-        self.w = csv.writer(sys.stdout)
+        self.w = csv.writer(out)
 
     def print(
         self,
@@ -73,10 +145,19 @@ class CsvFormatter:
                 project.get("target_reference"),
             ]
         )
-        sys.stdout.flush()
 
 
-class JsonFormatter:
+class JsonFormatter(Formatter):
+    def __init__(self, out: BufferedWriter, compact: bool = False):
+        super().__init__(out)
+        # The ndjson format skips whitespace and circular reference checks,
+        # which are not needed for API response data.
+        self.encoder = (
+            json.JSONEncoder(separators=(",", ":"), check_circular=False)
+            if compact
+            else json.JSONEncoder()
+        )
+
     def print(
         self,
         action: str,
@@ -86,8 +167,8 @@ class JsonFormatter:
         remove: bool,
         project: any,
     ):
-        print(
-            json.dumps(
+        self.out.write(
+            self.encoder.encode(
                 {
                     "action": "{}{}".format(dry_run and "would " or "", action),
                     "mode": "{}{}".format(
@@ -98,10 +179,15 @@ class JsonFormatter:
                     "project": project,
                 }
             )
+            + "\n"
         )
 
 
-class LogFormatter:
+class LogFormatter(Formatter):
+    def __init__(self, out: BufferedWriter, rich: bool = False):
+        super().__init__(out)
+        self.rich = rich
+
     def print(
         self,
         action: str,
@@ -111,20 +197,179 @@ class LogFormatter:
         remove: bool,
         project: any,
     ):
-        rich_print(
-            f"""{'{}{}'.format(dry_run and "would " or "", action)
+        line = f"""{'{}{}'.format(dry_run and "would " or "", action)
                 } "component:{component}" in project id="{project["id"]}" name="{project["name"]}\""""
+        if self.rich:
+            rich_print(line)
+        else:
+            self.out.write(line + "\n")
+
+
+def create_formatter(
+    format: FormatType, flush_interval: float = 1.0, rich: bool = None
+) -> Formatter:
+    out = BufferedWriter(sys.stdout, flush_interval=flush_interval)
+    if format == "csv":
+        return CsvFormatter(out)
+    elif format == "json":
+        return JsonFormatter(out)
+    elif format == "ndjson":
+        return JsonFormatter(out, compact=True)
+    if rich is None:
+        rich = sys.stdout.isatty()
+    return LogFormatter(out, rich=rich)
+
+
+# Evaluate rules over projects a batch at a time, yielding each matching
+# project with its rule input object and interpolated component tag. Each
+# batch is traced as one span.
+def match_projects(
+    projects, match_fn, context: dict, org_id: str, batch_size=100, lock=None
+):
+    projects = iter(projects)
+    while True:
+        batch = list(itertools.islice(projects, batch_size))
+        if not batch:
+            return
+        matched = []
+        # The matcher extracts values into the shared context dict, so
+        # concurrent evaluations are serialized by the lock
+        with lock or nullcontext(), span(
+            "evaluate rules", org_id=org_id, project_count=len(batch)
+        ) as s:
+            for project in batch:
+                project_obj = project_rule_input(project)
+
+                # Clear context as this dict is (re)used in-place with each
+                # execution of the project matcher rules.
+                context.clear()
+                component = match_fn(project_obj)
+                if not component:
+                    # Rule did not match
+                    continue
+
+                # Interpolate matcher context values, if any were extracted
+                matched.append((project, project_obj, component.format(**context)))
+            s.set_attribute("match_count", len(matched))
+        yield from matched
+
+
+# Evaluate the rules against the projects of one organization and apply the
+# resulting component tag changes. Organizations can be processed in parallel
+# with the same compiled rules, as rule evaluation and output hold the lock.
+def tag_org_projects(
+    client: Api,
+    org_id: str,
+    match_fn,
+    context: dict,
+    fmtr: Formatter,
+    lock: threading.Lock,
+    dry_run: bool = False,
+    remove: bool = False,
+    exclusive: bool = False,
+    planner: PlanWriter = None,
+):
+    def report(**kwargs):
+        with lock:
+            fmtr.print(**kwargs)
+
+    for project, project_obj, component in match_projects(
+        client.org_projects(org_id), match_fn, context, org_id, lock=lock
+    ):
+        have_component_tag = any(
+            tag.get("value")
+            for tag in project.get("attributes", {}).get("tags", [])
+            if tag.get("key") == "component" and tag.get("value") == component
+        )
+        other_component_tags = set(
+            tag.get("value")
+            for tag in project.get("attributes", {}).get("tags", [])
+            if tag.get("key") == "component" and tag.get("value") != component
         )
 
+        print_format_args = {
+            "dry_run": dry_run,
+            "exclusive": exclusive,
+            "remove": remove,
+            "project": project_obj,
+        }
+
+        if exclusive:
+            for other_component in other_component_tags:
+                report(
+                    action="remove other tag",
+                    component=other_component,
+                    **print_format_args,
+                )
+                if planner:
+                    planner.remove_tag(
+                        org_id,
+                        project["id"],
+                        "component",
+                        other_component,
+                        project_obj.get("name"),
+                    )
+                if not dry_run:
+                    with client.slot():
+                        client.remove_project_tag(
+                            org_id,
+                            project["id"],
+                            tag={"key": "component", "value": other_component},
+                        )
+
+        if remove:
+            if have_component_tag:
+                report(action="remove tag", component=component, **print_format_args)
+                if planner:
+                    planner.remove_tag(
+                        org_id,
+                        project["id"],
+                        "component",
+                        component,
+                        project_obj.get("name"),
+                    )
+                if not dry_run:
+                    with client.slot():
+                        client.remove_project_tag(
+                            org_id,
+                            project["id"],
+                            tag={"key": "component", "value": component},
+                        )
+        else:
+            if not have_component_tag:
+                report(action="add tag", component=component, **print_format_args)
+                if planner:
+                    planner.add_tag(
+                        org_id,
+                        project["id"],
+                        "component",
+                        component,
+                        project_obj.get("name"),
+                    )
+                if not dry_run:
+                    with client.slot():
+                        client.add_project_tag(
+                            org_id,
+                            project["id"],
+                            tag={"key": "component", "value": component},
+                        )
+            else:
+                report(action="keep tag", component=component, **print_format_args)
+
 
 @app.command(help=f"Manage software component project tags")
 def tag(
     rules: str = typer.Argument(...),
     org_id: str = typer.Option(
-        ...,  # Default value of comamand
+        "",  # Default value of comamand
         envvar=["ORG_ID"],
         help="Specify the Organization ID where you want to apply the tag",
     ),
+    group_id: str = typer.Option(
+        "",  # Default value of comamand
+        envvar=["GROUP_ID"],
+        help="Group ID of the Snyk Group whose organizations you want to apply the tags to",
+    ),
     snyktkn: str = typer.Option(
         ...,  # Default value of comamand
         help="Snyk API token with org admin access",
@@ -144,119 +389,70 @@ def tag(
     ),
     format: FormatType = typer.Option(
         default=FormatType.log,
-        help="Output format, one of: log, csv, json",
+        help="Output format, one of: log, csv, json, ndjson",
+    ),
+    flush_interval: float = typer.Option(
+        default=1.0,
+        help="Maximum number of seconds output is buffered before it is written, 0 writes every row immediately",
+    ),
+    rich_output: bool = typer.Option(
+        None,
+        "--rich/--no-rich",
+        help="Render log output with rich formatting, defaults to on only when stdout is a terminal",
     ),
     tenant: str = typer.Option(
         "",  # Default value of comamand
         help=f"Defaults to US tenant (app.snyk.io), add 'eu', 'au' or 'us' to use alternative regional tenant. Use --tenant to change tenant.",
     ),
+    plan: Path = typer.Option(None, help=planhelp),
+    concurrency: int = typer.Option(
+        10, help="Number of organizations processed in parallel with --group-id"
+    ),
+    max_rps: float = typer.Option(
+        0,
+        help="Maximum API requests per second (default 0 means no limit)",
+    ),
+    adaptive: bool = typer.Option(False, "--adaptive", help=adaptivehelp),
 ):
-    if format == "csv":
-        fmtr = CsvFormatter()
-    elif format == "json":
-        fmtr = JsonFormatter()
-    else:
-        fmtr = LogFormatter()
+    if not group_id and not org_id:
+        raise typer.BadParameter("either --group-id or --org-id is required")
+    fmtr = create_formatter(format, flush_interval=flush_interval, rich=rich_output)
 
-    with open(rules, "r") as f:
+    with open(rules, "r") as f, open_plan(plan) as planner, fmtr:
+        # Planning reports what would happen, exactly like a dry run
+        dry_run = dry_run or planner is not None
         rules_doc = parse_rules(f)
-        (match_fn, context) = project_matcher(rules_doc)
-        client = Api(
+        match_fn, context = project_matcher(rules_doc)
+        # Organizations share the compiled rules, connection pool and rate limit
+        client = Api.for_tenant(
             snyktkn,
-            v1_url=(
-                f"https://api.{tenant}.snyk.io/v1"
-                if tenant in ["eu", "au", "us"]
-                else "https://api.snyk.io/v1"
-            ),
-            rest_url=(
-                f"https://api.{tenant}.snyk.io/rest"
-                if tenant in ["eu", "au", "us"]
-                else "https://api.snyk.io/rest"
-            ),
+            tenant,
+            rate_limiter=RateLimiter(max_rps) if max_rps > 0 else None,
+            max_connections=max(concurrency, 1),
+            concurrency_limit=AdaptiveLimit(concurrency) if adaptive else None,
         )
-        for project in client.org_projects(org_id):
-            # Extract and transform project and target data from API response
-            # for rule input. Rules operate over project attributes, extended
-            # with a "target" object property derived from the related target's
-            # attributes.
-            project_obj = {"id": project["id"]}
-            project_obj.update(**project.get("attributes", {}))
-
-            target = (
-                project.get("relationships", {})
-                .get("target", {})
-                .get("data", {})
-                .get("attributes")
-            )
-            if target:
-                project_obj.update(target=target)
-
-            # Clear context as this dict is (re)used in-place with each
-            # execution of the project matcher rules.
-            context.clear()
-            component = match_fn(project_obj)
-            if not component:
-                # Rule did not match
-                continue
-
-            # Interpolate matcher context values, if any were extracted
-            component = component.format(**context)
-
-            have_component_tag = any(
-                tag.get("value")
-                for tag in project.get("attributes", {}).get("tags", [])
-                if tag.get("key") == "component" and tag.get("value") == component
-            )
-            other_component_tags = set(
-                tag.get("value")
-                for tag in project.get("attributes", {}).get("tags", [])
-                if tag.get("key") == "component" and tag.get("value") != component
-            )
+        lock = threading.Lock()
 
-            print_format_args = {
-                "dry_run": dry_run,
-                "exclusive": exclusive,
-                "remove": remove,
-                "project": project_obj,
-            }
-
-            if exclusive:
-                for other_component in other_component_tags:
-                    fmtr.print(
-                        action="remove other tag",
-                        component=other_component,
-                        **print_format_args,
-                    )
-                    if not dry_run:
-                        client.remove_project_tag(
-                            org_id,
-                            project["id"],
-                            tag={"key": "component", "value": other_component},
-                        )
+        def tag_org(org_id: str):
+            tag_org_projects(
+                client,
+                org_id,
+                match_fn,
+                context,
+                fmtr,
+                lock,
+                dry_run=dry_run,
+                remove=remove,
+                exclusive=exclusive,
+                planner=planner,
+            )
 
-            if remove:
-                if have_component_tag:
-                    fmtr.print(
-                        action="remove tag", component=component, **print_format_args
-                    )
-                    if not dry_run:
-                        client.remove_project_tag(
-                            org_id,
-                            project["id"],
-                            tag={"key": "component", "value": component},
-                        )
+        with client:
+            if org_id:
+                # A single organization is tagged on the main thread, where it
+                # can be profiled
+                tag_org(org_id)
             else:
-                if not have_component_tag:
-                    fmtr.print(
-                        action="add tag", component=component, **print_format_args
-                    )
-                    if not dry_run:
-                        client.add_project_tag(
-                            org_id,
-                            project["id"],
-                            tag={"key": "component", "value": component},
-                        )
-                else:
-                    fmtr.print(
-                        action="keep tag", component=component, **print_format_args
-                    )
+                with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as pool:
+                    # Consumed to raise the first error of any organization
+                    list(pool.map(tag_org, client.group_org_ids(group_id)))
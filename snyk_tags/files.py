@@ -1,11 +1,24 @@
 #! /usr/bin/env python3
+import logging
 import typer
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Optional
-import csv
+from typing import Callable, Iterator, List, NamedTuple, Optional
 from snyk_tags import collection, attribute, remove
+from snyk_tags.lib import rows
+from snyk_tags.lib.api import Api, RateLimiter
+from snyk_tags.lib.concurrency import AdaptiveLimit, adaptivehelp
+from snyk_tags.lib.journal import Journal, journalhelp, open_journal, resumehelp
+from snyk_tags.lib.plan import open_plan, planhelp
+from snyk_tags.lib.targets import TargetIndexCache
+from snyk_tags.lib.validation import (
+    attribute_row_problems,
+    group_tag_row_problems,
+    tag_row_problems,
+)
 from rich import print
-import json
+from rich.console import Console
+from rich.table import Table
 
 app = typer.Typer()
 repoexample = typer.style("'snyk-labs/nodejs-goof'", bold=True, fg=typer.colors.MAGENTA)
@@ -21,12 +34,133 @@ removetagtargetexample = typer.style(
 )
 
 
+workershelp = "Number of files to process concurrently, sharing one HTTP connection pool and rate limit"
+maxrpshelp = (
+    "Maximum API requests per second across all workers (default 0 means no limit)"
+)
+adaptiveworkershelp = "Adapt the number of writes in flight to the API, backing off on 429 and server errors, up to --workers"
+
+
+class FileResult(NamedTuple):
+    path: Path
+    rows: int
+    error: Optional[str]
+    skipped: int = 0
+
+
+def create_api(
+    token: str, tenant: str, max_rps: float, concurrency_limit: AdaptiveLimit = None
+) -> Api:
+    return Api.for_tenant(
+        token,
+        tenant,
+        rate_limiter=RateLimiter(max_rps) if max_rps > 0 else None,
+        concurrency_limit=concurrency_limit,
+    )
+
+
+# Check every row of the input files before any request is sent, exiting with
+# the problems found and the rows they were found in. Files which cannot be
+# read are left for process_file to report.
+def validate_files(
+    file: List[Path],
+    reader: Callable[[Path], Iterator],
+    check_row: Callable,
+    max_shown: int = 20,
+):
+    problems = []
+    for path in file:
+        if not (path.is_file() and rows.is_supported(path)):
+            continue
+        try:
+            for index, row in enumerate(reader(path), start=1):
+                problems.extend(f"{path} row {index}: {p}" for p in check_row(row))
+        except Exception as e:
+            problems.append(f"{path}: {e}")
+    if not problems:
+        return
+    for problem in problems[:max_shown]:
+        print(f"[bold red]Invalid input[/bold red] {problem}")
+    if len(problems) > max_shown:
+        print(f"... and {len(problems) - max_shown} more problems")
+    print("No changes were made, please fix the input files and try again")
+    raise typer.Exit(code=1)
+
+
+# Stream the rows of one input file through process_row, recording the rows it
+# reports as fully applied. Rows already recorded in the journal are skipped,
+# while rows with failed writes are tried again on --resume.
+def process_file(
+    path: Path,
+    reader: Callable[[Path], Iterator],
+    process_row: Callable,
+    journal: Journal = None,
+) -> FileResult:
+    if not path.is_file():
+        print(f"The file or path does not exist")
+        return FileResult(path, 0, "file or path does not exist")
+    if not rows.is_supported(path):
+        print(
+            f"The file {path} is not valid, it must be either a .csv, .json or .ndjson"
+        )
+        return FileResult(path, 0, "unsupported file type")
+
+    source = str(path.resolve())
+    count = 0
+    skipped = 0
+    try:
+        for index, row in enumerate(reader(path)):
+            if journal and journal.row_done(source, index):
+                skipped += 1
+                continue
+            applied = process_row(row)
+            count += 1
+            if journal and applied:
+                journal.record_row(source, index)
+    except Exception as e:
+        logging.error(f"Processing {path} stopped after {count} rows: {e}")
+        return FileResult(path, count, str(e), skipped)
+    return FileResult(path, count, None, skipped)
+
+
+# Process each input file, concurrently when workers > 1, then summarise the
+# outcome per file. Exits non-zero if any file could not be fully processed.
+def process_files(
+    file: List[Path],
+    reader: Callable[[Path], Iterator],
+    process_row: Callable,
+    workers: int = 1,
+    journal: Journal = None,
+) -> List[FileResult]:
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        results = list(
+            pool.map(
+                lambda path: process_file(path, reader, process_row, journal), file
+            )
+        )
+
+    if len(results) > 1 or journal:
+        table = Table("File", "Rows", "Skipped", "Status")
+        for result in results:
+            table.add_row(
+                str(result.path),
+                str(result.rows),
+                str(result.skipped),
+                "ok" if result.error is None else f"failed: {result.error}",
+            )
+        Console().print(table)
+
+    if any(result.error is not None for result in results):
+        raise typer.Exit(code=1)
+    return results
+
+
 @app.command(
-    help=f"Apply a custom tag from a .csv or .json to a target, for example {repoexample} \n\n The .csv or .json must be in the format {tagexample}"
+    help=f"Apply a custom tag from a .csv, .json or .ndjson to a target, for example {repoexample} \n\n The file must be in the format {tagexample}"
 )
 def target_tag(
     file: List[Path] = typer.Option(
-        ..., help=f".csv or .json file with the format {tagexample}"
+        ..., help=f".csv, .json or .ndjson file with the format {tagexample}"
     ),
     snyktkn: str = typer.Option(
         ..., help="Snyk API token with org admin access", envvar=["SNYK_TOKEN"]
@@ -35,66 +169,51 @@ def target_tag(
         "",  # Default value of comamand
         help=f"Defaults to US tenant (app.snyk.io), add 'eu', 'au' or 'us' to use alternative regional tenant. Use --tenant to change tenant.",
     ),
+    workers: int = typer.Option(1, help=workershelp),
+    max_rps: float = typer.Option(0, help=maxrpshelp),
+    adaptive: bool = typer.Option(False, "--adaptive", help=adaptiveworkershelp),
+    journal: Path = typer.Option(None, help=journalhelp),
+    resume: bool = typer.Option(False, "--resume", help=resumehelp),
+    plan: Path = typer.Option(None, help=planhelp),
 ):
-    for path in file:
-        filters = {}
-        if path.is_file():
-            openfile = open(path)
-            if ".csv" in openfile.name:
-                csvreader = csv.DictReader(openfile)
-                for row in csvreader:
-                    org_id = row.get("org-id")
-                    target = row.get("target")
-                    key = row.get("key")
-                    value = row.get("value")
-                    filters = {
-                        attr: val
-                        for attr, val in row.items()
-                        if attr in ["target_reference", "origins", "types"]
-                    }
-                    typer.secho(
-                        f"\nAdding the tag key {key} and tag value {value} to projects within {target} for easy filtering via the UI",
-                        bold=True,
-                    )
-                    collection.apply_tags_to_projects(
-                        snyktkn, [org_id], target, value, key, tenant, filters
-                    )
-                openfile.close()
-            elif ".json" in openfile.name:
-                jsonreader = json.load(openfile)
-                for row in jsonreader:
-                    org_id = row.get("org-id")
-                    target = row.get("target")
-                    key = row.get("key")
-                    value = row.get("value")
-                    filters = {
-                        attr: val
-                        for attr, val in row.items()
-                        if attr in ["target_reference", "origins", "types"]
-                    }
-                    typer.secho(
-                        f"\nAdding the tag key {key} and tag value {value} to projects within {target} for easy filtering via the UI",
-                        bold=True,
-                    )
-                    collection.apply_tags_to_projects(
-                        snyktkn, [org_id], target, value, key, tenant, filters
-                    )
-                openfile.close()
-            else:
-                print(
-                    f"The file {openfile.name} is not valid, it must be either a .csv or a .json"
-                )
-                openfile.close()
-        else:
-            print(f"The file or path does not exist")
+    validate_files(file, rows.tag_rows, tag_row_problems)
+    # Every worker has one write in flight
+    limit = AdaptiveLimit(max(1, workers)) if adaptive else None
+    with create_api(snyktkn, tenant, max_rps, limit) as api, open_journal(
+        journal, resume
+    ) as jrnl, open_plan(plan) as planner:
+
+        # Each organization is listed once, however many rows refer to it
+        targets = TargetIndexCache(api)
+
+        def process_row(row: rows.TagRow) -> bool:
+            typer.secho(
+                f"\nAdding the tag key {row.key} and tag value {row.value} to projects within {row.target} for easy filtering via the UI",
+                bold=True,
+            )
+            return collection.apply_tags_to_projects(
+                snyktkn,
+                [row.org_id],
+                row.target,
+                row.value,
+                row.key,
+                tenant,
+                row.filters,
+                api=api,
+                journal=jrnl,
+                plan=planner,
+                targets=targets,
+            )
+
+        process_files(file, rows.tag_rows, process_row, workers, jrnl)
 
 
 @app.command(
-    help=f"Apply attributes from a .csv or .json to a target, for example {repoexample} \n\n The .csv or .json must be in the format {attributesexample}"
+    help=f"Apply attributes from a .csv, .json or .ndjson to a target, for example {repoexample} \n\n The file must be in the format {attributesexample}"
 )
 def target_attributes(
     file: List[Path] = typer.Option(
-        ..., help=f".csv or .json file with the format {attributesexample}"
+        ..., help=f".csv, .json or .ndjson file with the format {attributesexample}"
     ),
     snyktkn: str = typer.Option(
         ..., help="Snyk API token with org admin access", envvar=["SNYK_TOKEN"]
@@ -103,84 +222,52 @@ def target_attributes(
         "",  # Default value of comamand
         help=f"Defaults to US tenant (app.snyk.io), add 'eu', 'au' or 'us' to use alternative regional tenant. Use --tenant to change tenant.",
     ),
+    workers: int = typer.Option(1, help=workershelp),
+    max_rps: float = typer.Option(0, help=maxrpshelp),
+    adaptive: bool = typer.Option(False, "--adaptive", help=adaptiveworkershelp),
+    journal: Path = typer.Option(None, help=journalhelp),
+    resume: bool = typer.Option(False, "--resume", help=resumehelp),
+    plan: Path = typer.Option(None, help=planhelp),
 ):
-    for path in file:
-        filters = {}
-        if path.is_file():
-            openfile = open(path)
-            if ".csv" in openfile.name:
-                csvreader = csv.DictReader(openfile)
-                for row in csvreader:
-                    org_id = row.get("org-id")
-                    target = row.get("target")
-                    criticality = row.get("criticality")
-                    environment = row.get("environment")
-                    lifecycle = row.get("lifecycle")
-                    filters = {
-                        attr: val
-                        for attr, val in row.items()
-                        if attr in ["target_reference", "origins", "types"]
-                    }
-                    typer.secho(
-                        f"\nAdding the attributes {criticality}, {environment} and {lifecycle} to projects within {target} for easy filtering via the UI",
-                        bold=True,
-                        fg=typer.colors.MAGENTA,
-                    )
-                    attribute.apply_attributes_to_projects(
-                        snyktkn,
-                        [org_id],
-                        target,
-                        [criticality],
-                        [environment],
-                        [lifecycle],
-                        tenant,
-                        filters,
-                    )
-                openfile.close()
-            elif ".json" in openfile.name:
-                jsonreader = json.load(openfile)
-                for row in jsonreader:
-                    org_id = row.get("org-id")
-                    target = row.get("target")
-                    criticality = row.get("criticality")
-                    environment = row.get("environment")
-                    lifecycle = row.get("lifecycle")
-                    filters = {
-                        attr: val
-                        for attr, val in row.items()
-                        if attr in ["target_reference", "origins", "types"]
-                    }
-                    typer.secho(
-                        f"\nAdding the attributes {criticality}, {environment} and {lifecycle} to projects within {target} for easy filtering via the UI",
-                        bold=True,
-                        fg=typer.colors.MAGENTA,
-                    )
-                    attribute.apply_attributes_to_projects(
-                        snyktkn,
-                        [org_id],
-                        target,
-                        [criticality],
-                        [environment],
-                        [lifecycle],
-                        tenant,
-                        filters,
-                    )
-                openfile.close()
-            else:
-                print(
-                    f"The file {openfile.name} is not valid, it must be either a .csv or a .json"
-                )
-                openfile.close()
-        else:
-            print(f"The file or path does not exist")
+    validate_files(file, rows.attribute_rows, attribute_row_problems)
+    # Every worker has one write in flight
+    limit = AdaptiveLimit(max(1, workers)) if adaptive else None
+    with create_api(snyktkn, tenant, max_rps, limit) as api, open_journal(
+        journal, resume
+    ) as jrnl, open_plan(plan) as planner:
+
+        # Each organization is listed once, however many rows refer to it
+        targets = TargetIndexCache(api)
+
+        def process_row(row: rows.AttributeRow) -> bool:
+            typer.secho(
+                f"\nAdding the attributes {row.criticality}, {row.environment} and {row.lifecycle} to projects within {row.target} for easy filtering via the UI",
+                bold=True,
+                fg=typer.colors.MAGENTA,
+            )
+            return attribute.apply_attributes_to_projects(
+                snyktkn,
+                [row.org_id],
+                row.target,
+                [row.criticality],
+                [row.environment],
+                [row.lifecycle],
+                tenant,
+                row.filters,
+                api=api,
+                plan=planner,
+                targets=targets,
+            )
+
+        process_files(file, rows.attribute_rows, process_row, workers, jrnl)
 
 
 @app.command(
-    help=f"Remove tags from a Group with .csv or .json, this can be forced through --force"
+    help=f"Remove tags from a Group with .csv, .json or .ndjson, this can be forced through --force"
 )
 def remove_tag_from_group(
     file: List[Path] = typer.Option(
-        ..., help=f".csv or .json file with the format {removetaggroupexample}"
+        ..., help=f".csv, .json or .ndjson file with the format {removetaggroupexample}"
     ),
     group_id: str = typer.Option(
         ...,
@@ -194,58 +281,43 @@ def remove_tag_from_group(
         "",  # Default value of comamand
         help=f"Defaults to US tenant (app.snyk.io), add 'eu', 'au' or 'us' to use alternative regional tenant. Use --tenant to change tenant.",
     ),
+    workers: int = typer.Option(1, help=workershelp),
+    max_rps: float = typer.Option(0, help=maxrpshelp),
     force: bool = typer.Option(
         False,
         "--force",
         help=f"Force delete tag that has entities (default is false), use --force to turn into True.",
     ),
+    journal: Path = typer.Option(None, help=journalhelp),
+    resume: bool = typer.Option(False, "--resume", help=resumehelp),
 ):
-    for path in file:
-        if path.is_file():
-            openfile = open(path)
-            if ".csv" in openfile.name:
-                csvreader = csv.DictReader(openfile)
-                for row in csvreader:
-                    tagKey = row.get("key")
-                    tagValue = row.get("value")
-                    typer.secho(
-                        f"\nRemoving {tagKey}:{tagValue} from Group ID: {group_id}",
-                        bold=True,
-                    )
-                    if tagKey and tagValue:
-                        remove.remove_tag_from_group(
-                            snyktkn, group_id, force, tagValue, tagKey, tenant
-                        )
-                openfile.close()
-            elif ".json" in openfile.name:
-                jsonreader = json.load(openfile)
-                for row in jsonreader:
-                    tagKey = row.get("key")
-                    tagValue = row.get("value")
-                    typer.secho(
-                        f"\nRemoving {tagKey}:{tagValue} from Group ID: {group_id}",
-                        bold=True,
-                    )
-                    if tagKey and tagValue:
-                        remove.remove_tag_from_group(
-                            snyktkn, group_id, force, tagValue, tagKey, tenant
-                        )
-                openfile.close()
-            else:
-                print(
-                    f"The file {openfile.name} is not valid, it must be either a .csv or a .json"
-                )
-                openfile.close()
-        else:
-            print(f"The file or path does not exist")
+    validate_files(file, rows.group_tag_rows, group_tag_row_problems)
+    with create_api(snyktkn, tenant, max_rps) as api, open_journal(
+        journal, resume
+    ) as jrnl:
+
+        def process_row(row: rows.GroupTagRow) -> bool:
+            typer.secho(
+                f"\nRemoving {row.key}:{row.value} from Group ID: {group_id}",
+                bold=True,
+            )
+            if not (row.key and row.value):
+                return True
+            status, _ = remove.remove_tag_from_group(
+                snyktkn, group_id, force, row.value, row.key, tenant, api=api
+            )
+            return status in (200, 422)
+
+        process_files(file, rows.group_tag_rows, process_row, workers, jrnl)
 
 
 @app.command(
-    help=f"Remove a tag from a target with .csv or .json, for example {repoexample}"
+    help=f"Remove a tag from a target with .csv, .json or .ndjson, for example {repoexample}"
 )
 def remove_tag_from_target(
     file: List[Path] = typer.Option(
-        ..., help=f".csv or .json file with the format {removetagtargetexample}"
+        ...,
+        help=f".csv, .json or .ndjson file with the format {removetagtargetexample}",
     ),
     snyktkn: str = typer.Option(
         ..., help="Snyk API token with org admin access", envvar=["SNYK_TOKEN"]
@@ -254,44 +326,40 @@ def remove_tag_from_target(
         "",  # Default value of comamand
         help=f"Defaults to US tenant (app.snyk.io), add 'eu', 'au' or 'us' to use alternative regional tenant. Use --tenant to change tenant.",
     ),
+    workers: int = typer.Option(1, help=workershelp),
+    max_rps: float = typer.Option(0, help=maxrpshelp),
+    concurrency: int = typer.Option(
+        10, help="Number of projects of each row the tag is removed from in parallel"
+    ),
+    adaptive: bool = typer.Option(False, "--adaptive", help=adaptivehelp),
+    journal: Path = typer.Option(None, help=journalhelp),
+    resume: bool = typer.Option(False, "--resume", help=resumehelp),
 ):
-    for path in file:
-        if path.is_file():
-            openfile = open(path)
-            if ".csv" in openfile.name:
-                csvreader = csv.DictReader(openfile)
-                for row in csvreader:
-                    org_id = row.get("org-id")
-                    target = row.get("target")
-                    key = row.get("key")
-                    value = row.get("value")
-                    typer.secho(
-                        f"\nRemoving {key}:{value} from projects within {target}",
-                        bold=True,
-                    )
-                    remove.remove_tags_from_projects(
-                        snyktkn, org_id, target, value, key, tenant
-                    )
-                openfile.close()
-            elif ".json" in openfile.name:
-                jsonreader = json.load(openfile)
-                for row in jsonreader:
-                    org_id = row.get("org-id")
-                    target = row.get("target")
-                    key = row.get("key")
-                    value = row.get("value")
-                    typer.secho(
-                        f"\nRemoving {key}:{value} from projects within {target}",
-                        bold=True,
-                    )
-                    remove.remove_tags_from_projects(
-                        snyktkn, org_id, target, value, key, tenant
-                    )
-                openfile.close()
-            else:
-                print(
-                    f"The file {openfile.name} is not valid, it must be either a .csv or a .json"
-                )
-                openfile.close()
-        else:
-            print(f"The file or path does not exist")
+    validate_files(file, rows.tag_rows, tag_row_problems)
+    # Every worker may have up to --concurrency removals in flight
+    limit = AdaptiveLimit(max(1, workers) * max(1, concurrency)) if adaptive else None
+    with create_api(snyktkn, tenant, max_rps, limit) as api, open_journal(
+        journal, resume
+    ) as jrnl:
+
+        # Each organization is listed once, however many rows refer to it
+        targets = TargetIndexCache(api)
+
+        def process_row(row: rows.TagRow) -> bool:
+            typer.secho(
+                f"\nRemoving {row.key}:{row.value} from projects within {row.target}",
+                bold=True,
+            )
+            return remove.remove_tags_from_projects(
+                snyktkn,
+                row.org_id,
+                row.target,
+                row.value,
+                row.key,
+                tenant,
+                api=api,
+                targets=targets,
+                concurrency=concurrency,
+            )
+
+        process_files(file, rows.tag_rows, process_row, workers, jrnl)
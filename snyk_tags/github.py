@@ -5,11 +5,11 @@ import re
 
 import httpx
 import typer
-import validators
-from github import Github
-from github import Auth
 from rich import print
-from snyk import SnykClient
+
+from snyk_tags.lib.api import Api, tenant_urls
+from snyk_tags.lib.plan import ProjectWrite, apply_project_write
+from snyk_tags.lib.tracing import span
 
 logging.basicConfig(
     level=logging.INFO,
@@ -24,13 +24,11 @@ app = typer.Typer()
 
 # Reach to the API and generate tokens
 def create_client(token: str, tenant: str) -> httpx.Client:
-    base_url = (
-        f"https://api.{tenant}.snyk.io/v1"
-        if tenant in ["eu", "au", "us"]
-        else "https://api.snyk.io/v1"
-    )
+    base_url = tenant_urls(tenant)["v1_url"]
     headers = {"Authorization": f"token {token}"}
-    return httpx.Client(base_url=base_url, headers=headers)
+    # Requests are metered and rate limited like those of the Api
+    event_hooks = Api.for_tenant(token, tenant).event_hooks()
+    return httpx.Client(base_url=base_url, headers=headers, event_hooks=event_hooks)
 
 
 # Apply tags to a specific project
@@ -47,9 +45,10 @@ def apply_tag_to_project(
         "value": tag,
     }
 
-    req = client.post(
-        f"org/{org_id}/project/{project_id}/tags", data=tag_data, timeout=None
-    )
+    with span("add project tag", org_id=org_id, project_id=project_id):
+        req = client.post(
+            f"org/{org_id}/project/{project_id}/tags", data=tag_data, timeout=None
+        )
 
     if req.status_code == 200:
         logging.info(f"Successfully added {tag_data} tags to Project: {project_name}.")
@@ -64,7 +63,26 @@ def apply_tag_to_project(
     return req.status_code, req.json()
 
 
+# Apply the tags collected for a project, in a single request when there are
+# several of them
+def apply_tags_to_project(api: Api, client: httpx.Client, write: ProjectWrite):
+    if len(write) > 1:
+        apply_project_write(api, write)
+        return
+    for mutation in write.mutations:
+        apply_tag_to_project(
+            client=client,
+            org_id=write.org_id,
+            project_id=write.project_id,
+            tag=mutation["value"],
+            key=mutation["key"],
+            project_name=write.name,
+        )
+
+
 def validate_gh_url(url: str) -> str:
+    import validators
+
     validated_url = "invalid_gh_base_url"
     if validators.url(url):
         validated_url = url
@@ -80,22 +98,15 @@ def apply_github_owner_to_repo(
     tenant: str,
     gh_base_url: str,
 ) -> None:
+    # PyGithub is slow to import, so only load it when needed
+    from github import Auth, Github
+
     ghauth = Auth.Token(githubtoken)
     g = Github(base_url=gh_base_url, auth=ghauth)
-    with create_client(token=snyktoken, tenant=tenant) as client:
+    api = Api.for_tenant(snyktoken, tenant)
+    with api, create_client(token=snyktoken, tenant=tenant) as client:
         for org_id in org_ids:
-            base_url = (
-                f"https://api.{tenant}.snyk.io/rest"
-                if tenant in ["eu", "au", "us"]
-                else "https://api.snyk.io/rest"
-            )
-            client_v3 = SnykClient(
-                token=snyktoken, url=base_url, version="2023-08-31~experimental"
-            )
-            params = {"limit": 100}
-            projects = client_v3.get_rest_pages(
-                f"/orgs/{org_id}/projects", params=params
-            )
+            projects = api.org_projects(org_id)
 
             badname = 0
             rightname = 0
@@ -104,6 +115,7 @@ def apply_github_owner_to_repo(
                     "attributes"
                 ]["name"].startswith(name + ":"):
                     repo = g.get_repo(name)
+                    write = ProjectWrite(org_id, project)
                     contents = [""]
                     while contents:
                         entries = repo.get_contents(contents.pop(0))
@@ -119,20 +131,11 @@ def apply_github_owner_to_repo(
                                         if owner == "":
                                             pass
                                         elif owner[0] == "@":
-                                            owner = owner[1:]
-                                            apply_tag_to_project(
-                                                client=client,
-                                                org_id=org_id,
-                                                project_id=project["id"],
-                                                tag=owner,
-                                                key="Owner",
-                                                project_name=project["attributes"][
-                                                    "name"
-                                                ],
-                                            )
+                                            write.add_tag("Owner", owner[1:])
                                 else:
                                     print("Invalid CODEOWNERS file")
                                 break
+                    apply_tags_to_project(api, client, write)
                     rightname = 1
                 else:
                     badname = 1
@@ -150,22 +153,15 @@ def apply_github_topics_to_repo(
     tenant: str,
     gh_base_url: str,
 ) -> None:
+    # PyGithub is slow to import, so only load it when needed
+    from github import Auth, Github
+
     ghauth = Auth.Token(githubtoken)
     g = Github(base_url=gh_base_url, auth=ghauth)
-    with create_client(token=snyktoken, tenant=tenant) as client:
+    api = Api.for_tenant(snyktoken, tenant)
+    with api, create_client(token=snyktoken, tenant=tenant) as client:
         for org_id in org_ids:
-            base_url = (
-                f"https://api.{tenant}.snyk.io/rest"
-                if tenant in ["eu", "au", "us"]
-                else "https://api.snyk.io/rest"
-            )
-            client_v3 = SnykClient(
-                token=snyktoken, url=base_url, version="2023-08-31~experimental"
-            )
-            params = {"limit": 100}
-            projects = client_v3.get_rest_pages(
-                f"/orgs/{org_id}/projects", params=params
-            )
+            projects = api.org_projects(org_id)
 
             badname = 0
             rightname = 0
@@ -180,15 +176,10 @@ def apply_github_topics_to_repo(
                         )
                         break
                     else:
+                        write = ProjectWrite(org_id, project)
                         for topic in repo.get_topics():
-                            apply_tag_to_project(
-                                client=client,
-                                org_id=org_id,
-                                project_id=project["id"],
-                                tag=topic,
-                                key="GitHubTopic",
-                                project_name=project["attributes"]["name"],
-                            )
+                            write.add_tag("GitHubTopic", topic)
+                        apply_tags_to_project(api, client, write)
                     rightname = 1
                 else:
                     badname = 1
@@ -1,6 +1,17 @@
+import os
+import threading
+import time
+from contextlib import nullcontext
+
 import httpx
 import backoff
 
+from snyk_tags.lib.concurrency import AdaptiveLimit
+from snyk_tags.lib.metrics import request_metrics
+from snyk_tags.lib.prefetch import prefetch
+from snyk_tags.lib.shared_rate import shared_rate_budget
+from snyk_tags.lib.tracing import span
+
 
 def backoff_fatal_request_error(e):
     if not hasattr(e, "response") or not hasattr(e.response, "status_code"):
@@ -16,9 +27,83 @@ backoff_params = {
     "max_time": 300,
     "giveup": backoff_fatal_request_error,
     "jitter": backoff.full_jitter,
+    "on_backoff": request_metrics.on_backoff,
 }
 
 
+# SNYK_TAGS_API_URL overrides the tenant API host, e.g. to run against a proxy
+# or the local mock API used by the benchmarks.
+def tenant_urls(tenant: str) -> dict:
+    host = f"api.{tenant}.snyk.io" if tenant in ["eu", "au", "us"] else "api.snyk.io"
+    base_url = os.environ.get("SNYK_TAGS_API_URL", f"https://{host}").rstrip("/")
+    return {
+        "v1_url": f"{base_url}/v1",
+        "rest_url": f"{base_url}/rest",
+    }
+
+
+def has_tag(project: dict, key: str, value: str) -> bool:
+    return any(
+        tag.get("key") == key and tag.get("value") == value
+        for tag in project.get("attributes", {}).get("tags") or []
+    )
+
+
+# Attributes set through the v1 API, mapped to the project attribute holding
+# their value in REST API responses
+PROJECT_ATTRIBUTES = {
+    "criticality": "business_criticality",
+    "environment": "environment",
+    "lifecycle": "lifecycle",
+}
+
+
+# Whether a listed project already has these attribute values, in any order.
+# Attributes missing from the listing are never assumed to be set.
+def has_attributes(project: dict, attributes: dict) -> bool:
+    current = project.get("attributes", {})
+    return all(
+        PROJECT_ATTRIBUTES[name] in current
+        and sorted(current[PROJECT_ATTRIBUTES[name]] or []) == sorted(values)
+        for name, values in attributes.items()
+    )
+
+
+# Body of a REST project PATCH setting these tags and v1 style attributes
+def project_patch(project_id: str, tags: list = None, attributes: dict = None):
+    body = {}
+    if tags is not None:
+        body["tags"] = tags
+    for name, values in (attributes or {}).items():
+        body[PROJECT_ATTRIBUTES[name]] = values
+    return {"data": {"type": "project", "id": project_id, "attributes": body}}
+
+
+# Token bucket shared by every request sent through the clients it is attached
+# to, safe to use from multiple threads.
+class RateLimiter:
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._last) * self.rate
+            )
+            self._last = now
+            # Reserve a token even if the bucket is empty, so that concurrent
+            # callers queue up behind each other rather than all waking at once.
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+
 class Api:
     def __init__(
         self,
@@ -26,11 +111,58 @@ class Api:
         v1_url="https://api.snyk.io/v1",
         rest_url="https://api.snyk.io/rest",
         rest_version="2023-07-19~beta",
+        rate_limiter: RateLimiter = None,
+        max_connections: int = 100,
+        prefetch_pages: int = None,
+        concurrency_limit: AdaptiveLimit = None,
     ):
         self.token = token
         self.v1_url = v1_url
         self.rest_url = rest_url
         self.rest_version = rest_version
+        self.rate_limiter = rate_limiter
+        self.max_connections = max_connections
+        if prefetch_pages is None:
+            prefetch_pages = int(os.environ.get("SNYK_TAGS_PREFETCH_PAGES", 1))
+        self.prefetch_pages = prefetch_pages
+        self.concurrency_limit = concurrency_limit
+        self._v1 = None
+        self._v3 = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_tenant(cls, token, tenant: str = "", **kwargs):
+        return cls(token, **tenant_urls(tenant), **kwargs)
+
+    # Hooks every request of this Api goes through, also used by the clients
+    # built outside of it
+    def event_hooks(self) -> dict:
+        event_hooks = request_metrics.event_hooks()
+        if self.rate_limiter:
+            # Wait for the rate limiter before the request is timed
+            event_hooks["request"].insert(
+                0, lambda request: self.rate_limiter.acquire()
+            )
+        shared_limiter = shared_rate_budget.limiter(self.token, self.rest_url)
+        if shared_limiter:
+            # Draw from the budget of every process using this token and tenant
+            event_hooks["request"].insert(0, lambda request: shared_limiter.acquire())
+            event_hooks["response"].append(shared_limiter.on_response)
+        if self.concurrency_limit:
+            for name, hooks in self.concurrency_limit.event_hooks().items():
+                event_hooks[name] += hooks
+        return event_hooks
+
+    def _client_kwargs(self):
+        return {
+            "limits": httpx.Limits(max_connections=self.max_connections),
+            "event_hooks": self.event_hooks(),
+        }
+
+    # Slot for a request of a concurrent mutation path, held while the request
+    # and its retries are in flight
+    def slot(self):
+        return self.concurrency_limit or nullcontext()
 
     def v1_client(self):
         return httpx.Client(
@@ -40,6 +172,7 @@ class Api:
                 "Content-Type": "application/json",
             },
             params={},
+            **self._client_kwargs(),
         )
 
     def v3_client(self):
@@ -52,42 +185,182 @@ class Api:
             params={
                 "version": self.rest_version,
             },
+            **self._client_kwargs(),
         )
 
+    # Pooled clients, created on first use and shared by all threads using
+    # this Api instance.
+    @property
+    def v1(self) -> httpx.Client:
+        with self._lock:
+            if self._v1 is None:
+                self._v1 = self.v1_client()
+            return self._v1
+
+    @property
+    def v3(self) -> httpx.Client:
+        with self._lock:
+            if self._v3 is None:
+                self._v3 = self.v3_client()
+            return self._v3
+
+    def close(self):
+        with self._lock:
+            for c in (self._v1, self._v3):
+                if c is not None:
+                    c.close()
+            self._v1 = self._v3 = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @backoff.on_exception(backoff.expo, httpx.HTTPError, **backoff_params)
+    def group_org_ids(self, group_id: str) -> list:
+        resp = self.v1.get(f"/group/{group_id}/orgs", timeout=None)
+        resp.raise_for_status()
+        return [org["id"] for org in resp.json().get("orgs", [])]
+
+    # Tags of a group, fetched a page at a time from the v1 API
+    def group_tags(self, group_id: str, per_page: int = 1000):
+        page = 1
+        while True:
+            tags = self._group_tags_page(group_id, per_page, page)
+            yield from tags
+            if len(tags) < per_page:
+                return
+            page += 1
+
     @backoff.on_exception(backoff.expo, httpx.HTTPError, **backoff_params)
-    def org_projects(self, org_id: str):
-        with self.v3_client() as c:
-            next = f"/orgs/{org_id}/projects?expand=target&limit=100"
-            while next:
-                resp = c.get(next)
-                resp.raise_for_status()
-                assert resp.status_code == 200
-                body = resp.json()
+    def _group_tags_page(self, group_id: str, per_page: int, page: int) -> list:
+        with span("list group tags page", group_id=group_id, page=page) as s:
+            resp = self.v1.get(
+                f"/group/{group_id}/tags",
+                params={"perPage": per_page, "page": page},
+                timeout=None,
+            )
+            resp.raise_for_status()
+            tags = resp.json().get("tags", [])
+            s.set_attribute("item_count", len(tags))
+        return tags
+
+    @backoff.on_exception(backoff.expo, httpx.HTTPError, **backoff_params)
+    def delete_group_tag(self, group_id: str, tag: dict, force: bool = False):
+        with span("delete group tag", group_id=group_id):
+            resp = self.v1.post(
+                f"/group/{group_id}/tags/delete",
+                json={**tag, "force": True} if force else tag,
+                timeout=None,
+            )
+            resp.raise_for_status()
+
+    # One page of a REST collection, traced as one span and retried on its own
+    @backoff.on_exception(backoff.expo, httpx.HTTPError, **backoff_params)
+    def rest_page(self, path: str, params: dict, span_name: str, **attributes):
+        with span(span_name, **attributes) as s:
+            resp = self.v3.get(path, params=params)
+            resp.raise_for_status()
+            assert resp.status_code == 200
+            body = resp.json()
+            s.set_attribute("item_count", len(body.get("data", [])))
+        return body
+
+    # Pages of items of a paginated REST collection, in order
+    def rest_pages(self, path: str, params: dict, span_name: str, **attributes):
+        next = path
+        page = 0
+        while next:
+            body = self.rest_page(next, params, span_name, page=page, **attributes)
+            items = body.get("data", [])
+            if len(items) == 0:
+                return
+
+            yield items
+
+            # Next links are fully formed and relative to the API host.
+            next = body.get("links", {}).get("next")
+            if next and next.startswith("/rest/"):
+                next = next[len("/rest") :]
+            params = None
+            page += 1
+
+    # Items of a paginated REST collection. Up to prefetch_pages next pages are
+    # fetched in the background while the consumer processes the current one.
+    def rest_items(self, path: str, params: dict, span_name: str, **attributes):
+        pages = self.rest_pages(path, params, span_name, **attributes)
+        if self.prefetch_pages > 0:
+            pages = prefetch(pages, self.prefetch_pages)
+        for items in pages:
+            yield from items
 
-                projects = body.get("data", [])
-                if len(projects) == 0:
-                    return
+    def org_projects(self, org_id: str, params: dict = None):
+        params = {"expand": "target", "limit": 100, **(params or {})}
+        yield from self.rest_items(
+            f"/orgs/{org_id}/projects", params, "list projects page", org_id=org_id
+        )
 
-                for project in body.get("data", []):
-                    yield project
+    def org_targets(self, org_id: str, params: dict = None):
+        params = {"limit": 100, **(params or {})}
+        yield from self.rest_items(
+            f"/orgs/{org_id}/targets", params, "list targets page", org_id=org_id
+        )
 
-                next = body.get("links", {}).get("next")
-            return
+    # Projects of the targets with exactly this display name, found through the
+    # targets API rather than by listing every project of the organization
+    def target_projects(self, org_id: str, display_name: str, params: dict = None):
+        targets = [
+            target["id"]
+            for target in self.org_targets(org_id, {"display_name": display_name})
+            if target.get("attributes", {}).get("display_name") == display_name
+        ]
+        if not targets:
+            return []
+        return list(
+            self.org_projects(
+                org_id, {**(params or {}), "target_id": ",".join(targets)}
+            )
+        )
 
     @backoff.on_exception(backoff.expo, httpx.HTTPError, **backoff_params)
     def add_project_tag(self, org_id: str, project_id: str, tag: dict):
-        with self.v1_client() as c:
-            resp = c.post(
+        with span("add project tag", org_id=org_id, project_id=project_id):
+            resp = self.v1.post(
                 f"/org/{org_id}/project/{project_id}/tags", json=tag, timeout=None
             )
             resp.raise_for_status()
 
     @backoff.on_exception(backoff.expo, httpx.HTTPError, **backoff_params)
     def remove_project_tag(self, org_id: str, project_id: str, tag: dict):
-        with self.v1_client() as c:
-            resp = c.post(
+        with span("remove project tag", org_id=org_id, project_id=project_id):
+            resp = self.v1.post(
                 f"/org/{org_id}/project/{project_id}/tags/remove",
                 json=tag,
                 timeout=None,
             )
             resp.raise_for_status()
+
+    @backoff.on_exception(backoff.expo, httpx.HTTPError, **backoff_params)
+    def set_project_attributes(self, org_id: str, project_id: str, attributes: dict):
+        with span("set project attributes", org_id=org_id, project_id=project_id):
+            resp = self.v1.post(
+                f"/org/{org_id}/project/{project_id}/attributes",
+                json=attributes,
+                timeout=None,
+            )
+            resp.raise_for_status()
+
+    # Set the final tags and attributes of a project in one REST request. Tags
+    # replace the whole tag set of the project, attributes not given are kept.
+    @backoff.on_exception(backoff.expo, httpx.HTTPError, **backoff_params)
+    def update_project(
+        self, org_id: str, project_id: str, tags: list = None, attributes: dict = None
+    ):
+        with span("update project", org_id=org_id, project_id=project_id):
+            resp = self.v3.patch(
+                f"/orgs/{org_id}/projects/{project_id}",
+                json=project_patch(project_id, tags, attributes),
+                timeout=None,
+            )
+            resp.raise_for_status()
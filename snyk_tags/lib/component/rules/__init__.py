@@ -1 +1 @@
-from .model import parse_rules, project_matcher
+from .model import parse_rules, project_matcher, project_rule_input
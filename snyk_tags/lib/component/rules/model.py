@@ -81,6 +81,24 @@ schema = {
 }
 
 
+# Extract and transform project and target data from an API response for rule
+# input. Rules operate over project attributes, extended with a "target" object
+# property derived from the related target's attributes.
+def project_rule_input(project: dict) -> dict:
+    project_obj = {"id": project["id"]}
+    project_obj.update(**project.get("attributes", {}))
+
+    target = (
+        project.get("relationships", {})
+        .get("target", {})
+        .get("data", {})
+        .get("attributes")
+    )
+    if target:
+        project_obj.update(target=target)
+    return project_obj
+
+
 def parse_rules(input):
     data = yaml.safe_load(input)
     jsonschema.validate(data, schema)
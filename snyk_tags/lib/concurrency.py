@@ -0,0 +1,72 @@
+import threading
+import time
+
+
+# Limit on the requests in flight which adapts to the API, additively growing
+# by about one request per round trip while latency stays close to the best
+# seen, and halving whenever a request sent at the current limit is throttled
+# or fails with a server error. Responses are observed through event hooks on
+# the shared clients, requests take a slot with `with limit:`.
+class AdaptiveLimit:
+    def __init__(
+        self,
+        maximum: int,
+        initial: int = 4,
+        minimum: int = 1,
+        decrease: float = 0.5,
+        latency_tolerance: float = 2.0,
+    ):
+        self.maximum = max(maximum, minimum)
+        self.minimum = minimum
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.limit = float(min(max(initial, minimum), self.maximum))
+        self.in_flight = 0
+        self.baseline = None
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def __enter__(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+        return self
+
+    def __exit__(self, *exc):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def observe(self, status: int, seconds: float):
+        now = time.monotonic()
+        with self._cond:
+            if status == 429 or status >= 500:
+                # Requests sent before the last decrease were sent at the old
+                # limit, and must not shrink the new one again
+                if now - seconds >= self._last_decrease:
+                    self.limit = max(self.minimum, self.limit * self.decrease)
+                    self._last_decrease = now
+                return
+            if self.baseline is None or seconds < self.baseline:
+                self.baseline = seconds
+            else:
+                # Let the baseline follow a slowly drifting API
+                self.baseline += (seconds - self.baseline) * 0.01
+            if seconds <= self.baseline * self.latency_tolerance:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+                self._cond.notify_all()
+
+    def on_request(self, request):
+        request.extensions["snyk_tags_adaptive_start"] = time.monotonic()
+
+    def on_response(self, response):
+        start = response.request.extensions.get("snyk_tags_adaptive_start")
+        seconds = time.monotonic() - start if start else 0.0
+        self.observe(response.status_code, seconds)
+
+    def event_hooks(self) -> dict:
+        return {"request": [self.on_request], "response": [self.on_response]}
+
+
+adaptivehelp = "Adapt the number of requests in flight to the API, backing off on 429 and server errors, up to --concurrency"
@@ -0,0 +1,87 @@
+import json
+import threading
+from contextlib import nullcontext
+from pathlib import Path
+
+import typer
+
+
+# Append-only record of completed work, one JSON array per line. Entries are
+# flushed as soon as they are written so that an interrupted run can be resumed
+# from the last completed mutation or input row.
+class Journal:
+    def __init__(self, path: Path, resume: bool = False):
+        self.path = Path(path)
+        self._done = set()
+        self._lock = threading.Lock()
+        if resume and self.path.exists():
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        self._done.add(tuple(json.loads(line)))
+                    except (ValueError, TypeError):
+                        # A partially written final line from a crashed run
+                        continue
+        self._f = open(self.path, "a" if resume else "w")
+
+    @property
+    def size(self) -> int:
+        return len(self._done)
+
+    def is_done(self, *entry) -> bool:
+        return tuple(entry) in self._done
+
+    def record(self, *entry):
+        entry = tuple(entry)
+        with self._lock:
+            if entry in self._done:
+                return
+            self._done.add(entry)
+            self._f.write(json.dumps(entry) + "\n")
+            self._f.flush()
+
+    def mutation_done(self, org_id, project_id, op, key, value) -> bool:
+        return self.is_done("mutation", org_id, project_id, op, key, value)
+
+    def record_mutation(self, org_id, project_id, op, key, value):
+        self.record("mutation", org_id, project_id, op, key, value)
+
+    def org_done(self, org_id, op, key, value, scope="") -> bool:
+        return self.is_done("org", org_id, op, key, value, scope)
+
+    def record_org(self, org_id, op, key, value, scope=""):
+        self.record("org", org_id, op, key, value, scope)
+
+    def row_done(self, source, index) -> bool:
+        return self.is_done("row", source, index)
+
+    def record_row(self, source, index):
+        self.record("row", source, index)
+
+    def close(self):
+        with self._lock:
+            self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Context manager yielding a Journal, or None when journaling is not enabled.
+# A journal with entries is only continued with --resume, never overwritten.
+def open_journal(path: Path = None, resume: bool = False):
+    if path is None:
+        if resume:
+            raise typer.BadParameter("--resume requires --journal")
+        return nullcontext()
+    if not resume and Path(path).is_file() and Path(path).stat().st_size > 0:
+        raise typer.BadParameter(
+            f"the journal {path} already records completed work, use --resume to continue it or remove the file to start over"
+        )
+    return Journal(path, resume=resume)
+
+
+journalhelp = "Record completed work in this append-only journal file, so an interrupted run can be resumed with --resume"
+resumehelp = "Skip mutations and input rows already recorded in the --journal file"
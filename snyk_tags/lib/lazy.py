@@ -0,0 +1,42 @@
+import importlib
+
+import click
+import typer
+from typer.core import TyperGroup
+
+
+# Typer group whose subcommand groups are only imported when they are invoked.
+# Subclasses map each subcommand name to the module and attribute of its Typer
+# app, plus the help text shown in the parent's --help without importing it.
+class LazyGroup(TyperGroup):
+    lazy_subcommands = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._formatting_help = False
+
+    def list_commands(self, ctx):
+        commands = super().list_commands(ctx)
+        return commands + [n for n in self.lazy_subcommands if n not in commands]
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name in self.commands or cmd_name not in self.lazy_subcommands:
+            return super().get_command(ctx, cmd_name)
+
+        module, attr, help = self.lazy_subcommands[cmd_name]
+        if self._formatting_help:
+            # Only the name and help text are needed to list the subcommand
+            return click.Group(name=cmd_name, help=help)
+
+        group = typer.main.get_group(getattr(importlib.import_module(module), attr))
+        group.name = cmd_name
+        group.help = help
+        self.add_command(group, cmd_name)
+        return group
+
+    def format_help(self, ctx, formatter):
+        self._formatting_help = True
+        try:
+            return super().format_help(ctx, formatter)
+        finally:
+            self._formatting_help = False
@@ -0,0 +1,267 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+
+# Upper bounds in seconds of the request latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Path segments followed by an identifier, which is replaced by a placeholder
+# so that requests are aggregated per endpoint rather than per resource.
+ID_SEGMENTS = {"org", "orgs", "project", "projects", "group", "groups", "targets"}
+
+
+def endpoint_name(method: str, path: str) -> str:
+    segments = path.split("/")
+    for i in range(1, len(segments)):
+        if segments[i - 1] in ID_SEGMENTS and segments[i]:
+            segments[i] = "{id}"
+    return f"{method} {'/'.join(segments)}"
+
+
+class EndpointMetrics:
+    def __init__(self):
+        self.statuses = Counter()
+        self.retries = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+
+    @property
+    def count(self) -> int:
+        return sum(self.statuses.values())
+
+    def to_dict(self) -> dict:
+        return {
+            "requests": self.count,
+            "statuses": {str(k): v for k, v in sorted(self.statuses.items())},
+            "retries": self.retries,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "latency_seconds": {
+                "sum": round(self.seconds, 6),
+                "max": round(self.max_seconds, 6),
+                "buckets": dict(zip(map(str, LATENCY_BUCKETS), self.buckets)),
+            },
+        }
+
+
+# Process wide record of the API requests made by a command, fed by httpx
+# event hooks on the shared clients and by the backoff retry handlers.
+class RequestMetrics:
+    def __init__(self):
+        self.endpoints = defaultdict(EndpointMetrics)
+        self.backoff_seconds = Counter()
+        self._lock = threading.Lock()
+
+    def on_request(self, request):
+        request.extensions["snyk_tags_start"] = time.perf_counter()
+
+    def on_response(self, response):
+        response.read()
+        request = response.request
+        start = request.extensions.get("snyk_tags_start")
+        seconds = time.perf_counter() - start if start else 0.0
+        try:
+            sent = len(request.content)
+        except Exception:
+            # Streaming request bodies have no known length
+            sent = 0
+        self.record(
+            endpoint_name(request.method, request.url.path),
+            response.status_code,
+            seconds,
+            bytes_sent=sent,
+            bytes_received=len(response.content),
+        )
+
+    def event_hooks(self) -> dict:
+        return {"request": [self.on_request], "response": [self.on_response]}
+
+    def record(
+        self,
+        endpoint: str,
+        status: int,
+        seconds: float,
+        bytes_sent: int = 0,
+        bytes_received: int = 0,
+    ):
+        with self._lock:
+            m = self.endpoints[endpoint]
+            m.statuses[status] += 1
+            m.bytes_sent += bytes_sent
+            m.bytes_received += bytes_received
+            m.seconds += seconds
+            m.max_seconds = max(m.max_seconds, seconds)
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    m.buckets[i] += 1
+                    break
+
+    # Handler for backoff's on_backoff, called before each retry is attempted
+    def on_backoff(self, details: dict):
+        e = details.get("exception")
+        try:
+            endpoint = endpoint_name(e.request.method, e.request.url.path)
+        except Exception:
+            endpoint = details["target"].__name__
+        response = getattr(e, "response", None)
+        reason = (
+            "throttled" if getattr(response, "status_code", None) == 429 else "error"
+        )
+        with self._lock:
+            self.endpoints[endpoint].retries += 1
+            self.backoff_seconds[reason] += details.get("wait", 0)
+
+    def reset(self):
+        with self._lock:
+            self.endpoints.clear()
+            self.backoff_seconds.clear()
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            endpoints = {k: v.to_dict() for k, v in sorted(self.endpoints.items())}
+            backoff_seconds = dict(self.backoff_seconds)
+        return {
+            "requests": sum(e["requests"] for e in endpoints.values()),
+            "retries": sum(e["retries"] for e in endpoints.values()),
+            "backoff_seconds": {
+                k: round(v, 3) for k, v in sorted(backoff_seconds.items())
+            },
+            "endpoints": endpoints,
+        }
+
+    def to_prometheus(self) -> str:
+        data = self.to_dict()
+        lines = []
+
+        def metric(name, kind, help, samples):
+            lines.append(f"# HELP snyk_tags_{name} {help}")
+            lines.append(f"# TYPE snyk_tags_{name} {kind}")
+            for suffix, labels, value in samples:
+                label_str = ",".join(
+                    f'{k}="{escape_label(v)}"' for k, v in labels.items()
+                )
+                lines.append(f"snyk_tags_{name}{suffix}{{{label_str}}} {value}")
+
+        endpoints = data["endpoints"].items()
+        metric(
+            "requests_total",
+            "counter",
+            "API requests made, by endpoint and response status.",
+            [
+                ("", {"endpoint": endpoint, "status": status}, count)
+                for endpoint, e in endpoints
+                for status, count in e["statuses"].items()
+            ],
+        )
+        metric(
+            "request_retries_total",
+            "counter",
+            "API requests retried after an error or rate limiting.",
+            [("", {"endpoint": endpoint}, e["retries"]) for endpoint, e in endpoints],
+        )
+        metric(
+            "request_bytes_total",
+            "counter",
+            "Bytes of API request and response bodies.",
+            [
+                (
+                    "",
+                    {"endpoint": endpoint, "direction": direction},
+                    e[f"bytes_{direction}"],
+                )
+                for endpoint, e in endpoints
+                for direction in ("sent", "received")
+            ],
+        )
+        histogram = []
+        for endpoint, e in endpoints:
+            latency = e["latency_seconds"]
+            cumulative = 0
+            for bound, count in latency["buckets"].items():
+                cumulative += count
+                histogram.append(
+                    ("_bucket", {"endpoint": endpoint, "le": bound}, cumulative)
+                )
+            histogram.append(
+                ("_bucket", {"endpoint": endpoint, "le": "+Inf"}, e["requests"])
+            )
+            histogram.append(("_sum", {"endpoint": endpoint}, latency["sum"]))
+            histogram.append(("_count", {"endpoint": endpoint}, e["requests"]))
+        metric(
+            "request_duration_seconds",
+            "histogram",
+            "API request latency, including reading the response body.",
+            histogram,
+        )
+        metric(
+            "backoff_seconds_total",
+            "counter",
+            "Seconds spent waiting before retrying API requests.",
+            [
+                ("", {"reason": reason}, seconds)
+                for reason, seconds in data["backoff_seconds"].items()
+            ],
+        )
+        return "\n".join(lines) + "\n"
+
+    # Write metrics as JSON, or in Prometheus textfile format for .prom files.
+    # The file is replaced atomically, as textfile collectors may read it at
+    # any time.
+    def write(self, path: Path):
+        path = Path(path)
+        if path.suffix == ".prom":
+            content = self.to_prometheus()
+        else:
+            content = json.dumps(self.to_dict(), indent=2) + "\n"
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(content)
+        os.replace(tmp, path)
+
+    def print_summary(self, file=None):
+        from rich.console import Console
+        from rich.table import Table
+
+        data = self.to_dict()
+        if not data["requests"]:
+            return
+        table = Table(title="API requests")
+        table.add_column("Endpoint", no_wrap=True)
+        for column in ("Calls", "Status", "Retry", "KiB out/in", "ms avg/max"):
+            table.add_column(column)
+        for endpoint, e in data["endpoints"].items():
+            latency = e["latency_seconds"]
+            mean = latency["sum"] / e["requests"] if e["requests"] else 0
+            table.add_row(
+                endpoint,
+                str(e["requests"]),
+                " ".join(f"{k}:{v}" for k, v in e["statuses"].items()),
+                str(e["retries"]),
+                f"{e['bytes_sent'] / 1024:.1f}/{e['bytes_received'] / 1024:.1f}",
+                f"{mean * 1000:.0f}/{latency['max'] * 1000:.0f}",
+            )
+        console = Console(file=file or sys.stderr)
+        console.print(table)
+        waits = ", ".join(f"{v}s {k}" for k, v in data["backoff_seconds"].items())
+        console.print(
+            f"{data['requests']} requests, {data['retries']} retries"
+            + (f", waited {waits}" if waits else "")
+        )
+
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+request_metrics = RequestMetrics()
+
+metricssummaryhelp = (
+    "Print a summary of the API requests made to stderr when the command exits"
+)
+metricsfilehelp = "Write API request metrics to this file when the command exits, in Prometheus textfile format if the file name ends in .prom, otherwise as JSON"
@@ -0,0 +1,101 @@
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+# Reason recorded for projects the v1 API answers 404 for
+NOT_FOUND = "not found, likely a read-only or deleted project"
+
+
+# Projects which cannot be changed, e.g. read-only or deleted projects, kept in
+# a JSON file across runs until they expire, so that the mutation paths skip
+# them up front instead of paying for the same failed request every run. As a
+# wrong org ID also gets a 404, a project is only skipped in the org it failed
+# in.
+class NegativeCache:
+    def __init__(self):
+        self.path = None
+        self.ttl = 0.0
+        self._entries = {}
+        self._changed = False
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def load(self, path: Path, ttl_days: float = 7.0):
+        self.path = Path(path)
+        self.ttl = ttl_days * 86400
+        self._entries = read_negative_cache(self.path)
+        now = time.time()
+        live = {k: v for k, v in self._entries.items() if v["expires"] > now}
+        self._changed = len(live) != len(self._entries)
+        self._entries = live
+        return self
+
+    # Why a project is known to be unchangeable, or None
+    def reason(self, org_id: str, project_id: str):
+        entry = self._entries.get(project_id)
+        if entry and entry["org_id"] == org_id and entry["expires"] > time.time():
+            return entry["reason"]
+        return None
+
+    def skip(self, org_id: str, project_id: str, project_name: str = None) -> bool:
+        reason = self.reason(org_id, project_id)
+        if reason:
+            logging.info(f"Skipping Project: {project_name or project_id}, {reason}.")
+        return reason is not None
+
+    def add(self, org_id: str, project_id: str, reason: str, project_name=None):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[project_id] = {
+                "org_id": org_id,
+                "name": project_name,
+                "reason": reason,
+                "expires": round(time.time() + self.ttl),
+            }
+            self._changed = True
+
+    # Write the cache back if it changed, and stop using it
+    def close(self):
+        with self._lock:
+            if self.enabled and self._changed:
+                tmp = self.path.with_name(self.path.name + ".tmp")
+                tmp.write_text(json.dumps(self._entries, indent=2, sort_keys=True))
+                os.replace(tmp, self.path)
+            self.path = None
+            self._entries = {}
+            self._changed = False
+
+
+# Entries of a negative cache file. A missing file is empty, and so is a corrupt
+# one, e.g. truncated by a crash, as the cache only saves requests.
+def read_negative_cache(path: Path) -> dict:
+    try:
+        with open(path) as f:
+            entries = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except ValueError as e:
+        logging.warning(f"Ignoring the unreadable negative cache {path}: {e}")
+        return {}
+    if not isinstance(entries, dict) or not all(
+        isinstance(entry, dict) and {"org_id", "reason", "expires"} <= entry.keys()
+        for entry in entries.values()
+    ):
+        logging.warning(f"Ignoring the invalid negative cache {path}")
+        return {}
+    return entries
+
+
+negative_cache = NegativeCache()
+
+negativecachehelp = "Remember read-only and deleted projects in this file, and skip them in later runs until they expire"
+negativecachedayshelp = (
+    "Days after which projects in the --negative-cache file are tried again"
+)
@@ -0,0 +1,267 @@
+import json
+import logging
+import threading
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Iterable, Iterator
+
+import httpx
+
+from snyk_tags.lib.api import Api
+from snyk_tags.lib.journal import Journal
+from snyk_tags.lib.negative_cache import NOT_FOUND, negative_cache
+from snyk_tags.lib.rows import iter_ndjson
+
+OPS = ("add_tag", "remove_tag", "set_attributes", "update_project")
+
+
+# Writes the exact mutations a command would make, one JSON object per line,
+# so that they can be reviewed and later executed with `snyk-tags plan apply`.
+class PlanWriter:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.count = 0
+        self._lock = threading.Lock()
+        self._f = open(self.path, "w")
+
+    def add(self, op: str, org_id: str, project_id: str, project_name=None, **data):
+        self.add_mutation(
+            {
+                "op": op,
+                "org_id": org_id,
+                "project_id": project_id,
+                "name": project_name,
+                **data,
+            }
+        )
+
+    def add_mutation(self, mutation: dict):
+        line = json.dumps(mutation, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._f.write(line)
+            self.count += 1
+
+    def add_tag(self, org_id, project_id, key, value, project_name=None):
+        self.add("add_tag", org_id, project_id, project_name, key=key, value=value)
+
+    def remove_tag(self, org_id, project_id, key, value, project_name=None):
+        self.add("remove_tag", org_id, project_id, project_name, key=key, value=value)
+
+    def set_attributes(self, org_id, project_id, attributes: dict, project_name=None):
+        self.add(
+            "set_attributes", org_id, project_id, project_name, attributes=attributes
+        )
+
+    def close(self):
+        with self._lock:
+            self._f.close()
+        logging.info(f"Wrote {self.count} planned changes to {self.path}.")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# The tag and attribute changes wanted for one project during a run. Several
+# changes are coalesced into a single REST PATCH carrying the final tags and
+# attributes of the project, instead of one v1 request per change.
+class ProjectWrite:
+    def __init__(self, org_id: str, project: dict):
+        attributes = project.get("attributes", {})
+        self.org_id = org_id
+        self.project_id = project["id"]
+        self.name = attributes.get("name")
+        self.tags = [
+            {"key": tag["key"], "value": tag["value"]}
+            for tag in attributes.get("tags") or []
+        ]
+        self.tags_changed = False
+        self.attributes = {}
+        self.mutations = []
+
+    def _mutation(self, op: str, **data) -> dict:
+        mutation = {
+            "op": op,
+            "org_id": self.org_id,
+            "project_id": self.project_id,
+            "name": self.name,
+            **data,
+        }
+        self.mutations.append(mutation)
+        return mutation
+
+    def add_tag(self, key: str, value: str):
+        tag = {"key": key, "value": value}
+        if tag not in self.tags:
+            self.tags.append(tag)
+            self.tags_changed = True
+            self._mutation("add_tag", key=key, value=value)
+
+    def remove_tag(self, key: str, value: str):
+        tag = {"key": key, "value": value}
+        if tag in self.tags:
+            self.tags.remove(tag)
+            self.tags_changed = True
+            self._mutation("remove_tag", key=key, value=value)
+
+    def set_attributes(self, attributes: dict):
+        self.attributes.update(attributes)
+        self._mutation("set_attributes", attributes=attributes)
+
+    # Accumulate a mutation in plan file format
+    def add_mutation(self, mutation: dict):
+        if mutation["op"] == "set_attributes":
+            self.set_attributes(mutation["attributes"])
+        else:
+            getattr(self, mutation["op"])(mutation["key"], mutation["value"])
+
+    def __len__(self):
+        return len(self.mutations)
+
+    # The single mutation making every accumulated change, in plan file format.
+    # A lone change keeps its own request, which unlike a PATCH of the whole tag
+    # set cannot undo tags added concurrently by someone else.
+    def mutation(self) -> dict:
+        if len(self.mutations) == 1:
+            return self.mutations[0]
+        mutation = {
+            "op": "update_project",
+            "org_id": self.org_id,
+            "project_id": self.project_id,
+            "name": self.name,
+            "changes": len(self.mutations),
+        }
+        if self.tags_changed:
+            mutation["tags"] = self.tags
+        if self.attributes:
+            mutation["attributes"] = self.attributes
+        return mutation
+
+
+# Context manager yielding a PlanWriter, or None when no plan file is requested
+def open_plan(path: Path = None):
+    if path is None:
+        return nullcontext()
+    return PlanWriter(path)
+
+
+def read_plan(path: Path) -> Iterator[dict]:
+    with open(path) as f:
+        for mutation in iter_ndjson(f):
+            if mutation.get("op") not in OPS:
+                raise ValueError(f"Unknown plan operation {mutation.get('op')!r}")
+            yield mutation
+
+
+def journal_entry(mutation: dict) -> tuple:
+    if mutation["op"] == "set_attributes":
+        key, value = "attributes", json.dumps(mutation["attributes"], sort_keys=True)
+    elif mutation["op"] == "update_project":
+        changes = {k: mutation.get(k) for k in ("tags", "attributes")}
+        key, value = "project", json.dumps(changes, sort_keys=True)
+    else:
+        key, value = mutation["key"], mutation["value"]
+    return (mutation["org_id"], mutation["project_id"], mutation["op"], key, value)
+
+
+def apply_mutation(api: Api, mutation: dict):
+    org_id, project_id = mutation["org_id"], mutation["project_id"]
+    if mutation["op"] == "add_tag":
+        tag = {"key": mutation["key"], "value": mutation["value"]}
+        api.add_project_tag(org_id, project_id, tag=tag)
+    elif mutation["op"] == "remove_tag":
+        tag = {"key": mutation["key"], "value": mutation["value"]}
+        api.remove_project_tag(org_id, project_id, tag=tag)
+    elif mutation["op"] == "update_project":
+        api.update_project(
+            org_id, project_id, mutation.get("tags"), mutation.get("attributes")
+        )
+    else:
+        api.set_project_attributes(org_id, project_id, mutation["attributes"])
+
+
+# Send the changes accumulated for one project in a single request, recording
+# each of them in the journal once applied. Returns None when the project is
+# skipped as known missing, like apply_tag_to_project, and False on errors.
+def apply_project_write(api: Api, write: ProjectWrite, journal: Journal = None):
+    if negative_cache.skip(write.org_id, write.project_id, write.name):
+        return None
+    try:
+        apply_mutation(api, write.mutation())
+    except httpx.HTTPError as e:
+        if isinstance(e, httpx.HTTPStatusError) and e.response.status_code == 404:
+            negative_cache.add(write.org_id, write.project_id, NOT_FOUND, write.name)
+        logging.error(f"Failed to update project {write.name or write.project_id}: {e}")
+        return False
+    logging.info(f"Successfully applied {len(write)} changes to Project: {write.name}.")
+    if journal:
+        for mutation in write.mutations:
+            journal.record_mutation(*journal_entry(mutation))
+    return True
+
+
+# Execute planned mutations with up to `concurrency` requests in flight, fewer
+# while an adaptive limit of the api backs off. The plan is consumed lazily, so
+# arbitrarily large plans use bounded memory.
+def apply_plan(
+    api: Api,
+    mutations: Iterable[dict],
+    concurrency: int = 10,
+    journal: Journal = None,
+) -> Counter:
+    results = Counter()
+
+    def run(mutation: dict) -> str:
+        try:
+            with api.slot():
+                apply_mutation(api, mutation)
+        except httpx.HTTPStatusError as e:
+            if mutation["op"] == "add_tag" and e.response.status_code == 422:
+                # The tag is already present on the project
+                pass
+            else:
+                if e.response.status_code == 404:
+                    negative_cache.add(
+                        mutation["org_id"],
+                        mutation["project_id"],
+                        NOT_FOUND,
+                        mutation.get("name"),
+                    )
+                logging.error(
+                    f"Failed to {mutation['op']} on project {mutation.get('name') or mutation['project_id']}: {e}"
+                )
+                return "failed"
+        except httpx.HTTPError as e:
+            logging.error(
+                f"Failed to {mutation['op']} on project {mutation.get('name') or mutation['project_id']}: {e}"
+            )
+            return "failed"
+        if journal:
+            journal.record_mutation(*journal_entry(mutation))
+        return "applied"
+
+    concurrency = max(1, concurrency)
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        pending = deque()
+        for mutation in mutations:
+            if journal and journal.mutation_done(*journal_entry(mutation)):
+                results["skipped"] += 1
+                continue
+            if negative_cache.skip(
+                mutation["org_id"], mutation["project_id"], mutation.get("name")
+            ):
+                results["skipped"] += 1
+                continue
+            pending.append(pool.submit(run, mutation))
+            if len(pending) >= concurrency * 4:
+                results[pending.popleft().result()] += 1
+        while pending:
+            results[pending.popleft().result()] += 1
+    return results
+
+
+planhelp = "Write the changes to this plan file instead of applying them, to be executed later with `snyk-tags plan apply`"
@@ -0,0 +1,242 @@
+import jsonschema
+import yaml
+
+from snyk_tags.lib.api import PROJECT_ATTRIBUTES, has_attributes, has_tag
+from snyk_tags.lib.component.rules.matcher import (
+    prop_regex_matcher,
+    prop_string_matcher,
+)
+from snyk_tags.lib.component.rules.model import project_rule_schema
+
+policy_rule_schema = {
+    "type": "object",
+    "properties": {
+        "name": {
+            "type": "string",
+            "minLength": 1,
+        },
+        "projects": {
+            "type": "array",
+            "items": {
+                **project_rule_schema,
+                "properties": {
+                    **project_rule_schema["properties"],
+                    "target": {
+                        **project_rule_schema["properties"]["target"],
+                        "minProperties": 1,
+                    },
+                    "type": {"$ref": "#/$defs/MatcherRule"},
+                },
+                "minProperties": 1,
+            },
+            "minItems": 1,
+        },
+        "tags": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "key": {"type": "string", "minLength": 1},
+                    "value": {"type": "string", "minLength": 1},
+                },
+                "required": ["key", "value"],
+                "additionalProperties": False,
+            },
+        },
+        "attributes": {
+            "type": "object",
+            "properties": {
+                name: {"type": "array", "items": {"type": "string", "minLength": 1}}
+                for name in PROJECT_ATTRIBUTES
+            },
+            "additionalProperties": False,
+        },
+        "component": {
+            "type": "string",
+            "minLength": 1,
+        },
+    },
+    "required": ["name", "projects"],
+    "anyOf": [
+        {"required": ["tags"]},
+        {"required": ["attributes"]},
+        {"required": ["component"]},
+    ],
+    "additionalProperties": False,
+}
+
+schema = {
+    "type": "object",
+    "properties": {
+        "version": {
+            "type": "number",
+            "default": 1,
+        },
+        "rules": {
+            "type": "array",
+            "items": policy_rule_schema,
+            "minItems": 1,
+        },
+    },
+    "required": ["version", "rules"],
+    "additionalProperties": False,
+    "$defs": {
+        "MatcherRule": {
+            "oneOf": [
+                {
+                    "type": "string",
+                    "minLength": 1,
+                },
+                {
+                    "type": "object",
+                    "properties": {
+                        "regex": {
+                            "type": "string",
+                            "minLength": 1,
+                        },
+                    },
+                    "required": ["regex"],
+                },
+            ],
+        },
+    },
+}
+
+
+def parse_policy(input):
+    data = yaml.safe_load(input)
+    jsonschema.validate(data, schema)
+    return data
+
+
+# Unlike component rules, every property of a project matcher must match, at
+# every level of nested objects such as the target
+def all_matcher(obj: dict, context: dict):
+    match_fns = []
+    for k, v in obj.items():
+        if isinstance(v, str):
+            match_fns.append(prop_string_matcher(k, v, context))
+        elif "regex" in v:
+            match_fns.append(prop_regex_matcher(k, v["regex"], context))
+        else:
+            match_fns.append(prop_all_matcher(k, v, context))
+
+    def match_fn(project_obj: dict) -> bool:
+        return all(fn(project_obj) for fn in match_fns)
+
+    return match_fn
+
+
+def prop_all_matcher(k: str, v: dict, context: dict):
+    prop_matcher = all_matcher(v, context)
+
+    def match_fn(obj: dict) -> bool:
+        prop_obj = obj.get(k)
+        if not prop_obj or not isinstance(prop_obj, dict):
+            return False
+        return prop_matcher(prop_obj)
+
+    return match_fn
+
+
+# The changes wanted for one project, merged from every matching rule
+class Outcome:
+    def __init__(self):
+        self.tags = []
+        self.attributes = {}
+        self.component = None
+        self.rules = []
+
+    def add_tag(self, key: str, value: str):
+        if (key, value) not in self.tags:
+            self.tags.append((key, value))
+
+    def add_attribute(self, name: str, values: list):
+        merged = self.attributes.setdefault(name, [])
+        merged.extend(v for v in values if v not in merged)
+
+
+# Compile a policy into a function evaluating every rule against a project
+# rule input object. Tags and attributes of all matching rules are merged, while
+# as with component rules only the first matching component rule applies.
+def policy_evaluator(data):
+    context = {}
+    rules = []
+    for rule in data["rules"]:
+        match_fns = [all_matcher(project, context) for project in rule["projects"]]
+        rules.append((rule, match_fns))
+
+    def evaluate(project_obj: dict) -> Outcome:
+        outcome = Outcome()
+        for rule, match_fns in rules:
+            # Captures are only interpolated into the values of the rule that
+            # extracted them.
+            context.clear()
+            if not any(match_fn(project_obj) for match_fn in match_fns):
+                continue
+            outcome.rules.append(rule["name"])
+            for tag in rule.get("tags", []):
+                outcome.add_tag(tag["key"], tag["value"].format(**context))
+            for name, values in rule.get("attributes", {}).items():
+                outcome.add_attribute(name, [v.format(**context) for v in values])
+            if "component" in rule and not any(
+                key == "component" for key, _ in outcome.tags
+            ):
+                outcome.component = rule["component"].format(**context)
+                outcome.add_tag("component", outcome.component)
+        return outcome
+
+    return evaluate
+
+
+# Mutations bringing a project in line with an outcome, in plan file format.
+# Tags already on the project are skipped, and attributes are set in a single
+# request, keeping the current value of attributes the policy does not set. As
+# with `component tag --exclusive`, a component replaces any other component
+# tag of the project.
+def project_mutations(org_id: str, project: dict, outcome: Outcome) -> list:
+    attributes = project.get("attributes", {})
+    name = attributes.get("name")
+    mutations = []
+    if outcome.component is not None:
+        for tag in attributes.get("tags") or []:
+            if tag.get("key") == "component" and tag.get("value") != outcome.component:
+                mutations.append(
+                    {
+                        "op": "remove_tag",
+                        "org_id": org_id,
+                        "project_id": project["id"],
+                        "name": name,
+                        "key": "component",
+                        "value": tag.get("value"),
+                    }
+                )
+    for key, value in outcome.tags:
+        if not has_tag(project, key, value):
+            mutations.append(
+                {
+                    "op": "add_tag",
+                    "org_id": org_id,
+                    "project_id": project["id"],
+                    "name": name,
+                    "key": key,
+                    "value": value,
+                }
+            )
+    if outcome.attributes:
+        current = {
+            attr: list(attributes.get(field) or [])
+            for attr, field in PROJECT_ATTRIBUTES.items()
+        }
+        wanted = {**current, **outcome.attributes}
+        if not has_attributes(project, wanted):
+            mutations.append(
+                {
+                    "op": "set_attributes",
+                    "org_id": org_id,
+                    "project_id": project["id"],
+                    "name": name,
+                    "attributes": wanted,
+                }
+            )
+    return mutations
@@ -0,0 +1,48 @@
+import contextvars
+import queue
+import threading
+from typing import Iterable, Iterator
+
+_DONE = object()
+
+
+# Iterate over an iterable while a background thread produces up to `depth`
+# items ahead of the consumer, so that producing the next items, e.g. fetching
+# the next pages of a listing, overlaps with processing the current one. Errors
+# of the producer are raised in the consumer once it reaches them.
+def prefetch(iterable: Iterable, depth: int = 1) -> Iterator:
+    items = queue.Queue()
+    slots = threading.Semaphore(depth)
+    stop = threading.Event()
+
+    def produce():
+        try:
+            iterator = iter(iterable)
+            while True:
+                # Wait for the consumer to take an item before producing more
+                while not slots.acquire(timeout=0.1):
+                    if stop.is_set():
+                        return
+                if stop.is_set():
+                    return
+                item = next(iterator, _DONE)
+                items.put((item, None))
+                if item is _DONE:
+                    return
+        except BaseException as e:
+            items.put((_DONE, e))
+
+    # Spans started by the producer belong to the consumer's current span
+    context = contextvars.copy_context()
+    threading.Thread(target=context.run, args=(produce,), daemon=True).start()
+    try:
+        while True:
+            item, error = items.get()
+            if error is not None:
+                raise error
+            if item is _DONE:
+                return
+            slots.release()
+            yield item
+    finally:
+        stop.set()
@@ -0,0 +1,85 @@
+import cProfile
+import io
+import pstats
+import sys
+import threading
+from pathlib import Path
+
+import typer
+
+
+def is_speedscope(path: Path) -> bool:
+    return Path(path).name.endswith(".speedscope.json")
+
+
+# Profiles the command run in the current thread. Profiles are written in
+# pstats format from cProfile, merged with those of the threads started while
+# profiling, e.g. worker pools and listing prefetch, or in speedscope format
+# from the pyinstrument sampling profiler, for the current thread only, when the
+# file name ends in .speedscope.json.
+class CommandProfiler:
+    def __init__(self, path: Path, top: int = 20):
+        self.path = Path(path)
+        self.top = top
+        self._thread_profiles = []
+        self._lock = threading.Lock()
+        self.sampling = is_speedscope(self.path)
+        if self.sampling:
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                raise typer.BadParameter(
+                    "speedscope profiles require pyinstrument, install it with: pip install pyinstrument",
+                    param_hint="--profile",
+                )
+            self._profiler = Profiler()
+        else:
+            self._profiler = cProfile.Profile()
+
+    def start(self):
+        if self.sampling:
+            self._profiler.start()
+        else:
+            threading.setprofile(self._profile_thread)
+            self._profiler.enable()
+
+    # Called by each new thread on its first event, replacing itself with a
+    # profiler of the thread
+    def _profile_thread(self, frame, event, arg):
+        profile = cProfile.Profile()
+        with self._lock:
+            self._thread_profiles.append(profile)
+        profile.enable()
+
+    def stop(self, file=None):
+        file = file or sys.stderr
+        if self.sampling:
+            from pyinstrument.renderers import SpeedscopeRenderer
+
+            self._profiler.stop()
+            self.path.write_text(self._profiler.output(SpeedscopeRenderer()))
+            lines = self._profiler.output_text(flat=True).splitlines()
+            summary = "\n".join(line for line in lines if line.strip())
+            summary = "\n".join(summary.splitlines()[: self.top + 4])
+        else:
+            threading.setprofile(None)
+            self._profiler.disable()
+            stats = pstats.Stats(self._profiler)
+            with self._lock:
+                for profile in self._thread_profiles:
+                    stats.add(profile)
+            stats.dump_stats(self.path)
+            out = io.StringIO()
+            stats = pstats.Stats(str(self.path), stream=out)
+            stats.strip_dirs().sort_stats("tottime").print_stats(self.top)
+            summary = out.getvalue().strip()
+
+        print(
+            f"\nProfile written to {self.path}, top {self.top} functions by own time:\n",
+            file=file,
+        )
+        print(summary, file=file)
+
+
+profilehelp = "Profile the command and write the profile to this file, in pstats format including worker threads, or in speedscope format of the main thread only if the file name ends in .speedscope.json (requires pyinstrument)"
+profiletophelp = "Number of functions listed in the profile summary printed on exit"
@@ -0,0 +1,151 @@
+import csv
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterator, NamedTuple, TextIO
+
+SUPPORTED_SUFFIXES = (".csv", ".json", ".ndjson", ".jsonl")
+
+# Optional per-row columns forwarded as project listing filters
+FILTER_FIELDS = ("target_reference", "origins", "types")
+
+_WHITESPACE = " \t\r\n"
+
+
+class TagRow(NamedTuple):
+    org_id: str
+    target: str
+    key: str
+    value: str
+    filters: Dict[str, Any]
+
+
+class AttributeRow(NamedTuple):
+    org_id: str
+    target: str
+    criticality: str
+    environment: str
+    lifecycle: str
+    filters: Dict[str, Any]
+
+
+class GroupTagRow(NamedTuple):
+    key: str
+    value: str
+
+
+def is_supported(path: Path) -> bool:
+    return path.suffix.lower() in SUPPORTED_SUFFIXES
+
+
+# Incrementally decode the items of a top-level JSON array, holding at most
+# one item (plus one read chunk) in memory at a time.
+def iter_json_array(f: TextIO, chunk_size: int = 65536) -> Iterator[Any]:
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    eof = False
+
+    def fill() -> bool:
+        nonlocal buf, pos, eof
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+            return False
+        buf = buf[pos:] + chunk
+        pos = 0
+        return True
+
+    def skip_ws() -> str:
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in _WHITESPACE:
+                pos += 1
+            if pos < len(buf):
+                return buf[pos]
+            if not fill():
+                return ""
+
+    if skip_ws() != "[":
+        raise ValueError("JSON input must be an array of objects")
+    pos += 1
+    if skip_ws() == "]":
+        return
+
+    while True:
+        skip_ws()
+        while True:
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof or not fill():
+                    raise
+                continue
+            # A value ending exactly at the buffer edge may be truncated
+            # (e.g. a number split across chunks), so read ahead first.
+            if end == len(buf) and not eof and fill():
+                continue
+            break
+        pos = end
+        yield item
+
+        sep = skip_ws()
+        pos += 1
+        if sep == "]":
+            return
+        if sep != ",":
+            raise ValueError(f"Unexpected character {sep!r} in JSON array")
+
+
+def iter_ndjson(f: TextIO) -> Iterator[Any]:
+    for line in f:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+# Lazily yield each row of a .csv, .json (array) or .ndjson/.jsonl file as a dict
+def read_rows(path: Path) -> Iterator[Dict[str, Any]]:
+    suffix = path.suffix.lower()
+    if suffix not in SUPPORTED_SUFFIXES:
+        raise ValueError(
+            f"The file {path} is not valid, it must be either a .csv, .json or .ndjson"
+        )
+    with open(path, newline="" if suffix == ".csv" else None) as f:
+        if suffix == ".csv":
+            yield from csv.DictReader(f)
+        elif suffix == ".json":
+            yield from iter_json_array(f)
+        else:
+            yield from iter_ndjson(f)
+
+
+def row_filters(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {attr: val for attr, val in row.items() if attr in FILTER_FIELDS}
+
+
+def tag_rows(path: Path) -> Iterator[TagRow]:
+    for row in read_rows(path):
+        yield TagRow(
+            org_id=row.get("org-id"),
+            target=row.get("target"),
+            key=row.get("key"),
+            value=row.get("value"),
+            filters=row_filters(row),
+        )
+
+
+def attribute_rows(path: Path) -> Iterator[AttributeRow]:
+    for row in read_rows(path):
+        yield AttributeRow(
+            org_id=row.get("org-id"),
+            target=row.get("target"),
+            criticality=row.get("criticality"),
+            environment=row.get("environment"),
+            lifecycle=row.get("lifecycle"),
+            filters=row_filters(row),
+        )
+
+
+def group_tag_rows(path: Path) -> Iterator[GroupTagRow]:
+    for row in read_rows(path):
+        yield GroupTagRow(key=row.get("key"), value=row.get("value"))
@@ -0,0 +1,120 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+# Seconds every process sharing a budget waits after a 429 without Retry-After
+THROTTLED_PAUSE = 1.0
+
+
+# Budget shared by the processes using the same token against the same tenant,
+# identified without storing the token itself
+def budget_key(token: str, rest_url: str) -> str:
+    fingerprint = hashlib.sha256(token.encode()).hexdigest()[:16]
+    return f"{fingerprint}@{urlsplit(rest_url).netloc}"
+
+
+# Token bucket kept in a SQLite file, so that every process on a host sending
+# requests with the same key draws from one budget instead of each backing off
+# on its own. A 429 seen by any of them pauses all of them.
+class SharedRateLimiter:
+    def __init__(self, path: Path, key: str, rate: float, burst: int = 1):
+        self.key = key
+        self.rate = rate
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            str(path), timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS budgets (key TEXT PRIMARY KEY, tokens REAL, last REAL)"
+        )
+
+    # Update the bucket in one write transaction, returning the seconds to wait
+    def _update(self, change) -> float:
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT tokens, last FROM budgets WHERE key = ?", (self.key,)
+                ).fetchone()
+                now = time.time()
+                tokens, last = row if row else (float(self.burst), now)
+                tokens = min(self.burst, tokens + max(0.0, now - last) * self.rate)
+                tokens = change(tokens)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO budgets (key, tokens, last) VALUES (?, ?, ?)",
+                    (self.key, tokens, now),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return -tokens / self.rate if tokens < 0 else 0
+
+    def acquire(self):
+        # Reserve a token even if the bucket is empty, so that the callers of
+        # all processes queue up behind each other
+        wait = self._update(lambda tokens: tokens - 1)
+        if wait > 0:
+            time.sleep(wait)
+
+    # Keep every process from sending requests for `seconds`
+    def pause(self, seconds: float):
+        self._update(lambda tokens: min(tokens, -seconds * self.rate))
+
+    def on_response(self, response):
+        if response.status_code == 429:
+            try:
+                seconds = float(response.headers.get("Retry-After", ""))
+            except ValueError:
+                seconds = THROTTLED_PAUSE
+            self.pause(seconds)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+# Where and at which rate the shared budgets are kept, set once per command
+class SharedRateBudget:
+    def __init__(self):
+        self.path = None
+        self.rate = 0.0
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None and self.rate > 0
+
+    def configure(self, path: Path, rate: float):
+        self.path = Path(path)
+        self.rate = rate
+        return self
+
+    # The limiter for a token and tenant, shared by every Api of this process
+    def limiter(self, token: str, rest_url: str):
+        if not self.enabled:
+            return None
+        key = budget_key(token, rest_url)
+        with self._lock:
+            if key not in self._limiters:
+                self._limiters[key] = SharedRateLimiter(self.path, key, self.rate)
+            return self._limiters[key]
+
+    def close(self):
+        with self._lock:
+            for limiter in self._limiters.values():
+                limiter.close()
+            self._limiters = {}
+            self.path = None
+            self.rate = 0.0
+
+
+shared_rate_budget = SharedRateBudget()
+
+sharedratebudgethelp = "Share a request rate budget with the other snyk-tags processes of this host using the same token and tenant, kept in this file"
+sharedmaxrpshelp = "Maximum API requests per second of all processes sharing the --shared-rate-budget file"
@@ -0,0 +1,99 @@
+import json
+import threading
+from collections import defaultdict
+from typing import Iterable
+
+from snyk_tags.lib.api import PROJECT_ATTRIBUTES
+
+
+# Target names a project name can belong to. Projects are named after their
+# target, optionally followed by a branch in parentheses and a manifest file
+# after a colon, e.g. "snyk-labs/goof(main):package.json". As target names may
+# themselves contain colons, e.g. container registry ports, every prefix ending
+# before a "(" or ":" is a candidate.
+def target_names(project_name: str) -> list:
+    names = [project_name]
+    for i, c in enumerate(project_name):
+        if c in "(:":
+            names.append(project_name[:i])
+    return names
+
+
+# Maps target names to the projects of an organization listed once, so that
+# resolving any number of targets costs one pass over the projects.
+class TargetIndex:
+    def __init__(self, projects: Iterable[dict] = ()):
+        self._projects = defaultdict(list)
+        self._by_id = {}
+        self.project_count = 0
+        for project in projects:
+            self.add(project)
+
+    def add(self, project: dict):
+        self.project_count += 1
+        self._by_id[project["id"]] = project
+        for name in set(target_names(project["attributes"]["name"])):
+            self._projects[name].append(project)
+
+    def projects(self, target: str) -> list:
+        return self._projects.get(target, [])
+
+    def project(self, project_id: str):
+        return self._by_id.get(project_id)
+
+    def __contains__(self, target: str) -> bool:
+        return target in self._projects
+
+
+# Target indexes of organizations, built on first use and shared by every row
+# of a command, so that each organization is listed once per set of filters.
+class TargetIndexCache:
+    def __init__(self, api):
+        self.api = api
+        self._indexes = {}
+        self._locks = defaultdict(threading.Lock)
+        self._lock = threading.Lock()
+
+    def get(self, org_id: str, filters: dict = None) -> TargetIndex:
+        key = (org_id, json.dumps(filters or {}, sort_keys=True))
+        with self._lock:
+            lock = self._locks[key]
+        # Other organizations can be listed by other threads in the meantime
+        with lock:
+            if key not in self._indexes:
+                self._indexes[key] = TargetIndex(
+                    self.api.org_projects(org_id, params=filters)
+                )
+            return self._indexes[key]
+
+    # The cached listings of a project, one per set of filters it was listed with
+    def _cached_projects(self, org_id: str, project_id: str) -> list:
+        with self._lock:
+            indexes = [i for (org, _), i in self._indexes.items() if org == org_id]
+        return [p for p in (i.project(project_id) for i in indexes) if p]
+
+    # The listings are kept in line with the writes of the command, so that later
+    # rows compare against the current tags and attributes of the projects
+    def add_tag(self, org_id: str, project_id: str, key: str, value: str):
+        tag = {"key": key, "value": value}
+        for project in self._cached_projects(org_id, project_id):
+            tags = project["attributes"].setdefault("tags", [])
+            with self._lock:
+                if tag not in tags:
+                    tags.append(tag)
+
+    def remove_tag(self, org_id: str, project_id: str, key: str, value: str):
+        tag = {"key": key, "value": value}
+        for project in self._cached_projects(org_id, project_id):
+            with self._lock:
+                project["attributes"]["tags"] = [
+                    t
+                    for t in project["attributes"].get("tags") or []
+                    if {"key": t.get("key"), "value": t.get("value")} != tag
+                ]
+
+    def set_attributes(self, org_id: str, project_id: str, attributes: dict):
+        for project in self._cached_projects(org_id, project_id):
+            with self._lock:
+                for name, values in attributes.items():
+                    project["attributes"][PROJECT_ATTRIBUTES[name]] = list(values)
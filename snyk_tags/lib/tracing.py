@@ -0,0 +1,174 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+_current_span = contextvars.ContextVar("snyk_tags_span", default=None)
+_tracer = None
+
+
+class Span:
+    def __init__(self, tracer, name: str, parent=None, attributes: dict = None):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = tracer.trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else ""
+        self.attributes = dict(attributes or {})
+        self.error = None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self._token = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            self.tracer.export(self)
+
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_span.reset(self._token)
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        self.end()
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [
+                {"key": k, "value": otlp_value(v)} for k, v in self.attributes.items()
+            ],
+            "status": (
+                {"code": 2, "message": self.error} if self.error else {"code": 1}
+            ),
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+# Stands in for a span when tracing is disabled, so instrumented code costs
+# no more than a function call.
+class NoopSpan:
+    def set_attribute(self, key: str, value):
+        pass
+
+    def end(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+NOOP_SPAN = NoopSpan()
+
+
+# Records spans for one run and exports them to a file in the OTLP/JSON
+# format, one ExportTraceServiceRequest per line, as read by the OpenTelemetry
+# collector's otlpjsonfile receiver. Spans are written in batches.
+class Tracer:
+    def __init__(self, path: Path, batch_size: int = 512):
+        self.path = Path(path)
+        self.trace_id = os.urandom(16).hex()
+        self.batch_size = batch_size
+        self.root = None
+        self._spans = []
+        self._lock = threading.Lock()
+        self._f = open(self.path, "w")
+
+    def start_span(self, name: str, attributes: dict = None) -> Span:
+        # Threads started by a pool do not inherit the context, so their spans
+        # are attached to the root span of the run.
+        parent = _current_span.get() or self.root
+        return Span(self, name, parent=parent, attributes=attributes)
+
+    def export(self, span: Span):
+        with self._lock:
+            self._spans.append(span)
+            if len(self._spans) >= self.batch_size:
+                self._flush()
+
+    def _flush(self):
+        if not self._spans:
+            return
+        request = {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            {
+                                "key": "service.name",
+                                "value": {"stringValue": "snyk-tags"},
+                            }
+                        ]
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": "snyk_tags"},
+                            "spans": [s.to_otlp() for s in self._spans],
+                        }
+                    ],
+                }
+            ]
+        }
+        self._f.write(json.dumps(request, separators=(",", ":")) + "\n")
+        self._f.flush()
+        self._spans = []
+
+    def close(self):
+        if self.root:
+            self.root.end()
+        with self._lock:
+            self._flush()
+            self._f.close()
+
+
+def otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+# Enable tracing for the rest of the process, with a root span covering the run
+def start_tracing(path: Path, root_name: str, **attributes) -> Tracer:
+    global _tracer
+    _tracer = Tracer(path)
+    _tracer.root = _tracer.start_span(root_name, attributes)
+    return _tracer
+
+
+def stop_tracing():
+    global _tracer
+    if _tracer is not None:
+        _tracer.close()
+        _tracer = None
+
+
+# Context manager timing a block as a span, a no-op unless tracing is enabled
+def span(name: str, **attributes):
+    if _tracer is None:
+        return NOOP_SPAN
+    return _tracer.start_span(name, attributes)
+
+
+tracefilehelp = "Record tracing spans of listing, rule evaluation and mutations to this file, in OTLP/JSON format"
@@ -0,0 +1,88 @@
+import re
+
+# Values accepted by the API for each project attribute, as listed by
+# `snyk-tags list attributes`
+ATTRIBUTE_VALUES = {
+    "criticality": ("critical", "high", "medium", "low"),
+    "environment": (
+        "frontend",
+        "backend",
+        "internal",
+        "external",
+        "mobile",
+        "saas",
+        "onprem",
+        "hosted",
+        "distributed",
+    ),
+    "lifecycle": ("production", "development", "sandbox"),
+}
+
+# Characters and lengths the API accepts in tag keys and values
+TAG_KEY_MAX_LENGTH = 30
+TAG_VALUE_MAX_LENGTH = 256
+TAG_KEY_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")
+TAG_VALUE_PATTERN = re.compile(r"^[A-Za-z0-9_\-/:?#@&+=%~.]+$")
+
+
+def tag_problems(key, value) -> list:
+    problems = []
+    for name, text, max_length, pattern, characters in (
+        ("key", key, TAG_KEY_MAX_LENGTH, TAG_KEY_PATTERN, "-_"),
+        ("value", value, TAG_VALUE_MAX_LENGTH, TAG_VALUE_PATTERN, "-_/:?#@&+=%~."),
+    ):
+        text = "" if text is None else str(text)
+        if not text:
+            problems.append(f"missing tag {name}")
+        elif len(text) > max_length:
+            problems.append(
+                f"tag {name} {text!r} is longer than {max_length} characters"
+            )
+        elif not pattern.match(text):
+            problems.append(
+                f"tag {name} {text!r} may only contain letters, digits and {characters}"
+            )
+    return problems
+
+
+# Problems with attribute values, given as a dict of attribute name to a list
+# of values. Empty values leave the attribute unset and are accepted.
+def attribute_problems(attributes: dict) -> list:
+    problems = []
+    for name, values in attributes.items():
+        for value in values:
+            if value and value not in ATTRIBUTE_VALUES[name]:
+                problems.append(
+                    f"{name} {value!r} is not one of {', '.join(ATTRIBUTE_VALUES[name])}"
+                )
+    return problems
+
+
+def target_problems(row) -> list:
+    problems = []
+    if not row.org_id:
+        problems.append("missing org-id")
+    if not row.target:
+        problems.append("missing target")
+    return problems
+
+
+def tag_row_problems(row) -> list:
+    return target_problems(row) + tag_problems(row.key, row.value)
+
+
+def attribute_row_problems(row) -> list:
+    return target_problems(row) + attribute_problems(
+        {
+            "criticality": [row.criticality],
+            "environment": [row.environment],
+            "lifecycle": [row.lifecycle],
+        }
+    )
+
+
+# Rows without a tag are skipped when removing tags from a group
+def group_tag_row_problems(row) -> list:
+    if not (row.key and row.value):
+        return []
+    return tag_problems(row.key, row.value)
@@ -4,9 +4,15 @@ import typer
 from rich.console import Console
 from rich.table import Table
 import json
+import time
+from itertools import zip_longest
+from pathlib import Path
 import httpx
 
 from snyk_tags import __app_name__, __version__
+from snyk_tags.lib.api import Api, tenant_urls
+from snyk_tags.lib.negative_cache import read_negative_cache
+from snyk_tags.lib.validation import ATTRIBUTE_VALUES
 
 app = typer.Typer()
 console = Console()
@@ -55,27 +61,18 @@ def attributes():
     )
     typer.echo(f"These are all the attribute types you can apply with {snykcmd}")
     table = Table("Criticality", "Environment", "Lifecycle")
-    table.add_row("critical", "frontend", "production")
-    table.add_row("high", "backend", "development")
-    table.add_row("medium", "internal", "sandbox")
-    table.add_row("low", "external", "")
-    table.add_row("", "mobile", "")
-    table.add_row("", "saas", "")
-    table.add_row("", "onprem", "")
-    table.add_row("", "hosted", "")
-    table.add_row("", "distributed", "")
+    for row in zip_longest(*ATTRIBUTE_VALUES.values(), fillvalue=""):
+        table.add_row(*row)
     console.print(table)
 
 
 # Functions for tags listing command
 def create_client(token: str, tenant: str) -> httpx.Client:
-    base_url = (
-        f"https://api.{tenant}.snyk.io/v1"
-        if tenant in ["eu", "au", "us"]
-        else "https://api.snyk.io/v1"
-    )
+    base_url = tenant_urls(tenant)["v1_url"]
     headers = {"Authorization": f"token {token}"}
-    return httpx.Client(base_url=base_url, headers=headers)
+    # Requests are metered and rate limited like those of the Api
+    event_hooks = Api.for_tenant(token, tenant).event_hooks()
+    return httpx.Client(base_url=base_url, headers=headers, event_hooks=event_hooks)
 
 
 # Get the tags from a group
@@ -129,3 +126,37 @@ def tags(
         json,
         tenant=tenant,
     )
+
+
+# List the projects remembered in a negative cache file, so they can be cleaned up
+@app.command(
+    name="unreachable-projects",
+    help="List the read-only and deleted projects remembered in a --negative-cache file",
+)
+def unreachable_projects(
+    negative_cache: Path = typer.Option(
+        ...,
+        "--negative-cache",
+        envvar=["SNYK_TAGS_NEGATIVE_CACHE"],
+        help="Negative cache file written by tagging commands",
+    ),
+    jsonflag: bool = typer.Option(
+        False,
+        "--json",
+        help=f"Output into json format (default is a table), use --json to change output.",
+    ),
+):
+    entries = read_negative_cache(negative_cache)
+    if jsonflag:
+        print(json.dumps(entries))
+        return
+    table = Table("Organization", "Project ID", "Project", "Reason", "Expires")
+    for project_id, entry in sorted(
+        entries.items(), key=lambda e: (e[1]["org_id"] or "", e[1]["name"] or "")
+    ):
+        expires = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry["expires"]))
+        table.add_row(
+            entry["org_id"], project_id, entry["name"], entry["reason"], expires
+        )
+    console.print(table)
+    typer.echo(f"{len(entries)} projects")
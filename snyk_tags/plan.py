@@ -0,0 +1,82 @@
+#! /usr/bin/env python3
+
+import logging
+from collections import Counter
+from pathlib import Path
+
+import typer
+from rich.console import Console
+from rich.table import Table
+
+from snyk_tags.lib import plan as planlib
+from snyk_tags.lib.api import Api, RateLimiter
+from snyk_tags.lib.concurrency import AdaptiveLimit, adaptivehelp
+from snyk_tags.lib.journal import journalhelp, open_journal, resumehelp
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(message)s",
+    datefmt="[%X]",
+)
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+app = typer.Typer()
+console = Console()
+
+
+# Summarise a plan file by organization and operation
+@app.command(help="Summarise the changes recorded in a plan file")
+def show(
+    plan_file: Path = typer.Argument(..., help="Plan file written with --plan"),
+):
+    counts = Counter()
+    for mutation in planlib.read_plan(plan_file):
+        counts[(mutation["org_id"], mutation["op"])] += 1
+
+    table = Table("Organization", "Operation", "Projects")
+    for (org_id, op), count in sorted(counts.items()):
+        table.add_row(org_id, op, str(count))
+    console.print(table)
+
+
+# Execute a plan file without listing projects or evaluating any rules
+@app.command(help="Apply the changes recorded in a plan file")
+def apply(
+    plan_file: Path = typer.Argument(..., help="Plan file written with --plan"),
+    snyktkn: str = typer.Option(
+        ...,  # Default value of comamand
+        help="Snyk API token with org admin access",
+        envvar=["SNYK_TOKEN"],
+    ),
+    tenant: str = typer.Option(
+        "",  # Default value of comamand
+        help=f"Defaults to US tenant (app.snyk.io), add 'eu', 'au' or 'us' to use alternative regional tenant. Use --tenant to change tenant.",
+    ),
+    concurrency: int = typer.Option(10, help="Number of changes applied in parallel"),
+    max_rps: float = typer.Option(
+        0,
+        help="Maximum API requests per second (default 0 means no limit)",
+    ),
+    adaptive: bool = typer.Option(False, "--adaptive", help=adaptivehelp),
+    journal: Path = typer.Option(None, help=journalhelp),
+    resume: bool = typer.Option(False, "--resume", help=resumehelp),
+):
+    api = Api.for_tenant(
+        snyktkn,
+        tenant,
+        rate_limiter=RateLimiter(max_rps) if max_rps > 0 else None,
+        concurrency_limit=AdaptiveLimit(concurrency) if adaptive else None,
+        max_connections=max(concurrency, 1),
+    )
+    with api, open_journal(journal, resume) as jrnl:
+        results = planlib.apply_plan(
+            api, planlib.read_plan(plan_file), concurrency=concurrency, journal=jrnl
+        )
+
+    typer.secho(
+        f"\nApplied {results['applied']} changes, skipped {results['skipped']}, {results['failed']} failed",
+        bold=True,
+    )
+    if results["failed"]:
+        raise typer.Exit(code=1)
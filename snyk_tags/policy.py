@@ -0,0 +1,130 @@
+#! /usr/bin/env python3
+
+import logging
+from pathlib import Path
+
+import typer
+
+from snyk_tags.lib import plan as planlib
+from snyk_tags.lib.api import Api, RateLimiter
+from snyk_tags.lib.concurrency import AdaptiveLimit, adaptivehelp
+from snyk_tags.lib.component.rules import project_rule_input
+from snyk_tags.lib.journal import journalhelp, open_journal, resumehelp
+from snyk_tags.lib.plan import ProjectWrite, open_plan, planhelp
+from snyk_tags.lib.policy import parse_policy, policy_evaluator, project_mutations
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(message)s",
+    datefmt="[%X]",
+)
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+app = typer.Typer()
+
+
+def describe(mutation: dict) -> str:
+    if mutation["op"] == "set_attributes":
+        change = "set attributes " + ", ".join(
+            f"{k}={','.join(v)}" for k, v in mutation["attributes"].items()
+        )
+    elif mutation["op"] == "remove_tag":
+        change = f'remove tag "{mutation["key"]}:{mutation["value"]}"'
+    else:
+        change = f'add tag "{mutation["key"]}:{mutation["value"]}"'
+    return (
+        f'{change} in project id="{mutation["project_id"]}" name="{mutation["name"]}"'
+    )
+
+
+# List the projects of each organization once, evaluating every policy rule
+# against each project and yielding the merged mutations it needs, coalesced
+# into a single mutation per project if requested.
+def policy_mutations(api: Api, org_ids: list, evaluate, coalesce: bool = False):
+    for org_id in org_ids:
+        for project in api.org_projects(org_id):
+            outcome = evaluate(project_rule_input(project))
+            mutations = project_mutations(org_id, project, outcome)
+            if coalesce and mutations:
+                write = ProjectWrite(org_id, project)
+                for mutation in mutations:
+                    write.add_mutation(mutation)
+                yield write.mutation()
+            else:
+                yield from mutations
+
+
+@app.command(
+    help="Apply the tags, attributes and component tags of a policy file in a single pass over the projects"
+)
+def apply(
+    policy: Path = typer.Argument(..., help="Policy file"),
+    group_id: str = typer.Option(
+        "",  # Default value of comamand
+        help="Group ID of the Snyk Group you want to apply the policy to",
+        envvar=["GROUP_ID"],
+    ),
+    org_id: str = typer.Option(
+        "",  # Default value of comamand
+        envvar=["ORG_ID"],
+        help="Specify one Organization ID to only apply the policy to one organization",
+    ),
+    snyktkn: str = typer.Option(
+        ...,  # Default value of comamand
+        help="Snyk API token with org admin access",
+        envvar=["SNYK_TOKEN"],
+    ),
+    tenant: str = typer.Option(
+        "",  # Default value of comamand
+        help=f"Defaults to US tenant (app.snyk.io), add 'eu', 'au' or 'us' to use alternative regional tenant. Use --tenant to change tenant.",
+    ),
+    dry_run: bool = typer.Option(
+        default=False,
+        help="Print the changes without applying them",
+    ),
+    concurrency: int = typer.Option(10, help="Number of changes applied in parallel"),
+    max_rps: float = typer.Option(
+        0,
+        help="Maximum API requests per second (default 0 means no limit)",
+    ),
+    adaptive: bool = typer.Option(False, "--adaptive", help=adaptivehelp),
+    journal: Path = typer.Option(None, help=journalhelp),
+    resume: bool = typer.Option(False, "--resume", help=resumehelp),
+    plan: Path = typer.Option(None, help=planhelp),
+):
+    if not group_id and not org_id:
+        raise typer.BadParameter("either --group-id or --org-id is required")
+    with open(policy) as f:
+        evaluate = policy_evaluator(parse_policy(f))
+
+    # Project listing shares the REST connection pool with the coalesced
+    # writes, so one connection is kept for it beyond those of the writers
+    api = Api.for_tenant(
+        snyktkn,
+        tenant,
+        rate_limiter=RateLimiter(max_rps) if max_rps > 0 else None,
+        concurrency_limit=AdaptiveLimit(concurrency) if adaptive else None,
+        max_connections=max(concurrency, 1) + 1,
+    )
+    with api, open_plan(plan) as planner, open_journal(journal, resume) as jrnl:
+        orgs = [org_id] if org_id else api.group_org_ids(group_id)
+        if planner or dry_run:
+            mutations = policy_mutations(api, orgs, evaluate)
+            for mutation in mutations:
+                logging.info("would " + describe(mutation))
+                if planner:
+                    planner.add_mutation(mutation)
+            return
+
+        mutations = policy_mutations(api, orgs, evaluate, coalesce=True)
+        results = planlib.apply_plan(
+            api, mutations, concurrency=concurrency, journal=jrnl
+        )
+
+    typer.secho(
+        f"\nApplied {results['applied']} changes, skipped {results['skipped']}, {results['failed']} failed",
+        bold=True,
+    )
+    if results["failed"]:
+        raise typer.Exit(code=1)
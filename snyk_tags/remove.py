@@ -1,11 +1,17 @@
 #! /usr/bin/env python3
 import logging
 import re
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 
 import httpx
 import typer
 from rich import print
-from snyk import SnykClient
+
+from snyk_tags.lib.api import Api, RateLimiter, has_tag
+from snyk_tags.lib.concurrency import AdaptiveLimit, adaptivehelp
+from snyk_tags.lib.targets import TargetIndexCache
 
 app = typer.Typer()
 
@@ -20,64 +26,89 @@ logging.getLogger("httpx").setLevel(logging.WARNING)
 
 # Remove tags from a specific project
 def remove_tag_from_project(
-    token: str,
+    api: Api,
     org_id: str,
     project_id: str,
     tag: str,
     key: str,
     project_name: str,
-    tenant: str,
-) -> tuple:
-    base_url = (
-        f"https://api.{tenant}.snyk.io/v1"
-        if tenant in ["eu", "au", "us"]
-        else "https://api.snyk.io/v1"
-    )
-    client = SnykClient(token=token, url=base_url)
+) -> bool:
     try:
-        client.organizations.get(org_id).projects.get(project_id).tags.delete(key, tag)
+        with api.slot():
+            api.remove_project_tag(org_id, project_id, tag={"key": key, "value": tag})
         print(f"Removing tag {key}:{tag} from {project_name}")
-    except Exception as e:
-        if "422" in str(e):
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 422:
             print(
                 f"The tag {key}:{tag} has already been removed from Project: {project_name}"
             )
-        elif "404" in str(e):
+            return True
+        elif e.response.status_code == 404:
             print((f"Project not found. Project: {project_name}. Error message: {e}."))
         else:
             print(f"Unknown error {e}")
+        return False
+    except httpx.HTTPError as e:
+        print(f"Unknown error {e}")
+        return False
+    return True
 
 
-# Remove tag loop with pysnyk
+# Remove a tag from the projects carrying it, according to their listing, with
+# up to `concurrency` requests in flight. Returns whether every removal worked.
+def remove_tag_from_projects(
+    api: Api,
+    org_id: str,
+    projects: list,
+    tag: str,
+    key: str,
+    concurrency: int = 10,
+    targets: TargetIndexCache = None,
+) -> bool:
+    tagged = [project for project in projects if has_tag(project, key, tag)]
+    if len(tagged) < len(projects):
+        print(
+            f"Skipping {len(projects) - len(tagged)} projects without the tag {key}:{tag}"
+        )
+
+    def remove(project: dict) -> bool:
+        removed = remove_tag_from_project(
+            api, org_id, project["id"], tag, key, project["attributes"]["name"]
+        )
+        if removed and targets:
+            targets.remove_tag(org_id, project["id"], key, tag)
+        return removed
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        # Consume the results so that unexpected errors are raised
+        return all(list(pool.map(remove, tagged)))
+
+
+# Remove tags from the projects of a target, returning whether every removal
+# worked
 def remove_tags_from_projects(
-    token: str, org_id: list, name: str, tag: str, key: str, tenant: str
-) -> None:
-    base_url = (
-        f"https://api.{tenant}.snyk.io/rest"
-        if tenant in ["eu", "au", "us"]
-        else "https://api.snyk.io/rest"
-    )
-    client_v3 = SnykClient(token=token, url=base_url, version="2023-08-31~experimental")
-    params = {"limit": 100}
-    projects = client_v3.get_rest_pages(f"/orgs/{org_id}/projects", params=params)
-
-    isname = 0
-    for project in projects:
-        if project["attributes"]["name"].startswith(name):
-            remove_tag_from_project(
-                token=token,
-                org_id=org_id,
-                project_id=project["id"],
-                tag=tag,
-                key=key,
-                tenant=tenant,
-                project_name=project["attributes"]["name"],
+    token: str,
+    org_id: str,
+    name: str,
+    tag: str,
+    key: str,
+    tenant: str,
+    api: Api = None,
+    targets: TargetIndexCache = None,
+    concurrency: int = 10,
+) -> bool:
+    with nullcontext(api) if api else Api.for_tenant(token, tenant) as api:
+        projects = (
+            targets.get(org_id).projects(name)
+            if targets
+            else api.target_projects(org_id, name)
+        )
+        if not projects:
+            print(
+                f"[bold red]{name}[/bold red] is not a valid target, please check it is a target within the organization e.g. [bold blue]snyk-labs/snyk-goof[/bold blue]"
             )
-        else:
-            isname = 1
-    if isname == 1:
-        print(
-            f"[bold red]{name}[/bold red] is not a valid target, please check it is a target within the organization e.g. [bold blue]snyk-labs/snyk-goof[/bold blue]"
+        return remove_tag_from_projects(
+            api, org_id, projects, tag, key, concurrency, targets
         )
 
 
@@ -89,55 +120,39 @@ def remove_tags_from_projects_by_name(
     tag: str,
     key: str,
     tenant: str,
+    api: Api = None,
+    concurrency: int = 10,
 ) -> None:
     exp = name.replace("\\", "\\\\") + "+"
     p = re.compile(exp, re.IGNORECASE) if ignorecase else re.compile(exp)
-    base_url = (
-        f"https://api.{tenant}.snyk.io/rest"
-        if tenant in ["eu", "au", "us"]
-        else "https://api.snyk.io/rest"
-    )
-    client_v3 = SnykClient(token=token, url=base_url, version="2023-08-31~experimental")
-    params = {"limit": 100}
-    projects = client_v3.get_rest_pages(f"/orgs/{org_id}/projects", params=params)
-
-    for project in projects:
-        if p.search(project["attributes"]["name"]):
-            remove_tag_from_project(
-                token=token,
-                org_id=org_id,
-                project_id=project["id"],
-                tag=tag,
-                key=key,
-                project_name=project["attributes"]["name"],
-                tenant=tenant,
-            )
-
-
-# Reach to the API and generate tokens
-def create_client(token: str, tenant: str) -> httpx.Client:
-    base_url = (
-        f"https://api.{tenant}.snyk.io/v1"
-        if tenant in ["eu", "au", "us"]
-        else "https://api.snyk.io/v1"
-    )
-    headers = {"Authorization": f"token {token}"}
-    return httpx.Client(base_url=base_url, headers=headers)
+    with nullcontext(api) if api else Api.for_tenant(token, tenant) as api:
+        projects = [
+            project
+            for project in api.org_projects(org_id)
+            if p.search(project["attributes"]["name"])
+        ]
+        remove_tag_from_projects(api, org_id, projects, tag, key, concurrency)
 
 
 # Apply tags to a specific project
 def remove_tag_from_group(
-    token: str, group_id: str, force: bool, tag: str, key: str, tenant: str
+    token: str,
+    group_id: str,
+    force: bool,
+    tag: str,
+    key: str,
+    tenant: str,
+    api: Api = None,
 ) -> tuple:
     if force is True:
         tag_data = {"key": key, "value": tag, "force": force}
     else:
         tag_data = {"key": key, "value": tag}
 
-    with create_client(token=token, tenant=tenant) as client:
-        req = client.post(f"group/{group_id}/tags/delete", data=tag_data, timeout=None)
-        group = client.get(f"group/{group_id}/orgs").json()
-        group_name = group["name"]
+    with nullcontext(api) if api else Api.for_tenant(token, tenant) as api:
+        client = api.v1
+        req = client.post(f"group/{group_id}/tags/delete", json=tag_data, timeout=None)
+        group_name = group_id
 
         if req.status_code == 200:
             print(f"Successfully removed {key}:{tag} from Group: {group_name}")
@@ -156,7 +171,57 @@ def remove_tag_from_group(
         return req.status_code, req.json()
 
 
+# Tags of a group which are not applied to any project of its organizations,
+# found from the group tag catalog and one listing of each organization
+def unused_group_tags(
+    api: Api, group_id: str, key: str = None, concurrency: int = 10
+) -> list:
+    catalog = [tag for tag in api.group_tags(group_id) if not key or tag["key"] == key]
+    if not catalog:
+        return []
+
+    def tags_in_use(org_id: str) -> set:
+        return {
+            (tag.get("key"), tag.get("value"))
+            for project in api.org_projects(org_id)
+            for tag in project["attributes"].get("tags") or []
+        }
+
+    in_use = set()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        for tags in pool.map(tags_in_use, api.group_org_ids(group_id)):
+            in_use |= tags
+    return [tag for tag in catalog if (tag["key"], tag["value"]) not in in_use]
+
+
+# Delete tags from a group with up to `concurrency` requests in flight. Tags are
+# not force deleted, so a tag applied to a project in the meantime is kept.
+def delete_group_tags(
+    api: Api, group_id: str, tags: list, concurrency: int = 10
+) -> Counter:
+    def delete(tag: dict) -> str:
+        try:
+            with api.slot():
+                api.delete_group_tag(
+                    group_id, {"key": tag["key"], "value": tag["value"]}
+                )
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 422:
+                return "deleted"
+            print(f"Failed to delete tag {tag['key']}:{tag['value']}: {e}")
+            return "failed"
+        except httpx.HTTPError as e:
+            print(f"Failed to delete tag {tag['key']}:{tag['value']}: {e}")
+            return "failed"
+        print(f"Deleted tag {tag['key']}:{tag['value']}")
+        return "deleted"
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        return Counter(pool.map(delete, tags))
+
+
 repoexample = typer.style("'snyk-labs/nodejs-goof'", bold=True, fg=typer.colors.MAGENTA)
+concurrencyhelp = "Number of projects the tag is removed from in parallel"
 
 
 @app.command(help=f"Remove a tag from a target, for example {repoexample}")
@@ -185,11 +250,28 @@ def tag_from_target(
         "",  # Default value of comamand
         help=f"Defaults to US tenant (app.snyk.io), add 'eu', 'au' or 'us' to use alternative regional tenant. Use --tenant to change tenant.",
     ),
+    concurrency: int = typer.Option(10, help=concurrencyhelp),
+    adaptive: bool = typer.Option(False, "--adaptive", help=adaptivehelp),
 ):
     typer.secho(
         f"\nRemoving {tagKey}:{tagValue} from projects within {target}", bold=True
     )
-    remove_tags_from_projects(snyktkn, org_id, target, tagValue, tagKey, tenant)
+    api = Api.for_tenant(
+        snyktkn,
+        tenant,
+        concurrency_limit=AdaptiveLimit(concurrency) if adaptive else None,
+    )
+    with api:
+        remove_tags_from_projects(
+            snyktkn,
+            org_id,
+            target,
+            tagValue,
+            tagKey,
+            tenant,
+            api=api,
+            concurrency=concurrency,
+        )
 
 
 @app.command(
@@ -225,13 +307,29 @@ def tag_from_alltargets(
         "",  # Default value of comamand
         help=f"Defaults to US tenant (app.snyk.io), add 'eu', 'au' or 'us' to use alternative regional tenant. Use --tenant to change tenant.",
     ),
+    concurrency: int = typer.Option(10, help=concurrencyhelp),
+    adaptive: bool = typer.Option(False, "--adaptive", help=adaptivehelp),
 ):
     typer.secho(
         f"\nRemoving {tagKey}:{tagValue} from projects within {org_id}", bold=True
     )
-    remove_tags_from_projects_by_name(
-        snyktkn, org_id, contains_name, name_ignorecase, tagValue, tagKey, tenant
+    api = Api.for_tenant(
+        snyktkn,
+        tenant,
+        concurrency_limit=AdaptiveLimit(concurrency) if adaptive else None,
     )
+    with api:
+        remove_tags_from_projects_by_name(
+            snyktkn,
+            org_id,
+            contains_name,
+            name_ignorecase,
+            tagValue,
+            tagKey,
+            tenant,
+            api=api,
+            concurrency=concurrency,
+        )
 
 
 @app.command(help=f"Remove a tag from a Group, this can be forced through --force")
@@ -264,3 +362,64 @@ def tag_from_group(
 ):
     typer.secho(f"\nRemoving {tagKey}:{tagValue} from Group ID: {group_id}", bold=True)
     remove_tag_from_group(snyktkn, group_id, force, tagValue, tagKey, tenant)
+
+
+@app.command(
+    help="Delete all the tags of a Group which are not applied to any project, this can be previewed with --dry-run"
+)
+def unused_tags(
+    group_id: str = typer.Option(
+        ...,  # Default value of comamand
+        envvar=["GROUP_ID"],
+        help="Specify the Group where you want to delete unused tags from",
+    ),
+    snyktkn: str = typer.Option(
+        ...,  # Default value of comamand
+        help="Snyk API token with Group admin access",
+        envvar=["SNYK_TOKEN"],
+    ),
+    key: str = typer.Option(
+        "",  # Default value of comamand
+        help="Only delete unused tags with this key",
+    ),
+    dry_run: bool = typer.Option(
+        default=False,
+        help="List the unused tags without deleting them",
+    ),
+    concurrency: int = typer.Option(
+        10, help="Number of organizations listed and tags deleted in parallel"
+    ),
+    max_rps: float = typer.Option(
+        0,
+        help="Maximum API requests per second (default 0 means no limit)",
+    ),
+    adaptive: bool = typer.Option(False, "--adaptive", help=adaptivehelp),
+    tenant: str = typer.Option(
+        "",  # Default value of comamand
+        help=f"Defaults to US tenant (app.snyk.io), add 'eu', 'au' or 'us' to use alternative regional tenant. Use --tenant to change tenant.",
+    ),
+):
+    api = Api.for_tenant(
+        snyktkn,
+        tenant,
+        rate_limiter=RateLimiter(max_rps) if max_rps > 0 else None,
+        concurrency_limit=AdaptiveLimit(concurrency) if adaptive else None,
+        max_connections=max(concurrency, 1),
+    )
+    with api:
+        unused = unused_group_tags(api, group_id, key, concurrency)
+        if dry_run:
+            for tag in unused:
+                print(f"Would delete tag {tag['key']}:{tag['value']}")
+            typer.secho(
+                f"\n{len(unused)} unused tags in Group ID: {group_id}", bold=True
+            )
+            return
+        results = delete_group_tags(api, group_id, unused, concurrency)
+
+    typer.secho(
+        f"\nDeleted {results['deleted']} unused tags from Group ID: {group_id}, {results['failed']} failed",
+        bold=True,
+    )
+    if results["failed"]:
+        raise typer.Exit(code=1)
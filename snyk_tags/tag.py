@@ -2,14 +2,24 @@
 
 import logging
 import re
+from pathlib import Path
 
 import httpx
 import typer
 from rich import print
-from snyk import SnykClient
 
 from snyk_tags import __app_name__, __version__
-from snyk_tags.lib.api import Api
+from snyk_tags.lib.api import Api, has_tag, tenant_urls
+from snyk_tags.lib.journal import Journal, journalhelp, open_journal, resumehelp
+from snyk_tags.lib.negative_cache import NOT_FOUND, negative_cache
+from snyk_tags.lib.plan import (
+    PlanWriter,
+    ProjectWrite,
+    apply_project_write,
+    open_plan,
+    planhelp,
+)
+from snyk_tags.lib.tracing import span
 
 logging.basicConfig(
     level=logging.INFO,
@@ -24,13 +34,11 @@ app = typer.Typer()
 
 # Reach to the API and generate tokens
 def create_client(token: str, tenant: str) -> httpx.Client:
-    base_url = (
-        f"https://api.{tenant}.snyk.io/v1"
-        if tenant in ["eu", "au", "us"]
-        else "https://api.snyk.io/v1"
-    )
+    base_url = tenant_urls(tenant)["v1_url"]
     headers = {"Authorization": f"token {token}"}
-    return httpx.Client(base_url=base_url, headers=headers)
+    # Requests are metered and rate limited like those of the Api
+    event_hooks = Api.for_tenant(token, tenant).event_hooks()
+    return httpx.Client(base_url=base_url, headers=headers, event_hooks=event_hooks)
 
 
 # Get all organizations within a Group
@@ -58,13 +66,16 @@ def apply_tag_to_project(
     key: str,
     project_name: str,
 ) -> tuple:
+    if negative_cache.skip(org_id, project_id, project_name):
+        return None, {}
     tag_data = {
         "key": key,
         "value": tag,
     }
-    req = client.post(
-        f"org/{org_id}/project/{project_id}/tags", data=tag_data, timeout=None
-    )
+    with span("add project tag", org_id=org_id, project_id=project_id):
+        req = client.post(
+            f"org/{org_id}/project/{project_id}/tags", data=tag_data, timeout=None
+        )
 
     if req.status_code == 200:
         logging.info(f"Successfully added {tag} tag to Project: {project_name}.")
@@ -74,6 +85,7 @@ def apply_tag_to_project(
         logging.error(
             f"Project not found, likely a READ-ONLY project. Project: {project_name}. Error message: {req.json()}."
         )
+        negative_cache.add(org_id, project_id, NOT_FOUND, project_name)
     return req.status_code, req.json()
 
 
@@ -85,45 +97,100 @@ def apply_tags_to_projects(
     key: str,
     addprojecttype: bool,
     tenant: str,
+    journal: Journal = None,
+    plan: PlanWriter = None,
 ) -> None:
-    with create_client(token=token, tenant=tenant) as client:
-        for org_id in org_ids:
-            base_url = (
-                f"https://api.{tenant}.snyk.io/rest"
-                if tenant in ["eu", "au", "us"]
-                else "https://api.snyk.io/rest"
-            )
-            client_v3 = SnykClient(
-                token=token, url=base_url, version="2023-08-31~experimental"
-            )
-            params = {"limit": 100}
-            projects = client_v3.get_rest_pages(
-                f"/orgs/{org_id}/projects", params=params
-            )
+    apply_tags_by_project_type(
+        token,
+        org_ids,
+        {project_type: tag for project_type in types},
+        key,
+        addprojecttype=addprojecttype,
+        tenant=tenant,
+        journal=journal,
+        plan=plan,
+    )
+
 
+# Apply the tag value mapped to each project's type, listing each org only once
+def apply_tags_by_project_type(
+    token: str,
+    org_ids: list,
+    tags_by_type: dict,
+    key: str,
+    addprojecttype: bool,
+    tenant: str,
+    journal: Journal = None,
+    plan: PlanWriter = None,
+) -> None:
+    tag = ",".join(sorted(set(tags_by_type.values())))
+    scope = ",".join(sorted(tags_by_type)) + (
+        ":addprojecttype" if addprojecttype else ""
+    )
+    api = Api.for_tenant(token, tenant)
+    with api, create_client(token=token, tenant=tenant) as client:
+        for org_id in org_ids:
+            if journal and journal.org_done(org_id, "add_tag", key, tag, scope):
+                logging.info(f"Skipping organization {org_id}, already completed.")
+                continue
+            # Pages are prefetched while the projects of the previous page are
+            # tagged
+            projects = api.org_projects(org_id)
+
+            # The org is only journaled as a whole when every write succeeded,
+            # otherwise --resume relies on the journaled mutations
+            failed = False
             for project in projects:
-                if project["attributes"]["type"] in types:
-                    logging.debug(
-                        apply_tag_to_project(
+                project_type = project["attributes"]["type"]
+                if project_type in tags_by_type:
+                    wanted = [(key, tags_by_type[project_type])]
+                    if addprojecttype == True:
+                        wanted.append(("Type", project_type))
+                    if plan:
+                        for tag_key, tag_value in wanted:
+                            if not has_tag(project, tag_key, tag_value):
+                                plan.add_tag(
+                                    org_id,
+                                    project["id"],
+                                    tag_key,
+                                    tag_value,
+                                    project["attributes"]["name"],
+                                )
+                        continue
+                    write = ProjectWrite(org_id, project)
+                    for tag_key, tag_value in wanted:
+                        if not (
+                            journal
+                            and journal.mutation_done(
+                                org_id, project["id"], "add_tag", tag_key, tag_value
+                            )
+                        ):
+                            write.add_tag(tag_key, tag_value)
+                    # Both tags of a project are set in a single request
+                    if len(write) > 1:
+                        if apply_project_write(api, write, journal) is False:
+                            failed = True
+                        continue
+                    for mutation in write.mutations:
+                        tag_key, tag_value = mutation["key"], mutation["value"]
+                        result = apply_tag_to_project(
                             client=client,
                             org_id=org_id,
                             project_id=project["id"],
-                            tag=tag,
-                            key=key,
+                            tag=tag_value,
+                            key=tag_key,
                             project_name=project["attributes"]["name"],
                         )
-                    )
-                    if addprojecttype == True:
-                        logging.debug(
-                            apply_tag_to_project(
-                                client=client,
-                                org_id=org_id,
-                                project_id=project["id"],
-                                tag=project["attributes"]["type"],
-                                key="Type",
-                                project_name=project["attributes"]["name"],
-                            )
-                        )
+                        logging.debug(result)
+                        if result[0] in (200, 422):
+                            if journal:
+                                journal.record_mutation(
+                                    org_id, project["id"], "add_tag", tag_key, tag_value
+                                )
+                        elif result[0] is not None:
+                            failed = True
+            if journal and not plan and not failed:
+                journal.record_org(org_id, "add_tag", key, tag, scope)
 
 
 def apply_tags_to_projects_by_name(
@@ -137,22 +204,10 @@ def apply_tags_to_projects_by_name(
 ) -> None:
     exp = name.replace("\\", "\\\\") + "+"
     p = re.compile(exp, re.IGNORECASE) if ignorecase else re.compile(exp)
-    with create_client(token=token, tenant=tenant) as client:
+    api = Api.for_tenant(token, tenant)
+    with api, create_client(token=token, tenant=tenant) as client:
         for org_id in org_ids:
-            base_url = (
-                f"https://api.{tenant}.snyk.io/rest"
-                if tenant in ["eu", "au", "us"]
-                else "https://api.snyk.io/rest"
-            )
-            client_v3 = SnykClient(
-                token=token, url=base_url, version="2023-08-31~experimental"
-            )
-            params = {"limit": 100}
-            projects = client_v3.get_rest_pages(
-                f"/orgs/{org_id}/projects", params=params
-            )
-
-            for project in projects:
+            for project in api.org_projects(org_id):
                 if p.search(project["attributes"]["name"]):
                     logging.debug(
                         apply_tag_to_project(
@@ -166,6 +221,46 @@ def apply_tags_to_projects_by_name(
                     )
 
 
+# Project types covered by each product, as tagged by the product commands
+SAST_TYPES = ["sast"]
+IAC_TYPES = [
+    "terraformconfig",
+    "terraformplan",
+    "k8sconfig",
+    "helmconfig",
+    "cloudformationconfig",
+    "armconfig",
+]
+SCA_TYPES = [
+    "maven",
+    "npm",
+    "nuget",
+    "gradle",
+    "pip",
+    "yarn",
+    "gomodules",
+    "rubygems",
+    "composer",
+    "sbt",
+    "golangdep",
+    "cocoapods",
+    "poetry",
+    "govendor",
+    "cpp",
+    "yarn-workspace",
+    "hex",
+    "paket",
+    "golang",
+]
+CONTAINER_TYPES = ["dockerfile", "apk", "deb", "rpm", "linux"]
+PRODUCT_TYPES = {
+    "Code": SAST_TYPES,
+    "IaC": IAC_TYPES,
+    "OpenSource": SCA_TYPES,
+    "Container": CONTAINER_TYPES,
+}
+
+
 # SAST Command
 sasttypes = typer.style("\n sast", bold=True, fg=typer.colors.MAGENTA)
 
@@ -200,8 +295,11 @@ def sast(
         "--addprojecttype",  # Default value of comamand
         help=f"Add an additional tag that will cover the project type e.g. Type:sast (default is false), use --addprojecttype to turn into True.",
     ),
+    journal: Path = typer.Option(None, help=journalhelp),
+    resume: bool = typer.Option(False, "--resume", help=resumehelp),
+    plan: Path = typer.Option(None, help=planhelp),
 ):
-    type = ["sast"] if sastType is None or sastType == "" else [sastType]
+    type = SAST_TYPES if sastType is None or sastType == "" else [sastType]
     orgs = (
         get_org_ids(snyktkn, group_id, tenant)
         if org_id is None or org_id == ""
@@ -211,15 +309,18 @@ def sast(
         f"\nAdding the Code tag to {type} projects in Snyk for easy filtering via the UI",
         bold=True,
     )
-    apply_tags_to_projects(
-        snyktkn,
-        orgs,
-        type,
-        tag="Code",
-        key="Product",
-        tenant=tenant,
-        addprojecttype=addprojecttype,
-    )
+    with open_journal(journal, resume) as jrnl, open_plan(plan) as planner:
+        apply_tags_to_projects(
+            snyktkn,
+            orgs,
+            type,
+            tag="Code",
+            key="Product",
+            tenant=tenant,
+            addprojecttype=addprojecttype,
+            journal=jrnl,
+            plan=planner,
+        )
 
 
 # IaC Command
@@ -260,19 +361,11 @@ def iac(
         "--addprojecttype",  # Default value of comamand
         help=f"Add an additional tag that will cover the project type e.g. Type:terraformplan (default is false), use --addprojecttype to turn into True.",
     ),
+    journal: Path = typer.Option(None, help=journalhelp),
+    resume: bool = typer.Option(False, "--resume", help=resumehelp),
+    plan: Path = typer.Option(None, help=planhelp),
 ):
-    type = (
-        [
-            "terraformconfig",
-            "terraformplan",
-            "k8sconfig",
-            "helmconfig",
-            "cloudformationconfig",
-            "armconfig",
-        ]
-        if iacType is None or iacType == ""
-        else [iacType]
-    )
+    type = IAC_TYPES if iacType is None or iacType == "" else [iacType]
     orgs = (
         get_org_ids(snyktkn, group_id, tenant)
         if org_id is None or org_id == ""
@@ -282,15 +375,18 @@ def iac(
         f"\nAdding the IaC tag to {iacType} projects in Snyk for easy filtering via the UI",
         bold=True,
     )
-    apply_tags_to_projects(
-        snyktkn,
-        orgs,
-        type,
-        tag="IaC",
-        key="Product",
-        tenant=tenant,
-        addprojecttype=addprojecttype,
-    )
+    with open_journal(journal, resume) as jrnl, open_plan(plan) as planner:
+        apply_tags_to_projects(
+            snyktkn,
+            orgs,
+            type,
+            tag="IaC",
+            key="Product",
+            tenant=tenant,
+            addprojecttype=addprojecttype,
+            journal=jrnl,
+            plan=planner,
+        )
 
 
 # SCA Command
@@ -329,36 +425,15 @@ def sca(
         "--addprojecttype",  # Default value of comamand
         help=f"Add an additional tag that will cover the project type e.g. Type:maven (default is false), use --addprojecttype to turn into True.",
     ),
+    journal: Path = typer.Option(None, help=journalhelp),
+    resume: bool = typer.Option(False, "--resume", help=resumehelp),
+    plan: Path = typer.Option(None, help=planhelp),
     scaType: str = typer.Option(
         "",  # Default value of comamand
         help=f"Type of Snyk Open Source projects to apply tags to (default:all): {scatypes}",
     ),
 ):
-    type = (
-        [
-            "maven",
-            "npm",
-            "nuget",
-            "gradle",
-            "pip",
-            "yarn",
-            "gomodules",
-            "rubygems",
-            "composer",
-            "sbt",
-            "golangdep",
-            "cocoapods",
-            "poetry",
-            "govendor",
-            "cpp",
-            "yarn-workspace",
-            "hex",
-            "paket",
-            "golang",
-        ]
-        if scaType is None or scaType == ""
-        else [scaType]
-    )
+    type = SCA_TYPES if scaType is None or scaType == "" else [scaType]
     orgs = (
         get_org_ids(snyktkn, group_id, tenant)
         if org_id is None or org_id == ""
@@ -368,15 +443,18 @@ def sca(
         f"\nAdding the OpenSource tag to {scaType} projects in Snyk for easy filtering via the UI",
         bold=True,
     )
-    apply_tags_to_projects(
-        snyktkn,
-        orgs,
-        type,
-        tag="OpenSource",
-        key="Product",
-        tenant=tenant,
-        addprojecttype=addprojecttype,
-    )
+    with open_journal(journal, resume) as jrnl, open_plan(plan) as planner:
+        apply_tags_to_projects(
+            snyktkn,
+            orgs,
+            type,
+            tag="OpenSource",
+            key="Product",
+            tenant=tenant,
+            addprojecttype=addprojecttype,
+            journal=jrnl,
+            plan=planner,
+        )
 
 
 # Container Command
@@ -415,9 +493,12 @@ def container(
         "--addprojecttype",  # Default value of comamand
         help=f"Add an additional tag that will cover the project type e.g. Type:dockerfile (default is false), use --addprojecttype to turn into True.",
     ),
+    journal: Path = typer.Option(None, help=journalhelp),
+    resume: bool = typer.Option(False, "--resume", help=resumehelp),
+    plan: Path = typer.Option(None, help=planhelp),
 ):
     type = (
-        ["dockerfile", "apk", "deb", "rpm", "linux"]
+        CONTAINER_TYPES
         if containerType is None or containerType == ""
         else [containerType]
     )
@@ -430,15 +511,79 @@ def container(
         f"\nAdding the Container tag to {containerType} projects in Snyk for easy filtering via the UI",
         bold=True,
     )
-    apply_tags_to_projects(
-        snyktkn,
-        orgs,
-        type,
-        tag="Container",
-        key="Product",
-        tenant=tenant,
-        addprojecttype=addprojecttype,
+    with open_journal(journal, resume) as jrnl, open_plan(plan) as planner:
+        apply_tags_to_projects(
+            snyktkn,
+            orgs,
+            type,
+            tag="Container",
+            key="Product",
+            tenant=tenant,
+            addprojecttype=addprojecttype,
+            journal=jrnl,
+            plan=planner,
+        )
+
+
+# All products Command
+@app.command(
+    name="all-products",
+    help="Apply the Product tag to Snyk Code, IaC, Open Source and Container projects in a single pass - Product:Code, Product:IaC, Product:OpenSource, Product:Container",
+)
+def all_products(
+    group_id: str = typer.Option(
+        ...,  # Default value of comamand
+        help="Group ID of the Snyk Group you want to apply the tags to",
+        envvar=["GROUP_ID"],
+    ),
+    org_id: str = typer.Option(
+        "",  # Default value of comamand
+        envvar=["ORG_ID"],
+        help="Specify one Organization ID to only apply the tag to one organization",
+    ),
+    snyktkn: str = typer.Option(
+        ...,  # Default value of comamand
+        help="Snyk API token with org admin access",
+        envvar=["SNYK_TOKEN"],
+    ),
+    tenant: str = typer.Option(
+        "",  # Default value of comamand
+        help=f"Defaults to US tenant (app.snyk.io), add 'eu', 'au' or 'us' to use alternative regional tenant. Use --tenant to change tenant.",
+    ),
+    addprojecttype: bool = typer.Option(
+        False,
+        "--addprojecttype",  # Default value of comamand
+        help=f"Add an additional tag that will cover the project type e.g. Type:maven (default is false), use --addprojecttype to turn into True.",
+    ),
+    journal: Path = typer.Option(None, help=journalhelp),
+    resume: bool = typer.Option(False, "--resume", help=resumehelp),
+    plan: Path = typer.Option(None, help=planhelp),
+):
+    products = {
+        project_type: product
+        for product, types in PRODUCT_TYPES.items()
+        for project_type in types
+    }
+    orgs = (
+        get_org_ids(snyktkn, group_id, tenant)
+        if org_id is None or org_id == ""
+        else [org_id]
     )
+    typer.secho(
+        f"\nAdding the {', '.join(PRODUCT_TYPES)} tags to projects in Snyk for easy filtering via the UI",
+        bold=True,
+    )
+    with open_journal(journal, resume) as jrnl, open_plan(plan) as planner:
+        apply_tags_by_project_type(
+            snyktkn,
+            orgs,
+            products,
+            key="Product",
+            tenant=tenant,
+            addprojecttype=addprojecttype,
+            journal=jrnl,
+            plan=planner,
+        )
 
 
 # Custom Command
@@ -478,6 +623,9 @@ def custom(
         "--addprojecttype",  # Default value of comamand
         help=f"Add an additional tag that will cover the project type e.g. Type:dockerfile (default is false), use --addprojecttype to turn into True.",
     ),
+    journal: Path = typer.Option(None, help=journalhelp),
+    resume: bool = typer.Option(False, "--resume", help=resumehelp),
+    plan: Path = typer.Option(None, help=planhelp),
 ):
     typer.secho(
         f"\nAdding the tag key {tagKey} and tag value {tagValue} to {projectType} projects in Snyk for easy filtering via the UI",
@@ -491,15 +639,18 @@ def custom(
         if org_id is None or org_id == ""
         else [org_id]
     )
-    apply_tags_to_projects(
-        snyktkn,
-        orgs,
-        type,
-        tagValue,
-        tagKey,
-        tenant=tenant,
-        addprojecttype=addprojecttype,
-    )
+    with open_journal(journal, resume) as jrnl, open_plan(plan) as planner:
+        apply_tags_to_projects(
+            snyktkn,
+            orgs,
+            type,
+            tagValue,
+            tagKey,
+            tenant=tenant,
+            addprojecttype=addprojecttype,
+            journal=jrnl,
+            plan=planner,
+        )
 
 
 # alltargets Command
@@ -2,17 +2,23 @@
 
 import typer
 
+from pathlib import Path
 from typing import Optional
-from snyk_tags import (
-    __app_name__,
-    __version__,
-    files,
-    list,
-    collection,
-    tag,
-    remove,
-    component,
+from snyk_tags import __app_name__, __version__
+from snyk_tags.lib.lazy import LazyGroup
+from snyk_tags.lib.metrics import metricsfilehelp, metricssummaryhelp, request_metrics
+from snyk_tags.lib.negative_cache import (
+    negative_cache,
+    negativecachedayshelp,
+    negativecachehelp,
 )
+from snyk_tags.lib.profiling import CommandProfiler, profilehelp, profiletophelp
+from snyk_tags.lib.shared_rate import (
+    shared_rate_budget,
+    sharedmaxrpshelp,
+    sharedratebudgethelp,
+)
+from snyk_tags.lib.tracing import start_tracing, stop_tracing, tracefilehelp
 
 snyk = typer.style("snyk-tags", bold=True)
 snykcmd = typer.style("snyk-tags tag --help", bold=True, fg=typer.colors.MAGENTA)
@@ -20,39 +26,60 @@ snykcmd2 = typer.style("snyk-tags target --help", bold=True, fg=typer.colors.MAG
 snykcmd3 = typer.style("snyk-tags list --help", bold=True, fg=typer.colors.MAGENTA)
 snykcmd4 = typer.style("snyk-tags remove --help", bold=True, fg=typer.colors.MAGENTA)
 
+
+# Subcommands are imported on first use, so that running one command does not
+# pay for importing the dependencies of all the others.
+class SnykTagsGroup(LazyGroup):
+    lazy_subcommands = {
+        "tag": (
+            "snyk_tags.tag",
+            "app",
+            "Apply product/custom tags based on the product or project type",
+        ),
+        "list": (
+            "snyk_tags.list",
+            "app",
+            "List all Snyk project types and all attribute types",
+        ),
+        "target": (
+            "snyk_tags.collection",
+            "app",
+            "Apply custom tags and attributes to all projects within a target e.g Git repo",
+        ),
+        "remove": (
+            "snyk_tags.remove",
+            "app",
+            "Remove tags from a Group and from all projects within a target e.g Git repo",
+        ),
+        "fromfile": (
+            "snyk_tags.files",
+            "app",
+            "Import tags and attributes from a csv file to a target e.g. Git repo",
+        ),
+        "component": (
+            "snyk_tags.component",
+            "app",
+            "Manage software component definitions with Snyk project tags",
+        ),
+        "policy": (
+            "snyk_tags.policy",
+            "app",
+            "Apply a policy file of tag, attribute and component rules in a single pass",
+        ),
+        "plan": (
+            "snyk_tags.plan",
+            "app",
+            "Review and apply plan files written by tagging commands with --plan",
+        ),
+    }
+
+
 app = typer.Typer(
+    cls=SnykTagsGroup,
     help=f"{snyk} helps you filter Snyk projects by adding or removing product tags and attributes to projects per product or target of projects\n\n To start using it try running:\n\n - {snykcmd} \n\n - {snykcmd2}  \n\n - {snykcmd3}  \n\n - {snykcmd4}",
     add_completion=False,
     no_args_is_help=True,
 )
-app.add_typer(
-    tag.app,
-    name="tag",
-    help="Apply product/custom tags based on the product or project type",
-)
-app.add_typer(
-    list.app, name="list", help="List all Snyk project types and all attribute types"
-)
-app.add_typer(
-    collection.app,
-    name="target",
-    help="Apply custom tags and attributes to all projects within a target e.g Git repo",
-)
-app.add_typer(
-    remove.app,
-    name="remove",
-    help="Remove tags from a Group and from all projects within a target e.g Git repo",
-)
-app.add_typer(
-    files.app,
-    name="fromfile",
-    help="Import tags and attributes from a csv file to a target e.g. Git repo",
-)
-app.add_typer(
-    component.app,
-    name="component",
-    help="Manage software component definitions with Snyk project tags",
-)
 
 
 def main():
@@ -67,6 +94,7 @@ def _version_callback(value: bool) -> None:
 
 @app.callback()
 def main(
+    ctx: typer.Context,
     version: Optional[bool] = typer.Option(
         None,
         "--version",
@@ -74,6 +102,58 @@ def main(
         help="Show the application's version and exit",
         callback=_version_callback,
         is_eager=True,
-    )
+    ),
+    metrics_summary: bool = typer.Option(
+        False, "--metrics-summary", help=metricssummaryhelp
+    ),
+    metrics_file: Path = typer.Option(
+        None, help=metricsfilehelp, envvar=["SNYK_TAGS_METRICS_FILE"]
+    ),
+    trace_file: Path = typer.Option(
+        None, help=tracefilehelp, envvar=["SNYK_TAGS_TRACE_FILE"]
+    ),
+    negative_cache_file: Path = typer.Option(
+        None,
+        "--negative-cache",
+        help=negativecachehelp,
+        envvar=["SNYK_TAGS_NEGATIVE_CACHE"],
+    ),
+    negative_cache_days: float = typer.Option(7.0, help=negativecachedayshelp),
+    shared_rate_budget_file: Path = typer.Option(
+        None,
+        "--shared-rate-budget",
+        help=sharedratebudgethelp,
+        envvar=["SNYK_TAGS_SHARED_RATE_BUDGET"],
+    ),
+    shared_max_rps: float = typer.Option(
+        10.0, help=sharedmaxrpshelp, envvar=["SNYK_TAGS_SHARED_MAX_RPS"]
+    ),
+    profile: Path = typer.Option(None, help=profilehelp),
+    profile_top: int = typer.Option(20, help=profiletophelp),
 ) -> None:
-    return
+    if trace_file:
+        start_tracing(trace_file, f"snyk-tags {ctx.invoked_subcommand}")
+        ctx.call_on_close(stop_tracing)
+
+    def report_metrics():
+        if metrics_summary:
+            request_metrics.print_summary()
+        if metrics_file:
+            request_metrics.write(metrics_file)
+
+    # Reported even when the command fails, as that is when it matters most
+    ctx.call_on_close(report_metrics)
+
+    if negative_cache_file:
+        negative_cache.load(negative_cache_file, negative_cache_days)
+        ctx.call_on_close(negative_cache.close)
+
+    if shared_rate_budget_file:
+        shared_rate_budget.configure(shared_rate_budget_file, shared_max_rps)
+        ctx.call_on_close(shared_rate_budget.close)
+
+    if profile:
+        # Registered last so that it is stopped before anything else is reported
+        profiler = CommandProfiler(profile, top=profile_top)
+        ctx.call_on_close(profiler.stop)
+        profiler.start()
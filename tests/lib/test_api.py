@@ -0,0 +1,68 @@
+import re
+import time
+
+from snyk_tags.lib.api import Api, RateLimiter, has_attributes, tenant_urls
+
+
+def test_tenant_urls():
+    assert tenant_urls("") == {
+        "v1_url": "https://api.snyk.io/v1",
+        "rest_url": "https://api.snyk.io/rest",
+    }
+    assert tenant_urls("eu")["rest_url"] == "https://api.eu.snyk.io/rest"
+    assert Api.for_tenant("t", "au").v1_url == "https://api.au.snyk.io/v1"
+
+
+def test_rate_limiter_spaces_requests():
+    limiter = RateLimiter(rate=200)
+    start = time.monotonic()
+    for _ in range(11):
+        limiter.acquire()
+    # The first request is free, the remaining ten are spaced 5ms apart
+    assert time.monotonic() - start >= 0.045
+
+
+def test_api_pooled_clients_are_shared():
+    with Api("t") as api:
+        assert api.v1 is api.v1
+        assert api.v3 is api.v3
+    assert api._v1 is None
+
+
+def test_target_projects_lists_only_the_target(httpx_mock):
+    httpx_mock.add_response(
+        url=re.compile(r"^.*/orgs/o/targets\?.*display_name=snyk-labs(/|%2F)goof.*"),
+        json={
+            "data": [
+                {"id": "t1", "attributes": {"display_name": "snyk-labs/goof"}},
+                {"id": "t2", "attributes": {"display_name": "snyk-labs/goof-2"}},
+            ]
+        },
+    )
+    httpx_mock.add_response(
+        url=re.compile(r"^.*/orgs/o/projects\?.*target_id=t1.*"),
+        json={"data": [{"id": "p1", "attributes": {"name": "snyk-labs/goof"}}]},
+    )
+    with Api("t") as api:
+        projects = api.target_projects("o", "snyk-labs/goof", {"origins": "github"})
+    assert [p["id"] for p in projects] == ["p1"]
+    params = httpx_mock.get_requests()[-1].url.params
+    assert params["origins"] == "github" and params["target_id"] == "t1"
+
+
+def test_has_attributes():
+    project = {
+        "attributes": {
+            "business_criticality": ["high", "low"],
+            "environment": ["backend"],
+            "lifecycle": None,
+        }
+    }
+    assert has_attributes(
+        project,
+        {"criticality": ["low", "high"], "environment": ["backend"], "lifecycle": []},
+    )
+    assert not has_attributes(project, {"environment": ["frontend"]})
+    # Attributes missing from the listing may still be set
+    del project["attributes"]["lifecycle"]
+    assert not has_attributes(project, {"lifecycle": []})
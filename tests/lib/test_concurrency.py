@@ -0,0 +1,42 @@
+import threading
+import time
+
+from snyk_tags.lib.concurrency import AdaptiveLimit
+
+
+def test_adaptive_limit_grows_while_latency_is_stable_and_halves_on_429():
+    limit = AdaptiveLimit(maximum=8, initial=2)
+    for _ in range(40):
+        limit.observe(200, 0.01)
+    assert limit.limit == 8
+
+    limit.observe(429, 0.0)
+    assert limit.limit == 4
+    # Requests already in flight at the old limit do not shrink it again
+    limit.observe(503, 1.0)
+    assert limit.limit == 4
+
+    # Slow responses hold the limit
+    limit.observe(200, 0.5)
+    assert limit.limit == 4
+
+
+def test_adaptive_limit_bounds_requests_in_flight():
+    limit = AdaptiveLimit(maximum=8, initial=2)
+    peak = 0
+    lock = threading.Lock()
+
+    def request():
+        nonlocal peak
+        with limit:
+            with lock:
+                peak = max(peak, limit.in_flight)
+            time.sleep(0.01)
+
+    threads = [threading.Thread(target=request) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak == 2
+    assert limit.in_flight == 0
@@ -0,0 +1,44 @@
+import pytest
+import typer
+
+from snyk_tags.lib.journal import Journal, open_journal
+
+
+def test_journal_resume(tmp_path):
+    path = tmp_path / "journal.ndjson"
+    with Journal(path) as journal:
+        journal.record_mutation("org", "p1", "add_tag", "k", "v")
+        journal.record_row("/tmp/file.csv", 0)
+        journal.record_row("/tmp/file.csv", 0)
+    # Simulate a crash in the middle of writing an entry
+    with open(path, "a") as f:
+        f.write('["mutation", "org", "p2"')
+
+    with Journal(path, resume=True) as journal:
+        assert journal.size == 2
+        assert journal.mutation_done("org", "p1", "add_tag", "k", "v")
+        assert not journal.mutation_done("org", "p2", "add_tag", "k", "v")
+        assert journal.row_done("/tmp/file.csv", 0)
+        assert not journal.row_done("/tmp/file.csv", 1)
+
+    # Without --resume the journal starts over
+    with Journal(path) as journal:
+        assert journal.size == 0
+    assert path.read_text() == ""
+
+
+def test_open_journal_requires_path():
+    with open_journal(None) as journal:
+        assert journal is None
+    with pytest.raises(typer.BadParameter):
+        open_journal(None, resume=True)
+
+
+def test_open_journal_keeps_existing_journal(tmp_path):
+    path = tmp_path / "journal.ndjson"
+    with open_journal(path) as journal:
+        journal.record_row("/tmp/file.csv", 0)
+    with pytest.raises(typer.BadParameter):
+        open_journal(path)
+    with open_journal(path, resume=True) as journal:
+        assert journal.row_done("/tmp/file.csv", 0)
@@ -0,0 +1,112 @@
+import json
+import re
+
+import httpx
+import pytest
+from typer.testing import CliRunner
+
+from snyk_tags import tags
+from snyk_tags.lib.api import Api
+from snyk_tags.lib.metrics import RequestMetrics, endpoint_name, request_metrics
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    request_metrics.reset()
+    yield
+    request_metrics.reset()
+
+
+def test_endpoint_name():
+    assert (
+        endpoint_name("POST", "/v1/org/o1/project/p1/tags/remove")
+        == "POST /v1/org/{id}/project/{id}/tags/remove"
+    )
+    assert (
+        endpoint_name("GET", "/rest/orgs/o1/projects") == "GET /rest/orgs/{id}/projects"
+    )
+    assert endpoint_name("GET", "/v1/orgs") == "GET /v1/orgs"
+
+
+def test_api_requests_are_recorded(httpx_mock):
+    httpx_mock.add_response(method="POST", json={"tags": []})
+    with Api("t") as api:
+        api.add_project_tag("o1", "p1", tag={"key": "a", "value": "b"})
+
+    endpoint = request_metrics.to_dict()["endpoints"][
+        "POST /v1/org/{id}/project/{id}/tags"
+    ]
+    assert endpoint["requests"] == 1
+    assert endpoint["statuses"] == {"200": 1}
+    assert endpoint["bytes_sent"] == len(b'{"key": "a", "value": "b"}')
+    assert endpoint["bytes_received"] == len(b'{"tags": []}')
+    assert sum(endpoint["latency_seconds"]["buckets"].values()) == 1
+
+
+def test_backoff_retries_are_recorded():
+    metrics = RequestMetrics()
+    request = httpx.Request("GET", "https://api.snyk.io/rest/orgs/o1/projects")
+    response = httpx.Response(429, request=request)
+    error = httpx.HTTPStatusError("429", request=request, response=response)
+    metrics.on_backoff({"exception": error, "wait": 1.5, "target": None})
+
+    data = metrics.to_dict()
+    assert data["retries"] == 1
+    assert data["backoff_seconds"] == {"throttled": 1.5}
+    assert data["endpoints"]["GET /rest/orgs/{id}/projects"]["retries"] == 1
+
+
+def test_prometheus_format():
+    metrics = RequestMetrics()
+    metrics.record("GET /v1/orgs", 200, 0.2, bytes_received=10)
+    metrics.record("GET /v1/orgs", 500, 3.0)
+    text = metrics.to_prometheus()
+
+    assert 'snyk_tags_requests_total{endpoint="GET /v1/orgs",status="500"} 1' in text
+    assert (
+        'snyk_tags_request_duration_seconds_bucket{endpoint="GET /v1/orgs",le="0.1"} 0'
+        in text
+    )
+    assert (
+        'snyk_tags_request_duration_seconds_bucket{endpoint="GET /v1/orgs",le="0.25"} 1'
+        in text
+    )
+    assert (
+        'snyk_tags_request_duration_seconds_bucket{endpoint="GET /v1/orgs",le="+Inf"} 2'
+        in text
+    )
+    assert 'snyk_tags_request_duration_seconds_count{endpoint="GET /v1/orgs"} 2' in text
+    assert "# TYPE snyk_tags_request_duration_seconds histogram" in text
+
+
+def test_metrics_file_written_on_exit(tmp_path, httpx_mock):
+    rules_file = tmp_path / "rules.yaml"
+    rules_file.write_text(
+        "version: 1\nrules:\n  - name: test\n    projects:\n      - name: test\n    component: c\n"
+    )
+    httpx_mock.add_response(
+        method="GET",
+        url=re.compile("^.*/orgs/some-org/projects[?].*"),
+        json={"data": [{"id": "p1", "attributes": {"name": "test"}}]},
+    )
+    metrics_file = tmp_path / "metrics.json"
+
+    result = CliRunner().invoke(
+        tags.app,
+        [
+            "--metrics-file",
+            str(metrics_file),
+            "component",
+            "tag",
+            "--org-id",
+            "some-org",
+            "--snyktkn",
+            "some-token",
+            "--dry-run",
+            str(rules_file),
+        ],
+    )
+    assert result.exit_code == 0
+    data = json.loads(metrics_file.read_text())
+    assert data["requests"] == 1
+    assert data["endpoints"]["GET /rest/orgs/{id}/projects"]["statuses"] == {"200": 1}
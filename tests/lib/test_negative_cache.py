@@ -0,0 +1,15 @@
+from snyk_tags.lib.negative_cache import NOT_FOUND, NegativeCache
+
+
+def test_negative_cache_ignores_corrupt_file(tmp_path):
+    path = tmp_path / "negative-cache.json"
+    path.write_text('{"p1": {"org_id": "o", "reas')
+
+    cache = NegativeCache().load(path)
+    assert cache.reason("o", "p1") is None
+    cache.add("o", "p2", NOT_FOUND, "goof")
+    cache.close()
+
+    cache = NegativeCache().load(path)
+    assert cache.reason("o", "p2") == NOT_FOUND
+    assert cache.reason("other-org", "p2") is None
@@ -0,0 +1,185 @@
+import jsonschema
+import pytest
+
+from snyk_tags.lib.policy import parse_policy, policy_evaluator, project_mutations
+
+POLICY = """
+version: 1
+rules:
+  - name: code
+    projects:
+      - type: sast
+    tags:
+      - key: Product
+        value: Code
+  - name: payments
+    projects:
+      - type: npm
+        name:
+          regex: "^payments/(?P<service>[^:(]+)"
+    tags:
+      - key: service
+        value: "{service}"
+    attributes:
+      criticality: [high]
+  - name: production
+    projects:
+      - target:
+          display_name: payments/api
+    attributes:
+      environment: [backend]
+      lifecycle: [production]
+  - name: components
+    projects:
+      - target:
+          url:
+            regex: "/(?P<repo>[^/]+)$"
+    component: "pkg:github/{repo}"
+  - name: fallback component
+    projects:
+      - origin: github
+    component: other
+"""
+
+
+def project(type, name, display_name, tags=None, **attributes):
+    return {
+        "id": "p",
+        "attributes": {
+            "name": name,
+            "type": type,
+            "origin": "github",
+            "tags": tags or [],
+            **attributes,
+        },
+        "relationships": {
+            "target": {
+                "data": {
+                    "attributes": {
+                        "display_name": display_name,
+                        "url": f"https://github.com/{display_name}",
+                    }
+                }
+            }
+        },
+    }
+
+
+def rule_input(p):
+    return {
+        "id": p["id"],
+        **p["attributes"],
+        "target": p["relationships"]["target"]["data"]["attributes"],
+    }
+
+
+def test_policy_merges_all_matching_rules():
+    evaluate = policy_evaluator(parse_policy(POLICY))
+
+    outcome = evaluate(
+        rule_input(project("npm", "payments/api:package.json", "payments/api"))
+    )
+    assert outcome.rules == [
+        "payments",
+        "production",
+        "components",
+        "fallback component",
+    ]
+    assert outcome.tags == [("service", "api"), ("component", "pkg:github/api")]
+    assert outcome.attributes == {
+        "criticality": ["high"],
+        "environment": ["backend"],
+        "lifecycle": ["production"],
+    }
+
+    # Every property of a project matcher has to match
+    outcome = evaluate(rule_input(project("pip", "payments/api", "other/repo")))
+    assert outcome.rules == ["components", "fallback component"]
+
+
+def test_policy_matchers_match_every_nested_property():
+    policy = parse_policy(
+        """
+version: 1
+rules:
+  - name: api
+    projects:
+      - target:
+          display_name: payments/api
+          url:
+            regex: "^https://gitlab.com/"
+    tags:
+      - key: team
+        value: payments
+"""
+    )
+    evaluate = policy_evaluator(policy)
+    p = project("npm", "payments/api:package.json", "payments/api")
+    assert evaluate(rule_input(p)).rules == []
+    p["relationships"]["target"]["data"]["attributes"]["url"] = "https://gitlab.com/x"
+    assert evaluate(rule_input(p)).rules == ["api"]
+
+
+def test_project_mutations_skip_existing_values():
+    evaluate = policy_evaluator(parse_policy(POLICY))
+    p = project(
+        "npm",
+        "payments/api:package.json",
+        "payments/api",
+        tags=[{"key": "service", "value": "api"}],
+        business_criticality=["high"],
+        environment=["backend"],
+        lifecycle=["production"],
+    )
+    mutations = project_mutations("org", p, evaluate(rule_input(p)))
+    assert mutations == [
+        {
+            "op": "add_tag",
+            "org_id": "org",
+            "project_id": "p",
+            "name": "payments/api:package.json",
+            "key": "component",
+            "value": "pkg:github/api",
+        }
+    ]
+
+    p["attributes"]["lifecycle"] = []
+    mutations = project_mutations("org", p, evaluate(rule_input(p)))
+    assert mutations[-1]["attributes"] == {
+        "criticality": ["high"],
+        "environment": ["backend"],
+        "lifecycle": ["production"],
+    }
+
+
+def test_project_mutations_replace_other_component_tags():
+    evaluate = policy_evaluator(parse_policy(POLICY))
+    p = project(
+        "pip",
+        "payments/api",
+        "other/repo",
+        tags=[
+            {"key": "component", "value": "pkg:github/old"},
+            {"key": "component", "value": "pkg:github/repo"},
+        ],
+    )
+    mutations = project_mutations("org", p, evaluate(rule_input(p)))
+    assert [(m["op"], m["value"]) for m in mutations] == [
+        ("remove_tag", "pkg:github/old")
+    ]
+
+
+def test_policy_rules_need_an_action():
+    with pytest.raises(jsonschema.ValidationError):
+        parse_policy(
+            "version: 1\nrules:\n  - name: x\n    projects:\n      - type: npm\n"
+        )
+
+
+@pytest.mark.parametrize("matcher", ["{}", "{target: {}}"])
+def test_policy_project_matchers_cannot_be_empty(matcher):
+    with pytest.raises(jsonschema.ValidationError):
+        parse_policy(
+            "version: 1\nrules:\n  - name: x\n    projects:\n"
+            f"      - {matcher}\n    component: x\n"
+        )
@@ -0,0 +1,47 @@
+import time
+
+import pytest
+
+from snyk_tags.lib.prefetch import prefetch
+
+
+def test_prefetch_keeps_depth_items_ahead():
+    produced = []
+
+    def pages():
+        for i in range(10):
+            produced.append(i)
+            yield i
+
+    items = prefetch(pages(), depth=2)
+    assert next(items) == 0
+    time.sleep(0.05)
+    # The first item was taken, and two more are waiting for the consumer
+    assert produced == [0, 1, 2]
+    assert list(items) == list(range(1, 10))
+
+
+def test_prefetch_raises_producer_errors_in_order():
+    def pages():
+        yield 1
+        raise ValueError("page 2 failed")
+
+    items = prefetch(pages(), depth=4)
+    assert next(items) == 1
+    with pytest.raises(ValueError, match="page 2 failed"):
+        next(items)
+
+
+def test_prefetch_stops_when_consumer_closes():
+    produced = []
+
+    def pages():
+        for i in range(100):
+            produced.append(i)
+            yield i
+
+    items = prefetch(pages(), depth=1)
+    assert next(items) == 0
+    items.close()
+    time.sleep(0.3)
+    assert len(produced) <= 2
@@ -0,0 +1,52 @@
+import pstats
+import re
+
+import pytest
+from typer.testing import CliRunner
+
+from snyk_tags import tags
+from snyk_tags.lib.profiling import is_speedscope
+
+runner = CliRunner()
+
+
+def test_is_speedscope():
+    assert is_speedscope("out.speedscope.json")
+    assert not is_speedscope("out.prof")
+
+
+def test_profile_writes_pstats(tmp_path):
+    profile = tmp_path / "list.prof"
+    result = runner.invoke(
+        tags.app, ["--profile", str(profile), "--profile-top", "3", "list", "types"]
+    )
+    assert result.exit_code == 0
+    assert f"Profile written to {profile}, top 3 functions" in result.output
+    stats = pstats.Stats(str(profile))
+    assert any(func[2] == "types" for func in stats.stats)
+
+
+def test_profile_includes_worker_threads(tmp_path, httpx_mock):
+    plan_file = tmp_path / "plan.ndjson"
+    plan_file.write_text(
+        '{"op":"add_tag","org_id":"o","project_id":"p1","name":"goof","key":"k","value":"v"}\n'
+    )
+    httpx_mock.add_response(method="POST", url=re.compile("^.*/tags$"), json={})
+    profile = tmp_path / "plan.prof"
+    result = runner.invoke(
+        tags.app,
+        ["--profile", str(profile), "plan", "apply", str(plan_file)]
+        + ["--snyktkn", "some-token"],
+    )
+    assert result.exit_code == 0, result.output
+    # The mutations are applied by the threads of a pool
+    functions = {func[2] for func in pstats.Stats(str(profile)).stats}
+    assert {"apply_plan", "apply_mutation"} <= functions
+
+
+def test_profile_writes_speedscope(tmp_path):
+    pytest.importorskip("pyinstrument")
+    profile = tmp_path / "list.speedscope.json"
+    result = runner.invoke(tags.app, ["--profile", str(profile), "list", "types"])
+    assert result.exit_code == 0
+    assert '"exporter": "pyinstrument"' in profile.read_text()
@@ -0,0 +1,86 @@
+import io
+import json
+
+import pytest
+
+from snyk_tags.lib import rows
+
+
+def test_iter_json_array_small_chunks():
+    data = [
+        {"org-id": "o1", "target": "a/b", "key": "k", "value": "v,]"},
+        {"org-id": "o2", "target": "c/d", "key": "k", "value": 12345},
+        [1, 2, {"nested": "]"}],
+    ]
+    text = json.dumps(data, indent=2)
+    for chunk_size in (1, 2, 7, 64, 65536):
+        items = list(rows.iter_json_array(io.StringIO(text), chunk_size=chunk_size))
+        assert items == data
+
+
+def test_iter_json_array_empty():
+    assert list(rows.iter_json_array(io.StringIO(" [ ] "), chunk_size=1)) == []
+
+
+def test_iter_json_array_not_array():
+    with pytest.raises(ValueError):
+        list(rows.iter_json_array(io.StringIO('{"key": "value"}')))
+
+
+def test_iter_json_array_truncated():
+    with pytest.raises(ValueError):
+        list(rows.iter_json_array(io.StringIO('[{"key": "value"}, {"key": '), 4))
+
+
+def test_tag_rows_formats(tmp_path):
+    expected = [
+        rows.TagRow("o1", "snyk-labs/goof", "k1", "v1", {}),
+        rows.TagRow("o2", "snyk-labs/goof", "k2", "v2", {"origins": "github"}),
+    ]
+
+    csv_file = tmp_path / "tags.csv"
+    csv_file.write_text(
+        "org-id,target,key,value\n"
+        "o1,snyk-labs/goof,k1,v1\n"
+        "o2,snyk-labs/goof,k2,v2\n"
+    )
+    json_file = tmp_path / "tags.json"
+    json_file.write_text(
+        json.dumps(
+            [
+                {
+                    "org-id": "o1",
+                    "target": "snyk-labs/goof",
+                    "key": "k1",
+                    "value": "v1",
+                },
+                {
+                    "org-id": "o2",
+                    "target": "snyk-labs/goof",
+                    "key": "k2",
+                    "value": "v2",
+                    "origins": "github",
+                },
+            ]
+        )
+    )
+    ndjson_file = tmp_path / "tags.ndjson"
+    ndjson_file.write_text(
+        '{"org-id": "o1", "target": "snyk-labs/goof", "key": "k1", "value": "v1"}\n'
+        "\n"
+        '{"org-id": "o2", "target": "snyk-labs/goof", "key": "k2", "value": "v2", "origins": "github"}\n'
+    )
+
+    assert list(rows.tag_rows(json_file)) == expected
+    assert list(rows.tag_rows(ndjson_file)) == expected
+    csv_rows = list(rows.tag_rows(csv_file))
+    assert csv_rows[0] == expected[0]
+    assert csv_rows[1].filters == {}
+
+
+def test_read_rows_unsupported(tmp_path):
+    path = tmp_path / "tags.txt"
+    path.write_text("")
+    assert not rows.is_supported(path)
+    with pytest.raises(ValueError):
+        list(rows.read_rows(path))
@@ -0,0 +1,35 @@
+import time
+
+from snyk_tags.lib.shared_rate import SharedRateLimiter, budget_key
+
+
+def test_budget_key_fingerprints_token_and_tenant():
+    key = budget_key("secret-token", "https://api.eu.snyk.io/rest")
+    assert "secret-token" not in key
+    assert key.endswith("@api.eu.snyk.io")
+    assert key != budget_key("other-token", "https://api.eu.snyk.io/rest")
+    assert key != budget_key("secret-token", "https://api.snyk.io/rest")
+
+
+def test_shared_rate_limiter_shares_budget_between_processes(tmp_path):
+    path = tmp_path / "budget.sqlite"
+    # Separate connections to the same file, as separate processes would use
+    first = SharedRateLimiter(path, "key", rate=100)
+    second = SharedRateLimiter(path, "key", rate=100)
+    other = SharedRateLimiter(path, "other-key", rate=100)
+
+    start = time.monotonic()
+    for limiter in [first, second] * 5 + [first]:
+        limiter.acquire()
+    # 11 requests at 100 per second, the first one from the initial burst
+    assert time.monotonic() - start >= 0.09
+
+    first.pause(0.2)
+    start = time.monotonic()
+    other.acquire()
+    assert time.monotonic() - start < 0.05
+    second.acquire()
+    assert time.monotonic() - start >= 0.15
+
+    for limiter in (first, second, other):
+        limiter.close()
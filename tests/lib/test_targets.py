@@ -0,0 +1,49 @@
+from snyk_tags.lib.targets import TargetIndex, TargetIndexCache, target_names
+
+
+def project(project_id, name):
+    return {"id": project_id, "attributes": {"name": name}}
+
+
+def test_target_names():
+    assert target_names("snyk-labs/goof") == ["snyk-labs/goof"]
+    assert target_names("snyk-labs/goof(main):package.json") == [
+        "snyk-labs/goof(main):package.json",
+        "snyk-labs/goof",
+        "snyk-labs/goof(main)",
+    ]
+    assert "registry:5000/app" in target_names("registry:5000/app:latest")
+
+
+def test_target_index():
+    index = TargetIndex(
+        [
+            project("p1", "snyk-labs/goof(main):package.json"),
+            project("p2", "snyk-labs/goof:pom.xml"),
+            project("p3", "snyk-labs/goof-2:pom.xml"),
+        ]
+    )
+    assert index.project_count == 3
+    assert [p["id"] for p in index.projects("snyk-labs/goof")] == ["p1", "p2"]
+    assert [p["id"] for p in index.projects("snyk-labs/goof-2")] == ["p3"]
+    assert "snyk-labs/go" not in index
+    assert index.projects("snyk-labs/go") == []
+
+
+def test_target_index_cache_lists_each_org_once():
+    class FakeApi:
+        calls = []
+
+        def org_projects(self, org_id, params=None):
+            self.calls.append((org_id, params))
+            return [project(f"{org_id}-p", "snyk-labs/goof")]
+
+    cache = TargetIndexCache(FakeApi())
+    assert cache.get("org-a") is cache.get("org-a", {})
+    cache.get("org-a", {"types": "npm"})
+    cache.get("org-b")
+    assert FakeApi.calls == [
+        ("org-a", None),
+        ("org-a", {"types": "npm"}),
+        ("org-b", None),
+    ]
@@ -0,0 +1,111 @@
+import json
+import re
+
+import httpx
+import pytest
+from typer.testing import CliRunner
+
+from snyk_tags import attribute, collection, tags
+from snyk_tags.lib import tracing
+from snyk_tags.lib.tracing import NOOP_SPAN, span, start_tracing, stop_tracing
+
+
+def read_spans(path):
+    spans = []
+    for line in path.read_text().splitlines():
+        for resource in json.loads(line)["resourceSpans"]:
+            for scope in resource["scopeSpans"]:
+                spans.extend(scope["spans"])
+    return {s["name"]: s for s in spans}
+
+
+def test_span_is_noop_when_disabled():
+    assert tracing._tracer is None
+    with span("anything", org_id="o1") as s:
+        s.set_attribute("project_count", 1)
+    assert s is NOOP_SPAN
+
+
+def test_spans_are_nested_and_exported(tmp_path):
+    trace_file = tmp_path / "trace.ndjson"
+    start_tracing(trace_file, "run")
+    try:
+        with span("outer", org_id="o1") as outer:
+            outer.set_attribute("project_count", 3)
+            with span("inner"):
+                pass
+        with pytest.raises(ValueError):
+            with span("failing"):
+                raise ValueError("boom")
+    finally:
+        stop_tracing()
+
+    spans = read_spans(trace_file)
+    assert spans["outer"]["parentSpanId"] == spans["run"]["spanId"]
+    assert spans["inner"]["parentSpanId"] == spans["outer"]["spanId"]
+    assert "parentSpanId" not in spans["run"]
+    assert {a["key"]: a["value"] for a in spans["outer"]["attributes"]} == {
+        "org_id": {"stringValue": "o1"},
+        "project_count": {"intValue": "3"},
+    }
+    assert spans["failing"]["status"] == {"code": 2, "message": "ValueError: boom"}
+    assert len({s["traceId"] for s in spans.values()}) == 1
+
+
+def test_component_tag_trace_file(tmp_path, httpx_mock):
+    rules_file = tmp_path / "rules.yaml"
+    rules_file.write_text(
+        "version: 1\nrules:\n  - name: test\n    projects:\n      - name: test\n    component: c\n"
+    )
+    httpx_mock.add_response(
+        method="GET",
+        url=re.compile("^.*/orgs/some-org/projects[?].*"),
+        json={"data": [{"id": "p1", "attributes": {"name": "test"}}]},
+    )
+    httpx_mock.add_response(method="POST", url=re.compile("^.*/tags$"), json={})
+    trace_file = tmp_path / "trace.ndjson"
+
+    result = CliRunner().invoke(
+        tags.app,
+        [
+            "--trace-file",
+            str(trace_file),
+            "component",
+            "tag",
+            "--org-id",
+            "some-org",
+            "--snyktkn",
+            "some-token",
+            str(rules_file),
+        ],
+    )
+    assert result.exit_code == 0
+    assert tracing._tracer is None
+
+    spans = read_spans(trace_file)
+    assert set(spans) == {
+        "snyk-tags component",
+        "list projects page",
+        "evaluate rules",
+        "add project tag",
+    }
+    attributes = {a["key"]: a["value"] for a in spans["evaluate rules"]["attributes"]}
+    assert attributes["match_count"] == {"intValue": "1"}
+
+
+def test_attribute_and_collection_writes_are_traced(tmp_path, httpx_mock):
+    httpx_mock.add_response(method="POST", url=re.compile("^.*/attributes$"), json={})
+    httpx_mock.add_response(method="POST", url=re.compile("^.*/tags$"), json={})
+    trace_file = tmp_path / "trace.ndjson"
+    start_tracing(trace_file, "run")
+    with httpx.Client(base_url="https://api.snyk.io/v1/") as client:
+        attribute.apply_attributes_to_project(
+            client, "o1", "p1", ["high"], [""], [""], "project"
+        )
+        collection.apply_tag_to_project(client, "o1", "p2", "t", "k", "project")
+    stop_tracing()
+
+    spans = read_spans(trace_file)
+    assert set(spans) == {"run", "set project attributes", "add project tag"}
+    attributes = {a["key"]: a["value"] for a in spans["add project tag"]["attributes"]}
+    assert attributes["project_id"] == {"stringValue": "p2"}
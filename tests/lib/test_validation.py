@@ -0,0 +1,47 @@
+from snyk_tags.lib.rows import AttributeRow, GroupTagRow
+from snyk_tags.lib.validation import (
+    attribute_problems,
+    attribute_row_problems,
+    group_tag_row_problems,
+    tag_problems,
+)
+
+
+def test_tag_problems():
+    assert tag_problems("team", "pkg:github/snyk-labs/goof@1.0") == []
+    assert tag_problems("", "a") == ["missing tag key"]
+    assert tag_problems("k" * 31, "has space") == [
+        f"tag key {'k' * 31!r} is longer than 30 characters",
+        "tag value 'has space' may only contain letters, digits and -_/:?#@&+=%~.",
+    ]
+    assert tag_problems("team/a", "a") == [
+        "tag key 'team/a' may only contain letters, digits and -_"
+    ]
+
+
+def test_attribute_problems():
+    assert (
+        attribute_problems(
+            {"criticality": ["high", ""], "environment": [], "lifecycle": ["sandbox"]}
+        )
+        == []
+    )
+    assert attribute_problems({"criticality": ["High"], "lifecycle": ["prod"]}) == [
+        "criticality 'High' is not one of critical, high, medium, low",
+        "lifecycle 'prod' is not one of production, development, sandbox",
+    ]
+    row = AttributeRow("", "snyk-labs/goof", "low", "cloud", "", {})
+    assert attribute_row_problems(row) == [
+        "missing org-id",
+        "environment 'cloud' is not one of frontend, backend, internal, external, mobile, saas, onprem, hosted, distributed",
+    ]
+
+
+def test_group_tag_row_problems():
+    assert group_tag_row_problems(GroupTagRow("team", "a")) == []
+    # Rows without a tag are skipped rather than rejected
+    assert group_tag_row_problems(GroupTagRow("", "")) == []
+    assert group_tag_row_problems(GroupTagRow("team", None)) == []
+    assert group_tag_row_problems(GroupTagRow("team a", "b")) == [
+        "tag key 'team a' may only contain letters, digits and -_"
+    ]
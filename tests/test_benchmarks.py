@@ -0,0 +1,47 @@
+import httpx
+import yaml
+
+from benchmarks.mock_snyk import MockSnyk
+from benchmarks.rules import benchmark_rules, generate_rules
+from benchmarks.run import SCENARIOS, regressions, run_scenario
+from snyk_tags.lib.component.rules import parse_rules
+
+
+def test_mock_api_paginates_and_throttles():
+    with MockSnyk(orgs=1, projects=5, page_size=2, throttle_every=3) as mock:
+        with httpx.Client(base_url=mock.url) as client:
+            page = client.get("/rest/orgs/org-0/projects", params={"limit": 100})
+            assert len(page.json()["data"]) == 2
+            next = page.json()["links"]["next"]
+            assert client.get(next).status_code == 200
+            assert client.get(next).status_code == 429
+    assert mock.requests["GET /rest/orgs/{org}/projects"] == 3
+    assert mock.statuses == {"200": 2, "429": 1}
+
+
+def test_scenarios_run_against_mock_api():
+    for name in SCENARIOS:
+        result = run_scenario(name, orgs=1, projects=12, targets=3, page_size=5)
+        assert result["exit_code"] == 0, name
+        assert result["requests"] > 0
+
+
+def test_regressions():
+    baseline = {"scenarios": {"a": {"requests": 10, "seconds": 1.0}}}
+    results = {"scenarios": {"a": {"requests": 10, "seconds": 2.0}}}
+    assert regressions(results, baseline) == []
+    assert len(regressions(results, baseline, time_tolerance=0.5)) == 1
+    results["scenarios"]["a"]["requests"] = 11
+    assert len(regressions(results, baseline)) == 1
+
+
+def test_rule_benchmark():
+    result = benchmark_rules(10, projects=50, min_time=0)
+    assert 0 < result["matches"] < 50
+    assert result["projects_per_second"] > 0
+    assert result["peak_memory_kib"] > 0
+
+
+def test_generated_rules_are_valid():
+    rules = generate_rules(6)
+    assert parse_rules(yaml.safe_dump(rules)) == rules
@@ -1,5 +1,7 @@
+import io
 import os
 import re
+import time
 
 # Necessary to ensure consistent stdout contents from typer.
 # Otherwise asserts below could fail due to terminal width!
@@ -8,7 +10,8 @@ os.environ["COLUMNS"] = "132"
 import pytest
 from typer.testing import CliRunner
 
-from snyk_tags import tags
+from snyk_tags import component, tags
+from snyk_tags.lib.concurrency import AdaptiveLimit
 
 runner = CliRunner()
 app = tags.app
@@ -593,3 +596,151 @@ rules:
         """would add tag "component:test-component" in project id="some-project" name="test\""""
         in result.stdout
     )
+
+
+def test_component_tag_dry_run_csv_and_ndjson_output(tmpdir, httpx_mock):
+    rules_file = tmpdir.join("rules.yaml")
+    rules_file.write(
+        """
+version: 1
+rules:
+  - name: test
+    projects:
+      - name: test
+    component: test-component
+"""
+    )
+    for _ in range(2):
+        httpx_mock.add_response(
+            method="GET",
+            url=re.compile("^.*/orgs/some-org/projects[?].*"),
+            json={
+                "data": [
+                    {
+                        "id": "some-project",
+                        "attributes": {
+                            "name": "test",
+                        },
+                    },
+                ],
+            },
+        )
+    httpx_mock.add_response(
+        status_code=400
+    )  # catch-all response, otherwise backoff retry will block testing
+
+    args = [
+        "component",
+        "tag",
+        "--org-id",
+        "some-org",
+        "--snyktkn",
+        "some-token",
+        "--dry-run",
+        str(rules_file),
+    ]
+
+    result = runner.invoke(app, args + ["--format", "csv"])
+    assert result.exit_code == 0
+    assert result.stdout.splitlines()[1] == (
+        "would add tag,add,test-component,some-project,test,,,,"
+    )
+
+    result = runner.invoke(
+        app, args + ["--format", "ndjson", "--flush-interval", "0"]
+    )
+    assert result.exit_code == 0
+    assert result.stdout == (
+        '{"action":"would add tag","mode":"add","component":"test-component",'
+        '"project":{"id":"some-project","name":"test"}}\n'
+    )
+
+
+@pytest.mark.parametrize("adaptive", [False, True])
+def test_component_tag_group(tmpdir, httpx_mock, monkeypatch, adaptive):
+    rules_file = tmpdir.join("rules.yaml")
+    rules_file.write(
+        """
+version: 1
+rules:
+  - name: test
+    projects:
+      - name:
+          regex: "^(?P<repo>[a-z]+)$"
+    component: "pkg:{repo}"
+"""
+    )
+    httpx_mock.add_response(
+        method="GET",
+        url=re.compile("^.*/group/some-group/orgs$"),
+        json={"orgs": [{"id": "org-a"}, {"id": "org-b"}]},
+    )
+    for org_id, name in (("org-a", "alpha"), ("org-b", "beta")):
+        httpx_mock.add_response(
+            method="GET",
+            url=re.compile(f"^.*/orgs/{org_id}/projects[?].*"),
+            json={"data": [{"id": f"{org_id}-project", "attributes": {"name": name}}]},
+        )
+    httpx_mock.add_response(method="POST", url=re.compile("^.*/tags$"))
+    slots = []
+    enter = AdaptiveLimit.__enter__
+
+    def counting_enter(self):
+        slots.append(self.maximum)
+        return enter(self)
+
+    monkeypatch.setattr(AdaptiveLimit, "__enter__", counting_enter)
+
+    result = runner.invoke(
+        app,
+        [
+            "component",
+            "tag",
+            "--group-id",
+            "some-group",
+            "--concurrency",
+            "2",
+            "--snyktkn",
+            "some-token",
+            str(rules_file),
+        ]
+        + (["--adaptive"] if adaptive else []),
+    )
+    assert result.exit_code == 0, result.output
+    # Each tag write holds a slot of the adaptive limit
+    assert slots == ([2, 2] if adaptive else [])
+    posts = sorted(
+        (r.url.path, r.content.decode())
+        for r in httpx_mock.get_requests(method="POST")
+    )
+    assert posts == [
+        (
+            "/v1/org/org-a/project/org-a-project/tags",
+            '{"key": "component", "value": "pkg:alpha"}',
+        ),
+        (
+            "/v1/org/org-b/project/org-b-project/tags",
+            '{"key": "component", "value": "pkg:beta"}',
+        ),
+    ]
+
+
+def test_buffered_writer():
+    out = io.StringIO()
+    w = component.BufferedWriter(out, flush_interval=3600, max_buffer=10)
+    w.write("12345")
+    assert out.getvalue() == ""
+    w.write("67890")
+    assert out.getvalue() == "1234567890"
+    w.write("x")
+    w.flush()
+    assert out.getvalue() == "1234567890x"
+
+
+def test_buffered_writer_flushes_after_interval_without_further_writes():
+    out = io.StringIO()
+    w = component.BufferedWriter(out, flush_interval=0.05)
+    w.write("12345")
+    assert out.getvalue() == ""
+    time.sleep(0.5)
+    assert out.getvalue() == "12345"
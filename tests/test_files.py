@@ -0,0 +1,286 @@
+import json
+import os
+import re
+
+# Necessary to ensure consistent stdout contents from typer.
+# Otherwise asserts below could fail due to terminal width!
+os.environ["COLUMNS"] = "132"
+
+import pytest
+from typer.testing import CliRunner
+
+from snyk_tags import tags
+
+runner = CliRunner()
+app = tags.app
+
+
+@pytest.fixture
+def assert_all_responses_were_requested() -> bool:
+    return False
+
+
+def add_org_projects(httpx_mock, org_id, projects):
+    httpx_mock.add_response(
+        method="GET",
+        url=re.compile(f"^.*/orgs/{org_id}/projects[?].*"),
+        json={
+            "data": [
+                {"id": project_id, "attributes": {"name": name}}
+                for project_id, name in projects
+            ],
+        },
+    )
+
+
+def test_target_tag_multiple_files_parallel(tmp_path, httpx_mock):
+    add_org_projects(
+        httpx_mock,
+        "org-a",
+        [("p1", "snyk-labs/goof(main):package.json"), ("p2", "other/repo")],
+    )
+    add_org_projects(httpx_mock, "org-b", [("p3", "snyk-labs/java-goof:pom.xml")])
+    httpx_mock.add_response(method="POST", url=re.compile("^.*/tags$"), json={})
+
+    file_a = tmp_path / "a.csv"
+    file_a.write_text("org-id,target,key,value\norg-a,snyk-labs/goof,team,a\n")
+    file_b = tmp_path / "b.ndjson"
+    file_b.write_text(
+        '{"org-id": "org-b", "target": "snyk-labs/java-goof", "key": "team", "value": "b"}\n'
+    )
+
+    result = runner.invoke(
+        app,
+        [
+            "fromfile",
+            "target-tag",
+            "--file",
+            str(file_a),
+            "--file",
+            str(file_b),
+            "--snyktkn",
+            "some-token",
+            "--workers",
+            "2",
+        ],
+    )
+    assert result.exit_code == 0
+    assert "a.csv" in result.stdout and "b.ndjson" in result.stdout
+
+    posts = {
+        request.url.path: json.loads(request.content)
+        for request in httpx_mock.get_requests(method="POST")
+    }
+    assert posts == {
+        "/v1/org/org-a/project/p1/tags": {"key": "team", "value": "a"},
+        "/v1/org/org-b/project/p3/tags": {"key": "team", "value": "b"},
+    }
+
+
+def test_target_tag_missing_file_fails(tmp_path, httpx_mock):
+    add_org_projects(httpx_mock, "org-a", [("p1", "snyk-labs/goof")])
+    httpx_mock.add_response(method="POST", url=re.compile("^.*/tags$"), json={})
+
+    file_a = tmp_path / "a.json"
+    file_a.write_text(
+        '[{"org-id": "org-a", "target": "snyk-labs/goof", "key": "team", "value": "a"}]'
+    )
+
+    result = runner.invoke(
+        app,
+        [
+            "fromfile",
+            "target-tag",
+            "--file",
+            str(file_a),
+            "--file",
+            str(tmp_path / "missing.csv"),
+            "--snyktkn",
+            "some-token",
+        ],
+    )
+    assert result.exit_code == 1
+    assert "The file or path does not exist" in result.stdout
+    assert len(httpx_mock.get_requests(method="POST")) == 1
+
+
+def test_target_tag_resume_skips_completed_rows(tmp_path, httpx_mock):
+    add_org_projects(httpx_mock, "org-a", [("p1", "snyk-labs/goof")])
+    httpx_mock.add_response(method="POST", url=re.compile("^.*/tags$"), json={})
+
+    file_a = tmp_path / "a.csv"
+    file_a.write_text("org-id,target,key,value\norg-a,snyk-labs/goof,team,a\n")
+    journal = tmp_path / "journal.ndjson"
+    args = [
+        "fromfile",
+        "target-tag",
+        "--file",
+        str(file_a),
+        "--snyktkn",
+        "some-token",
+        "--journal",
+        str(journal),
+    ]
+
+    result = runner.invoke(app, args)
+    assert result.exit_code == 0
+    assert len(httpx_mock.get_requests()) == 2
+
+    file_a.write_text(
+        "org-id,target,key,value\norg-a,snyk-labs/goof,team,a\norg-a,snyk-labs/goof,team,b\n"
+    )
+    result = runner.invoke(app, args + ["--resume"])
+    assert result.exit_code == 0
+    requests = httpx_mock.get_requests()
+    assert len(requests) == 4
+    assert json.loads(requests[-1].content) == {"key": "team", "value": "b"}
+
+
+def test_target_tag_resume_retries_rows_with_failed_writes(tmp_path, httpx_mock):
+    add_org_projects(httpx_mock, "org-a", [("p1", "snyk-labs/goof")])
+    httpx_mock.add_response(
+        method="POST", url=re.compile("^.*/tags$"), status_code=500, json={}
+    )
+    httpx_mock.add_response(method="POST", url=re.compile("^.*/tags$"), json={})
+
+    file_a = tmp_path / "a.csv"
+    file_a.write_text("org-id,target,key,value\norg-a,snyk-labs/goof,team,a\n")
+    journal = tmp_path / "journal.ndjson"
+    args = [
+        "fromfile",
+        "target-tag",
+        "--file",
+        str(file_a),
+        "--snyktkn",
+        "some-token",
+        "--journal",
+        str(journal),
+    ]
+
+    runner.invoke(app, args)
+    assert len(httpx_mock.get_requests(method="POST")) == 1
+
+    result = runner.invoke(app, args + ["--resume"])
+    assert result.exit_code == 0
+    assert len(httpx_mock.get_requests(method="POST")) == 2
+
+
+def test_target_tag_lists_each_org_once(tmp_path, httpx_mock):
+    add_org_projects(
+        httpx_mock,
+        "org-a",
+        [("p1", "snyk-labs/goof(main):package.json"), ("p2", "other/repo")],
+    )
+    httpx_mock.add_response(method="POST", url=re.compile("^.*/tags$"), json={})
+
+    file_a = tmp_path / "a.csv"
+    file_a.write_text(
+        "org-id,target,key,value\norg-a,snyk-labs/goof,team,a\norg-a,other/repo,team,b\n"
+    )
+
+    result = runner.invoke(
+        app,
+        ["fromfile", "target-tag", "--file", str(file_a), "--snyktkn", "some-token"],
+    )
+    assert result.exit_code == 0
+    assert len(httpx_mock.get_requests(method="GET")) == 1
+    posts = {
+        request.url.path: json.loads(request.content)
+        for request in httpx_mock.get_requests(method="POST")
+    }
+    assert posts == {
+        "/v1/org/org-a/project/p1/tags": {"key": "team", "value": "a"},
+        "/v1/org/org-a/project/p2/tags": {"key": "team", "value": "b"},
+    }
+
+
+def test_target_attributes_compare_with_earlier_rows(tmp_path, httpx_mock):
+    httpx_mock.add_response(
+        method="GET",
+        url=re.compile("^.*/orgs/org-a/projects[?].*"),
+        json={
+            "data": [
+                {
+                    "id": "p1",
+                    "attributes": {
+                        "name": "snyk-labs/goof",
+                        "business_criticality": ["low"],
+                        "environment": [],
+                        "lifecycle": [],
+                    },
+                }
+            ],
+        },
+    )
+    httpx_mock.add_response(method="POST", url=re.compile("^.*/attributes$"), json={})
+
+    file_a = tmp_path / "a.csv"
+    file_a.write_text(
+        "org-id,target,criticality,environment,lifecycle\n"
+        "org-a,snyk-labs/goof,low,,\n"
+        "org-a,snyk-labs/goof,high,,\n"
+        "org-a,snyk-labs/goof,low,,\n"
+    )
+
+    result = runner.invoke(
+        app,
+        [
+            "fromfile",
+            "target-attributes",
+            "--file",
+            str(file_a),
+            "--snyktkn",
+            "some-token",
+        ],
+    )
+    assert result.exit_code == 0
+    posts = [
+        json.loads(request.content)["criticality"]
+        for request in httpx_mock.get_requests(method="POST")
+    ]
+    assert posts == [["high"], ["low"]]
+
+
+def test_target_attributes_resume_retries_rows_rejected_with_422(tmp_path, httpx_mock):
+    add_org_projects(httpx_mock, "org-a", [("p1", "snyk-labs/goof")])
+    httpx_mock.add_response(
+        method="POST", url=re.compile("^.*/attributes$"), status_code=422, json={}
+    )
+    httpx_mock.add_response(method="POST", url=re.compile("^.*/attributes$"), json={})
+
+    file_a = tmp_path / "a.csv"
+    file_a.write_text(
+        "org-id,target,criticality,environment,lifecycle\n"
+        "org-a,snyk-labs/goof,high,,\n"
+    )
+    journal = tmp_path / "journal.ndjson"
+    args = ["fromfile", "target-attributes", "--file", str(file_a)]
+    args += ["--snyktkn", "some-token", "--journal", str(journal)]
+
+    runner.invoke(app, args)
+    assert len(httpx_mock.get_requests(method="POST")) == 1
+
+    # The rejected attributes are not journaled as applied
+    result = runner.invoke(app, args + ["--resume"])
+    assert result.exit_code == 0
+    assert len(httpx_mock.get_requests(method="POST")) == 2
+
+
+def test_target_attributes_invalid_rows_fail_before_any_request(tmp_path, httpx_mock):
+    file_a = tmp_path / "a.csv"
+    file_a.write_text(
+        "org-id,target,criticality,environment,lifecycle\n"
+        "org-a,snyk-labs/goof,high,backend,production\n"
+        "org-a,snyk-labs/goof,High,backend,\n"
+        ",snyk-labs/goof,,cloud,\n"
+    )
+
+    result = runner.invoke(
+        app,
+        ["fromfile", "target-attributes", "--file", str(file_a), "--snyktkn", "t"],
+    )
+    assert result.exit_code == 1
+    assert "row 2: criticality 'High' is not one of" in result.stdout
+    assert "row 3: missing org-id" in result.stdout
+    assert "row 3: environment 'cloud' is not one of" in result.stdout
+    assert not httpx_mock.get_requests()
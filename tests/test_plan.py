@@ -0,0 +1,194 @@
+import json
+import os
+import re
+
+# Necessary to ensure consistent stdout contents from typer.
+# Otherwise asserts below could fail due to terminal width!
+os.environ["COLUMNS"] = "132"
+
+import pytest
+from typer.testing import CliRunner
+
+from snyk_tags import tags
+from snyk_tags.lib.plan import ProjectWrite
+
+runner = CliRunner()
+app = tags.app
+
+
+@pytest.fixture
+def assert_all_responses_were_requested() -> bool:
+    return False
+
+
+def test_component_tag_plan_then_apply(tmp_path, httpx_mock):
+    rules_file = tmp_path / "rules.yaml"
+    rules_file.write_text("""
+version: 1
+rules:
+  - name: test
+    projects:
+      - name: test
+    component: test-component
+""")
+    plan_file = tmp_path / "plan.ndjson"
+    httpx_mock.add_response(
+        method="GET",
+        url=re.compile("^.*/orgs/some-org/projects[?].*"),
+        json={
+            "data": [
+                {
+                    "id": "some-project",
+                    "attributes": {
+                        "name": "test",
+                        "tags": [{"key": "component", "value": "old-component"}],
+                    },
+                },
+            ],
+        },
+    )
+
+    result = runner.invoke(
+        app,
+        [
+            "component",
+            "tag",
+            "--org-id",
+            "some-org",
+            "--snyktkn",
+            "some-token",
+            "--exclusive",
+            "--plan",
+            str(plan_file),
+            str(rules_file),
+        ],
+    )
+    assert result.exit_code == 0
+    assert 'would add tag "component:test-component"' in result.stdout
+    assert len(httpx_mock.get_requests(method="POST")) == 0
+
+    mutations = [json.loads(line) for line in plan_file.read_text().splitlines()]
+    assert mutations == [
+        {
+            "op": "remove_tag",
+            "org_id": "some-org",
+            "project_id": "some-project",
+            "name": "test",
+            "key": "component",
+            "value": "old-component",
+        },
+        {
+            "op": "add_tag",
+            "org_id": "some-org",
+            "project_id": "some-project",
+            "name": "test",
+            "key": "component",
+            "value": "test-component",
+        },
+    ]
+
+    httpx_mock.add_response(
+        method="POST",
+        url=re.compile("^.*/org/some-org/project/some-project/tags(/remove)?$"),
+    )
+    result = runner.invoke(
+        app,
+        ["plan", "apply", "--snyktkn", "some-token", str(plan_file)],
+    )
+    assert result.exit_code == 0
+    assert "Applied 2 changes, skipped 0, 0 failed" in result.stdout
+    posts = httpx_mock.get_requests(method="POST")
+    assert sorted((r.url.path, json.loads(r.content)["value"]) for r in posts) == [
+        ("/v1/org/some-org/project/some-project/tags", "test-component"),
+        ("/v1/org/some-org/project/some-project/tags/remove", "old-component"),
+    ]
+    # No listing happens when applying a plan
+    assert len(httpx_mock.get_requests(method="GET")) == 1
+
+
+def test_plan_apply_reports_failures(tmp_path, httpx_mock):
+    plan_file = tmp_path / "plan.ndjson"
+    plan_file.write_text(
+        '{"op":"set_attributes","org_id":"o","project_id":"p1","name":null,"attributes":{"criticality":["high"]}}\n'
+        '{"op":"add_tag","org_id":"o","project_id":"p2","name":null,"key":"k","value":"v"}\n'
+    )
+    httpx_mock.add_response(
+        method="POST", url=re.compile("^.*/org/o/project/p1/attributes$")
+    )
+    httpx_mock.add_response(
+        method="POST", url=re.compile("^.*/org/o/project/p2/tags$"), status_code=404
+    )
+
+    result = runner.invoke(
+        app,
+        ["plan", "apply", "--snyktkn", "some-token", str(plan_file)],
+    )
+    assert result.exit_code == 1
+    assert "Applied 1 changes, skipped 0, 1 failed" in result.stdout
+
+    result = runner.invoke(app, ["plan", "show", str(plan_file)])
+    assert result.exit_code == 0
+    assert "set_attributes" in result.stdout
+
+
+def test_plan_apply_skips_projects_in_negative_cache(tmp_path, httpx_mock):
+    plan_file = tmp_path / "plan.ndjson"
+    plan_file.write_text(
+        '{"op":"add_tag","org_id":"o","project_id":"p2","name":"goof","key":"k","value":"v"}\n'
+    )
+    cache_file = tmp_path / "negative-cache.json"
+    httpx_mock.add_response(
+        method="POST", url=re.compile("^.*/org/o/project/p2/tags$"), status_code=404
+    )
+    args = ["--negative-cache", str(cache_file), "plan", "apply"]
+    args += ["--snyktkn", "some-token", str(plan_file)]
+
+    result = runner.invoke(app, args)
+    assert "Applied 0 changes, skipped 0, 1 failed" in result.stdout
+    assert json.loads(cache_file.read_text())["p2"]["org_id"] == "o"
+
+    # The read-only project is not requested again
+    result = runner.invoke(app, args)
+    assert result.exit_code == 0
+    assert "Applied 0 changes, skipped 1, 0 failed" in result.stdout
+    assert len(httpx_mock.get_requests()) == 1
+
+    result = runner.invoke(
+        app, ["list", "unreachable-projects", "--negative-cache", str(cache_file)]
+    )
+    assert result.exit_code == 0
+    assert "goof" in result.stdout and "1 projects" in result.stdout
+
+    # A 404 may come from a wrong org ID, so the project is tried in other orgs
+    plan_file.write_text(
+        '{"op":"add_tag","org_id":"o2","project_id":"p2","name":"goof","key":"k","value":"v"}\n'
+    )
+    httpx_mock.add_response(
+        method="POST", url=re.compile("^.*/org/o2/project/p2/tags$"), json={}
+    )
+    result = runner.invoke(app, args)
+    assert "Applied 1 changes, skipped 0, 0 failed" in result.stdout
+
+
+def test_project_write_coalesces_changes():
+    project = {
+        "id": "p1",
+        "attributes": {"name": "goof", "tags": [{"key": "team", "value": "a"}]},
+    }
+    write = ProjectWrite("o", project)
+    write.add_tag("team", "a")
+    write.add_tag("Owner", "alice")
+    # A single change keeps its own request
+    assert write.mutation()["op"] == "add_tag"
+
+    write.remove_tag("team", "a")
+    write.set_attributes({"lifecycle": ["production"]})
+    assert write.mutation() == {
+        "op": "update_project",
+        "org_id": "o",
+        "project_id": "p1",
+        "name": "goof",
+        "changes": 3,
+        "tags": [{"key": "Owner", "value": "alice"}],
+        "attributes": {"lifecycle": ["production"]},
+    }
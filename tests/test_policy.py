@@ -0,0 +1,116 @@
+import json
+import os
+import re
+
+# Necessary to ensure consistent stdout contents from typer.
+# Otherwise asserts below could fail due to terminal width!
+os.environ["COLUMNS"] = "132"
+
+import pytest
+from typer.testing import CliRunner
+
+from snyk_tags import tags
+
+runner = CliRunner()
+app = tags.app
+
+
+@pytest.fixture
+def assert_all_responses_were_requested() -> bool:
+    return False
+
+
+def test_policy_apply_lists_projects_once(tmp_path, httpx_mock):
+    policy_file = tmp_path / "policy.yaml"
+    policy_file.write_text("""
+version: 1
+rules:
+  - name: product
+    projects:
+      - type: npm
+    tags:
+      - key: Product
+        value: OpenSource
+  - name: team
+    projects:
+      - name:
+          regex: "^(?P<team>[a-z]+)/"
+    tags:
+      - key: team
+        value: "{team}"
+    attributes:
+      lifecycle: [production]
+""")
+    httpx_mock.add_response(
+        method="GET",
+        url=re.compile("^.*/group/some-group/orgs$"),
+        json={"orgs": [{"id": "org-a"}, {"id": "org-b"}]},
+    )
+    for org_id in ("org-a", "org-b"):
+        httpx_mock.add_response(
+            method="GET",
+            url=re.compile(f"^.*/orgs/{org_id}/projects[?].*"),
+            json={
+                "data": [
+                    {
+                        "id": f"{org_id}-project",
+                        "attributes": {
+                            "name": "payments/api:package.json",
+                            "type": "npm",
+                            "tags": [{"key": "Product", "value": "OpenSource"}],
+                            "lifecycle": [],
+                        },
+                    },
+                ],
+            },
+        )
+    httpx_mock.add_response(method="PATCH", url=re.compile("^.*/projects/.*$"))
+
+    result = runner.invoke(
+        app,
+        [
+            "policy",
+            "apply",
+            "--group-id",
+            "some-group",
+            "--snyktkn",
+            "some-token",
+            str(policy_file),
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    assert "Applied 2 changes, skipped 0, 0 failed" in result.stdout
+    assert len(httpx_mock.get_requests(method="GET")) == 3
+    assert not httpx_mock.get_requests(method="POST")
+    # The tag and attributes of each project are coalesced into one request
+    patches = [
+        json.loads(r.content)
+        for r in httpx_mock.get_requests(method="PATCH")
+        if r.url.path == "/rest/orgs/org-a/projects/org-a-project"
+    ]
+    assert patches == [
+        {
+            "data": {
+                "type": "project",
+                "id": "org-a-project",
+                "attributes": {
+                    "tags": [
+                        {"key": "Product", "value": "OpenSource"},
+                        {"key": "team", "value": "payments"},
+                    ],
+                    "business_criticality": [],
+                    "environment": [],
+                    "lifecycle": ["production"],
+                },
+            }
+        }
+    ]
+
+
+def test_policy_apply_requires_group_or_org(tmp_path):
+    policy_file = tmp_path / "policy.yaml"
+    policy_file.write_text("version: 1\nrules: []\n")
+    result = runner.invoke(
+        app, ["policy", "apply", "--snyktkn", "some-token", str(policy_file)]
+    )
+    assert result.exit_code == 2
@@ -0,0 +1,101 @@
+import json
+import os
+import re
+
+# Necessary to ensure consistent stdout contents from typer.
+# Otherwise asserts below could fail due to terminal width!
+os.environ["COLUMNS"] = "132"
+
+import pytest
+from typer.testing import CliRunner
+
+from benchmarks.mock_snyk import MockSnyk
+from snyk_tags import tags
+
+runner = CliRunner()
+app = tags.app
+
+
+@pytest.fixture
+def assert_all_responses_were_requested() -> bool:
+    return False
+
+
+@pytest.mark.parametrize("options", [[], ["--adaptive", "--concurrency", "2"]])
+def test_tag_from_target_only_removes_existing_tags(httpx_mock, options):
+    httpx_mock.add_response(
+        method="GET",
+        url=re.compile("^.*/orgs/some-org/targets[?].*"),
+        json={"data": [{"id": "t1", "attributes": {"display_name": "snyk-labs/goof"}}]},
+    )
+    httpx_mock.add_response(
+        method="GET",
+        url=re.compile("^.*/orgs/some-org/projects[?].*target_id=t1.*"),
+        json={
+            "data": [
+                {
+                    "id": f"p{i}",
+                    "attributes": {
+                        "name": f"snyk-labs/goof:app{i}/package.json",
+                        "tags": [{"key": "team", "value": "a"}] if i % 2 else [],
+                    },
+                }
+                for i in range(6)
+            ],
+        },
+    )
+    httpx_mock.add_response(
+        method="POST", url=re.compile("^.*/tags/remove$"), json={"tags": []}
+    )
+
+    result = runner.invoke(
+        app,
+        [
+            "remove",
+            "tag-from-target",
+            "--org-id",
+            "some-org",
+            "--target",
+            "snyk-labs/goof",
+            "--tagKey",
+            "team",
+            "--tagValue",
+            "a",
+            "--snyktkn",
+            "some-token",
+            *options,
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    assert "Skipping 3 projects without the tag team:a" in result.output
+    posts = httpx_mock.get_requests(method="POST")
+    assert sorted(r.url.path for r in posts) == [
+        "/v1/org/some-org/project/p1/tags/remove",
+        "/v1/org/some-org/project/p3/tags/remove",
+        "/v1/org/some-org/project/p5/tags/remove",
+    ]
+    assert all(json.loads(r.content) == {"key": "team", "value": "a"} for r in posts)
+    # Only the listing and the removals are requested
+    assert len(httpx_mock.get_requests()) == 5
+
+
+def test_unused_tags():
+    with MockSnyk(
+        orgs=2, projects=4, tags=[{"key": "team", "value": "a"}], stale_tags=3
+    ) as mock:
+        args = ["remove", "unused-tags", "--group-id", mock.group_id]
+        args += ["--snyktkn", "some-token"]
+        env = {"SNYK_TAGS_API_URL": mock.url}
+
+        result = runner.invoke(app, args + ["--dry-run"], env=env)
+        assert result.exit_code == 0, result.output
+        assert "Would delete tag stale:tag-0002" in result.output
+        assert "3 unused tags" in result.output
+        assert len(mock.group_tags) == 4
+
+        result = runner.invoke(app, args + ["--key", "stale"], env=env)
+        assert result.exit_code == 0, result.output
+        assert "Deleted 3 unused tags" in result.output
+        assert mock.group_tags == [{"key": "team", "value": "a"}]
+        assert mock.requests["GET /v1/group/{group}/tags"] == 2
+        assert mock.requests["POST /v1/group/{group}/tags/delete"] == 3
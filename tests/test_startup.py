@@ -0,0 +1,47 @@
+import subprocess
+import sys
+
+# Modules that only some subcommands need, and which are slow to import
+HEAVY_MODULES = ["github", "snyk", "httpx", "yaml", "jsonschema"]
+
+# Generous bound on importing the CLI entry point, in microseconds. Importing
+# every subcommand eagerly takes several times longer than this.
+STARTUP_BUDGET_US = 250_000
+
+
+def imported_modules(*args):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        capture_output=True,
+        text=True,
+    )
+    modules = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:"):
+            _, cumulative_us, name = line[len("import time:") :].split("|")
+            if cumulative_us.strip().isdigit():
+                modules[name.strip()] = int(cumulative_us)
+    return result, modules
+
+
+def test_version_does_not_import_subcommands():
+    result, modules = imported_modules("-m", "snyk_tags", "--version")
+    assert result.returncode == 0
+    assert modules["snyk_tags.tags"] < STARTUP_BUDGET_US
+    for name in HEAVY_MODULES + ["snyk_tags.tag", "snyk_tags.component"]:
+        assert name not in modules
+
+
+def test_help_does_not_import_subcommands():
+    result, modules = imported_modules("-m", "snyk_tags", "--help")
+    assert result.returncode == 0
+    assert "component" in result.stdout
+    for name in HEAVY_MODULES:
+        assert name not in modules
+
+
+def test_subcommand_imports_only_its_dependencies():
+    result, modules = imported_modules("-m", "snyk_tags", "component", "--help")
+    assert result.returncode == 0
+    assert "snyk_tags.lib.component.rules" in modules
+    assert "github" not in modules and "snyk" not in modules
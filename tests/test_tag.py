@@ -0,0 +1,178 @@
+import json
+import re
+import time
+
+import pytest
+from typer.testing import CliRunner
+
+from benchmarks.mock_snyk import MockSnyk
+from snyk_tags import tags
+from snyk_tags.lib.shared_rate import SharedRateLimiter
+
+runner = CliRunner()
+app = tags.app
+
+
+@pytest.fixture
+def assert_all_responses_were_requested() -> bool:
+    return False
+
+
+def test_tag_sca_resume_retries_org_with_failed_writes(tmp_path, httpx_mock):
+    httpx_mock.add_response(
+        method="GET",
+        url=re.compile("^.*/orgs/org-a/projects[?].*"),
+        json={
+            "data": [
+                {"id": project_id, "attributes": {"name": project_id, "type": "npm"}}
+                for project_id in ("p1", "p2")
+            ],
+        },
+    )
+    httpx_mock.add_response(
+        method="POST", url=re.compile("^.*/project/p1/tags$"), json={}
+    )
+    httpx_mock.add_response(
+        method="POST", url=re.compile("^.*/project/p2/tags$"), status_code=500, json={}
+    )
+    httpx_mock.add_response(
+        method="POST", url=re.compile("^.*/project/p2/tags$"), json={}
+    )
+    args = ["tag", "sca", "--group-id", "g", "--org-id", "org-a"]
+    args += ["--snyktkn", "some-token", "--journal", str(tmp_path / "journal")]
+
+    runner.invoke(app, args)
+    posts = httpx_mock.get_requests(method="POST")
+    assert [request.url.path for request in posts] == [
+        "/v1/org/org-a/project/p1/tags",
+        "/v1/org/org-a/project/p2/tags",
+    ]
+
+    # The org is listed again, and only the failed project is tagged
+    result = runner.invoke(app, args + ["--resume"])
+    assert result.exit_code == 0
+    posts = httpx_mock.get_requests(method="POST")
+    assert len(httpx_mock.get_requests(method="GET")) == 2
+    assert [request.url.path for request in posts[2:]] == [
+        "/v1/org/org-a/project/p2/tags"
+    ]
+
+
+def test_tag_sca_draws_from_shared_rate_budget(tmp_path, httpx_mock, monkeypatch):
+    httpx_mock.add_response(
+        method="GET",
+        url=re.compile("^.*/orgs/org-a/projects[?].*"),
+        json={
+            "data": [
+                {"id": project_id, "attributes": {"name": project_id, "type": "npm"}}
+                for project_id in ("p1", "p2")
+            ],
+        },
+    )
+    httpx_mock.add_response(
+        method="GET",
+        url=re.compile("^.*/group/g/orgs$"),
+        json={"orgs": [{"id": "org-a"}]},
+    )
+    httpx_mock.add_response(method="POST", url=re.compile("^.*/tags$"), json={})
+    acquired = []
+    acquire = SharedRateLimiter.acquire
+    monkeypatch.setattr(
+        SharedRateLimiter,
+        "acquire",
+        lambda self: acquired.append(self.key) or acquire(self),
+    )
+
+    result = runner.invoke(
+        app,
+        [
+            "--shared-rate-budget",
+            str(tmp_path / "budget.sqlite"),
+            "--shared-max-rps",
+            "1000",
+            "tag",
+            "sca",
+            "--group-id",
+            "g",
+            "--snyktkn",
+            "some-token",
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    # Every request of the run, listings and tag writes alike
+    assert len(httpx_mock.get_requests()) == 5
+    assert len(acquired) == 5
+    assert len(set(acquired)) == 1
+
+
+def test_tag_sca_journals_org_when_unreachable_projects_are_skipped(
+    tmp_path, httpx_mock
+):
+    cache_file = tmp_path / "negative-cache.json"
+    cache_file.write_text(
+        json.dumps(
+            {
+                "p2": {
+                    "org_id": "org-a",
+                    "name": "p2",
+                    "reason": "not found",
+                    "expires": int(time.time()) + 3600,
+                }
+            }
+        )
+    )
+    httpx_mock.add_response(
+        method="GET",
+        url=re.compile("^.*/orgs/org-a/projects[?].*"),
+        json={
+            "data": [
+                {"id": project_id, "attributes": {"name": project_id, "type": "npm"}}
+                for project_id in ("p1", "p2")
+            ],
+        },
+    )
+    httpx_mock.add_response(
+        method="PATCH", url=re.compile("^.*/orgs/org-a/projects/p1[?].*"), json={}
+    )
+    args = ["--negative-cache", str(cache_file), "tag", "sca", "--group-id", "g"]
+    args += ["--org-id", "org-a", "--addprojecttype", "--snyktkn", "some-token"]
+    args += ["--journal", str(tmp_path / "journal")]
+
+    result = runner.invoke(app, args)
+    assert result.exit_code == 0, result.output
+    assert [request.method for request in httpx_mock.get_requests()] == [
+        "GET",
+        "PATCH",
+    ]
+
+    # Skipping the known missing project is not a failure, so the org is done
+    result = runner.invoke(app, args + ["--resume"])
+    assert result.exit_code == 0
+    assert len(httpx_mock.get_requests()) == 2
+
+
+def test_tag_all_products_lists_each_org_once():
+    with MockSnyk(orgs=2, projects=12, page_size=100) as mock:
+        result = runner.invoke(
+            app,
+            ["tag", "all-products", "--group-id", mock.group_id]
+            + ["--snyktkn", "token", "--addprojecttype"],
+            env={"SNYK_TAGS_API_URL": mock.url},
+        )
+    assert result.exit_code == 0
+    assert mock.requests["GET /rest/orgs/{org}/projects"] == 2
+    expected = {
+        "npm": "OpenSource",
+        "maven": "OpenSource",
+        "pip": "OpenSource",
+        "sast": "Code",
+        "terraformconfig": "IaC",
+        "dockerfile": "Container",
+    }
+    for projects in mock.orgs.values():
+        for project in projects.values():
+            project_type = project["attributes"]["type"]
+            assert project["attributes"]["tags"] == [
+                {"key": "Product", "value": expected[project_type]},
+                {"key": "Type", "value": project_type},
+            ]